@@ -38,10 +38,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'tutores.estaticos.ArquivosEstaticosMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tutores.middleware.PerfilUsuarioMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -144,7 +146,63 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+# collectstatic grava os estáticos com hash no nome e versões .gz/.br, servidos
+# pelo ArquivosEstaticosMiddleware
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'tutores.estaticos.ArmazenamentoEstatico'},
+}
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Índice espacial de clínicas em memória: segundos até ser reconstruído (0
+# desativa a reconstrução periódica). Só é usado com cache compartilhado,
+# que avisa os processos das alterações; senão a busca consulta o banco
+INDICE_CLINICAS_TTL = config('INDICE_CLINICAS_TTL', default=300, cast=int)
+
+# Quantidade de clínicas por página na busca de veterinários
+BUSCA_CLINICAS_POR_PAGINA = config('BUSCA_CLINICAS_POR_PAGINA', default=20, cast=int)
+
+# Quantidade de consultas por página na agenda do veterinário
+CONSULTAS_POR_PAGINA = config('CONSULTAS_POR_PAGINA', default=20, cast=int)
+
+# Quantidade de notificações por página
+NOTIFICACOES_POR_PAGINA = config('NOTIFICACOES_POR_PAGINA', default=20, cast=int)
+
+# Cache (contador de notificações não lidas, etc.). Em produção com vários
+# processos use um cache compartilhado, ex.: CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# e CACHE_LOCATION=redis://127.0.0.1:6379. O LocMemCache padrão é de cada
+# processo, então o que precisa ser igual em todos eles não usa o cache
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='guardiao-animal'),
+    }
+}
+
+# Caixa de saída de emails (comando enviar_emails)
+EMAIL_SAIDA_THREADS = config('EMAIL_SAIDA_THREADS', default=4, cast=int)
+EMAIL_SAIDA_MAX_TENTATIVAS = config('EMAIL_SAIDA_MAX_TENTATIVAS', default=5, cast=int)
+# Para quem prefere resumo: minutos desde a primeira notificação até o envio do resumo
+EMAIL_RESUMO_JANELA_MINUTOS = config('EMAIL_RESUMO_JANELA_MINUTOS', default=60, cast=int)
+# Tempo máximo (segundos) de espera pelo servidor SMTP
+EMAIL_TIMEOUT = config('EMAIL_TIMEOUT', default=30, cast=int)
+
+# Processos que geram os tamanhos das fotos enviadas (0 gera na própria requisição)
+IMAGENS_PROCESSOS = config('IMAGENS_PROCESSOS', default=2, cast=int)
+
+# Fotos enviadas: limite de pixels (megapixels * 1.000.000) e maior lado guardado
+FOTO_MAX_PIXELS = config('FOTO_MAX_PIXELS', default=60_000_000, cast=int)
+FOTO_MAX_LADO = config('FOTO_MAX_LADO', default=2560, cast=int)
+
+# Fotos modificadas há menos que isso não são apagadas ao serem liberadas (um
+# envio do mesmo conteúdo pode estar em andamento); ficam para o coletar_fotos_orfas
+FOTO_ORFA_CARENCIA_MINUTOS = config('FOTO_ORFA_CARENCIA_MINUTOS', default=60, cast=int)
+
+# Pasta do cache em disco das miniaturas geradas sob demanda (fotos das clínicas)
+MINIATURAS_DIR = config('MINIATURAS_DIR', default=str(BASE_DIR / 'cache' / 'miniaturas'))
+
+# Máximo de opções devolvidas pelas buscas de autocomplete (tutores, veterinários)
+AUTOCOMPLETE_LIMITE = config('AUTOCOMPLETE_LIMITE', default=10, cast=int)
@@ -3,6 +3,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from tutores import views as tutor_views
+from tutores.armazenamento import servir_midia
 from veterinarios import views as vet_views
 
 urlpatterns = [
@@ -15,4 +16,4 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += static(settings.MEDIA_URL, view=servir_midia, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,139 @@
+// Campos de busca enquanto digita (tutores/widgets/busca_autocomplete.html).
+// O id escolhido fica no input oculto, que dispara 'change' quando muda.
+(function () {
+    if (window.buscaAutocompleteCarregada) {
+        return;
+    }
+    window.buscaAutocompleteCarregada = true;
+
+    const ESPERA_MS = 250;
+
+    function iniciar(caixa) {
+        const oculto = caixa.querySelector('input[type="hidden"]');
+        const busca = caixa.querySelector('input[type="search"]');
+        const lista = caixa.querySelector('.busca-autocomplete-opcoes');
+        const minimo = parseInt(caixa.dataset.minimo || '2', 10);
+        let temporizador = null;
+        let controlador = null;
+        let ativa = -1;
+
+        function definirValor(id) {
+            if (oculto.value !== String(id)) {
+                oculto.value = id;
+                oculto.dispatchEvent(new Event('change', { bubbles: true }));
+            }
+        }
+
+        function fechar() {
+            lista.hidden = true;
+            busca.setAttribute('aria-expanded', 'false');
+            ativa = -1;
+        }
+
+        function escolher(opcao) {
+            busca.value = opcao.texto;
+            definirValor(opcao.id);
+            fechar();
+        }
+
+        function marcar(indice) {
+            const itens = lista.querySelectorAll('li[data-id]');
+            if (!itens.length) {
+                return;
+            }
+            ativa = (indice + itens.length) % itens.length;
+            itens.forEach(function (item, i) {
+                item.classList.toggle('ativa', i === ativa);
+                item.setAttribute('aria-selected', i === ativa ? 'true' : 'false');
+            });
+        }
+
+        function mostrar(resultados) {
+            lista.innerHTML = '';
+            ativa = -1;
+            if (!resultados.length) {
+                const vazio = document.createElement('li');
+                vazio.className = 'vazio';
+                vazio.textContent = 'Nenhum resultado encontrado';
+                lista.appendChild(vazio);
+            }
+            resultados.forEach(function (opcao) {
+                const item = document.createElement('li');
+                item.textContent = opcao.texto;
+                item.dataset.id = opcao.id;
+                item.setAttribute('role', 'option');
+                // mousedown (e não click) para escolher antes do blur fechar a lista
+                item.addEventListener('mousedown', function (e) {
+                    e.preventDefault();
+                    escolher(opcao);
+                });
+                lista.appendChild(item);
+            });
+            lista.hidden = false;
+            busca.setAttribute('aria-expanded', 'true');
+        }
+
+        function buscar(termo) {
+            if (controlador) {
+                controlador.abort();
+            }
+            controlador = new AbortController();
+            fetch(caixa.dataset.url + '?q=' + encodeURIComponent(termo), {
+                signal: controlador.signal,
+                headers: { 'Accept': 'application/json' }
+            })
+                .then(function (response) {
+                    if (!response.ok) {
+                        throw new Error('Erro na requisição');
+                    }
+                    return response.json();
+                })
+                .then(function (data) {
+                    mostrar(data.resultados || []);
+                })
+                .catch(function (error) {
+                    if (error.name !== 'AbortError') {
+                        console.error('Erro na busca:', error);
+                    }
+                });
+        }
+
+        busca.addEventListener('input', function () {
+            // Texto alterado: a escolha anterior deixa de valer
+            definirValor('');
+            clearTimeout(temporizador);
+            const termo = busca.value.trim();
+            if (termo.length < minimo) {
+                fechar();
+                return;
+            }
+            temporizador = setTimeout(function () {
+                buscar(termo);
+            }, ESPERA_MS);
+        });
+
+        busca.addEventListener('keydown', function (e) {
+            if (lista.hidden) {
+                return;
+            }
+            if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+                e.preventDefault();
+                marcar(ativa + (e.key === 'ArrowDown' ? 1 : -1));
+            } else if (e.key === 'Enter') {
+                const item = lista.querySelectorAll('li[data-id]')[ativa];
+                if (item) {
+                    e.preventDefault();
+                    escolher({ id: item.dataset.id, texto: item.textContent });
+                }
+            } else if (e.key === 'Escape') {
+                fechar();
+            }
+        });
+
+        busca.addEventListener('blur', fechar);
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('.busca-autocomplete').forEach(iniciar);
+    });
+})();
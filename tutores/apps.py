@@ -1,6 +1,49 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_init, post_save, post_delete
 
 
 class TutoresConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tutores'
+
+    def ready(self):
+        from .autocomplete import atualizar_nome_busca
+        from .armazenamento import CAMPOS_POR_CONTEUDO, guardar_foto_carregada, liberar_foto_removida, liberar_foto_trocada
+        from .indice_espacial import atualizar_indice_clinica, remover_indice_clinica
+        from .middleware import invalidar_perfil_ao_salvar, invalidar_perfil_ao_remover
+        from . import versoes
+        # Mantém o índice espacial de clínicas em dia com o banco
+        post_save.connect(atualizar_indice_clinica, sender='veterinarios.Clinica',
+                          dispatch_uid='tutores_indice_clinica_save')
+        post_delete.connect(remover_indice_clinica, sender='veterinarios.Clinica',
+                            dispatch_uid='tutores_indice_clinica_delete')
+        # Papel do usuário guardado na sessão (PerfilUsuarioMiddleware)
+        for modelo in ('tutores.Tutor', 'veterinarios.Veterinario'):
+            post_save.connect(invalidar_perfil_ao_salvar, sender=modelo,
+                              dispatch_uid=f'tutores_perfil_save_{modelo}')
+            post_delete.connect(invalidar_perfil_ao_remover, sender=modelo,
+                                dispatch_uid=f'tutores_perfil_delete_{modelo}')
+        # Contagem de referências das fotos armazenadas por conteúdo
+        for modelo, _ in CAMPOS_POR_CONTEUDO:
+            post_init.connect(guardar_foto_carregada, sender=modelo,
+                              dispatch_uid=f'tutores_foto_init_{modelo}')
+            post_save.connect(liberar_foto_trocada, sender=modelo,
+                              dispatch_uid=f'tutores_foto_save_{modelo}')
+            post_delete.connect(liberar_foto_removida, sender=modelo,
+                                dispatch_uid=f'tutores_foto_delete_{modelo}')
+        # Versões usadas no GET condicional (ETag) das páginas
+        for modelo, receptor in (
+            ('tutores.Animal', versoes.versoes_de_animal),
+            ('tutores.PetHistory', versoes.versoes_de_historico),
+            ('tutores.Tutor', versoes.versoes_de_tutor),
+            ('veterinarios.Appointment', versoes.versoes_de_consulta),
+            ('veterinarios.Clinica', versoes.versoes_de_clinica),
+            ('veterinarios.Veterinario', versoes.versoes_de_veterinario),
+            (settings.AUTH_USER_MODEL, versoes.versoes_de_usuario),
+        ):
+            post_save.connect(receptor, sender=modelo, dispatch_uid=f'tutores_versao_save_{modelo}')
+            post_delete.connect(receptor, sender=modelo, dispatch_uid=f'tutores_versao_delete_{modelo}')
+        # Nome do usuário nas chaves de busca do autocomplete de tutores/veterinários
+        post_save.connect(atualizar_nome_busca, sender=settings.AUTH_USER_MODEL,
+                          dispatch_uid='tutores_autocomplete_nome')
@@ -0,0 +1,181 @@
+# tutores/armazenamento.py
+"""
+Armazenamento por conteúdo das fotos (Animal.foto e Clinica.foto).
+
+O arquivo é gravado com o hash do conteúdo como nome (clinicas/<hash>.jpg),
+então enviar de novo a mesma foto não grava nada e fotos iguais ocupam um
+único arquivo, compartilhado pelos registros que a usam. A contagem de
+referências é feita no próprio banco: quando o último registro deixa de
+usar um arquivo ele é apagado (sinais abaixo); o comando
+coletar_fotos_orfas remove o que sobrar (arquivos antigos, falhas).
+
+Um envio de conteúdo que já existe só atualiza a data de modificação do
+arquivo, e a liberação não apaga arquivos modificados há menos de
+FOTO_ORFA_CARENCIA_MINUTOS: o registro novo ainda pode não ter sido
+gravado (a contagem daria 0). Esses ficam para o coletar_fotos_orfas.
+
+Como o conteúdo de um nome nunca muda, esses arquivos podem ser servidos
+com cache "imutável".
+"""
+import hashlib
+import logging
+import os
+import posixpath
+import re
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.views.static import serve
+
+from .imagens import FORMATOS_DERIVADOS, TAMANHOS_FOTO, nome_derivado
+
+logger = logging.getLogger(__name__)
+
+# Campos que usam este armazenamento: (model, campo)
+CAMPOS_POR_CONTEUDO = (
+    ('tutores.Animal', 'foto'),
+    ('veterinarios.Clinica', 'foto'),
+)
+TAMANHO_HASH = 32
+_NOME_POR_CONTEUDO = re.compile(rf'^[0-9a-f]{{{TAMANHO_HASH}}}\.[a-z0-9]+$')
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+
+
+def eh_nome_por_conteudo(nome):
+    """True se `nome` foi gerado por este armazenamento (o conteúdo do arquivo nunca muda)"""
+    return bool(nome) and bool(_NOME_POR_CONTEUDO.match(posixpath.basename(nome)))
+
+
+def hash_conteudo(conteudo):
+    resumo = hashlib.sha256()
+    if hasattr(conteudo, 'seek'):
+        conteudo.seek(0)
+    for bloco in conteudo.chunks():
+        resumo.update(bloco if isinstance(bloco, bytes) else bloco.encode())
+    if hasattr(conteudo, 'seek'):
+        conteudo.seek(0)
+    return resumo.hexdigest()[:TAMANHO_HASH]
+
+
+class ArmazenamentoPorConteudo(FileSystemStorage):
+    """FileSystemStorage que nomeia os arquivos pelo hash do conteúdo"""
+
+    def _save(self, name, content):
+        pasta, arquivo = posixpath.split(name)
+        extensao = posixpath.splitext(arquivo)[1].lower()
+        nome = posixpath.join(pasta, f'{hash_conteudo(content)}{extensao}')
+        try:
+            # Mesmo conteúdo já armazenado: nada a gravar. A data nova protege
+            # o arquivo de uma liberação enquanto este registro não é gravado
+            os.utime(self.path(nome))
+            return nome
+        except FileNotFoundError:
+            return super()._save(nome, content)
+
+
+_armazenamento = ArmazenamentoPorConteudo()
+
+
+def armazenamento_por_conteudo():
+    """Usado como `storage=` dos campos (callable, para não gravar o storage nas migrações)"""
+    return _armazenamento
+
+
+# Contagem de referências
+
+def contar_referencias(nome):
+    """Quantos registros usam o arquivo `nome`"""
+    total = 0
+    for modelo, campo in CAMPOS_POR_CONTEUDO:
+        total += apps.get_model(modelo)._default_manager.filter(**{campo: nome}).count()
+    return total
+
+
+def nomes_em_uso():
+    """Conjunto dos nomes de arquivo usados por algum registro"""
+    nomes = set()
+    for modelo, campo in CAMPOS_POR_CONTEUDO:
+        Model = apps.get_model(modelo)
+        nomes.update(
+            Model._default_manager.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+            .values_list(campo, flat=True).distinct()
+        )
+    return nomes
+
+
+def apagar_arquivo(nome):
+    """Apaga o arquivo e os seus derivados (tamanhos gerados das fotos de animais)"""
+    _armazenamento.delete(nome)
+    for tamanho in TAMANHOS_FOTO:
+        for extensao, _, _ in FORMATOS_DERIVADOS:
+            _armazenamento.delete(nome_derivado(nome, tamanho, extensao))
+
+
+def _modificado_recentemente(nome):
+    """True se o arquivo foi gravado ou reenviado dentro da carência (ou não existe mais)"""
+    try:
+        modificado = os.path.getmtime(_armazenamento.path(nome))
+    except FileNotFoundError:
+        return True
+    return modificado > time.time() - settings.FOTO_ORFA_CARENCIA_MINUTOS * 60
+
+
+def liberar_arquivo(nome):
+    """Depois do commit, apaga o arquivo se nenhum registro o usar mais"""
+    if not eh_nome_por_conteudo(nome):
+        # Arquivos com nome antigo ficam para o coletar_fotos_orfas
+        return
+
+    def apagar_se_orfao():
+        try:
+            if contar_referencias(nome) == 0 and not _modificado_recentemente(nome):
+                apagar_arquivo(nome)
+        except Exception:
+            logger.exception("Falha ao liberar o arquivo %s", nome)
+
+    transaction.on_commit(apagar_se_orfao)
+
+
+def _nome_da_foto(instance):
+    # Lê o valor sem disparar a query de um campo adiado (.only()/.defer())
+    valor = instance.__dict__.get('foto')
+    return getattr(valor, 'name', valor) or None
+
+
+def guardar_foto_carregada(sender, instance, **kwargs):
+    """post_init: lembra qual arquivo o registro usava"""
+    instance._foto_armazenada = _nome_da_foto(instance)
+
+
+def liberar_foto_trocada(sender, instance, raw=False, **kwargs):
+    """post_save: libera o arquivo anterior se a foto foi trocada ou removida"""
+    if raw or 'foto' in instance.get_deferred_fields():
+        return
+    anterior, atual = getattr(instance, '_foto_armazenada', None), _nome_da_foto(instance)
+    if anterior and anterior != atual:
+        liberar_arquivo(anterior)
+    instance._foto_armazenada = atual
+
+
+def liberar_foto_removida(sender, instance, **kwargs):
+    """post_delete"""
+    nome = _nome_da_foto(instance)
+    if nome:
+        liberar_arquivo(nome)
+
+
+def servir_midia(request, path, document_root=None, show_indexes=False):
+    """
+    django.views.static.serve com cache imutável para os arquivos nomeados
+    pelo conteúdo. Só é usada com DEBUG; em produção configure o mesmo
+    cabeçalho no servidor web, ex. (nginx):
+
+        location ~ "^/media/.*/[0-9a-f]{32}\\.[a-z0-9]+$" { add_header Cache-Control "public, max-age=31536000, immutable"; }
+    """
+    resposta = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if resposta.status_code == 200 and eh_nome_por_conteudo(path):
+        resposta['Cache-Control'] = CACHE_IMUTAVEL
+    return resposta
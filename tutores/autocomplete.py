@@ -0,0 +1,151 @@
+# tutores/autocomplete.py
+"""
+Busca enquanto digita (autocomplete) de tutores e veterinários, usada nos
+formulários no lugar de um <select> com todos os registros do sistema.
+
+A busca é por prefixo nas chaves indexadas dos models (nome sem acentos,
+CPF e telefone só com dígitos, CRMV) e devolve no máximo
+AUTOCOMPLETE_LIMITE opções. O CampoAutocomplete não lista nada ao
+renderizar: a validação só resolve o id escolhido, com uma consulta pela
+chave primária.
+"""
+from django import forms
+from django.conf import settings
+from django.db.models import Q
+from django.urls import reverse
+
+from veterinarios.models import Veterinario
+from veterinarios.texto import normalizar_texto, somente_digitos
+from .models import Tutor
+
+# Tamanho mínimo do termo: letras para buscar por nome, dígitos para CPF/telefone
+TAMANHO_MINIMO_NOME = 2
+TAMANHO_MINIMO_DIGITOS = 3
+CAMPOS_TUTOR = ('id', 'usuario__first_name', 'usuario__last_name', 'usuario__username', 'cpf')
+CAMPOS_VETERINARIO = ('id', 'usuario__first_name', 'usuario__last_name', 'usuario__username', 'crmv')
+
+
+def _nome(valores):
+    nome = f"{valores['usuario__first_name']} {valores['usuario__last_name']}".strip()
+    return nome or valores['usuario__username']
+
+
+def _opcoes_tutores(queryset, limite=None):
+    linhas = queryset.values(*CAMPOS_TUTOR)
+    if limite is not None:
+        linhas = linhas[:limite]
+    return [
+        {'id': t['id'], 'texto': f"{_nome(t)} - CPF {t['cpf']}" if t['cpf'] else _nome(t)}
+        for t in linhas
+    ]
+
+
+def _opcoes_veterinarios(queryset, limite=None):
+    linhas = queryset.values(*CAMPOS_VETERINARIO)
+    if limite is not None:
+        linhas = linhas[:limite]
+    return [{'id': v['id'], 'texto': f"{_nome(v)} - CRMV {v['crmv']}"} for v in linhas]
+
+
+def _termo_numerico(termo):
+    """Dígitos do termo se ele for um CPF/telefone (com ou sem pontuação), senão None"""
+    if any(c.isalpha() for c in termo):
+        return None
+    return somente_digitos(termo)
+
+
+def buscar_tutores(termo, limite=None):
+    """[{'id', 'texto'}] dos tutores cujo nome, CPF ou telefone começa com `termo`"""
+    limite = limite or settings.AUTOCOMPLETE_LIMITE
+    digitos = _termo_numerico(termo)
+    if digitos is not None:
+        if len(digitos) < TAMANHO_MINIMO_DIGITOS:
+            return []
+        tutores = Tutor.objects.filter(
+            Q(cpf_digitos__startswith=digitos) | Q(telefone_digitos__startswith=digitos)
+        ).order_by('cpf_digitos', 'id')
+    else:
+        prefixo = normalizar_texto(termo)
+        if len(prefixo) < TAMANHO_MINIMO_NOME:
+            return []
+        tutores = Tutor.objects.filter(nome_normalizado__startswith=prefixo).order_by('nome_normalizado', 'id')
+    return _opcoes_tutores(tutores, limite)
+
+
+def buscar_veterinarios(termo, limite=None):
+    """[{'id', 'texto'}] dos veterinários cujo nome ou CRMV começa com `termo`"""
+    limite = limite or settings.AUTOCOMPLETE_LIMITE
+    prefixo = normalizar_texto(termo)
+    if len(prefixo) < TAMANHO_MINIMO_NOME:
+        return []
+    # O CRMV é gravado em maiúsculas no cadastro
+    veterinarios = Veterinario.objects.filter(
+        Q(nome_normalizado__startswith=prefixo) | Q(crmv__startswith=termo.strip().upper())
+    ).order_by('nome_normalizado', 'id')
+    return _opcoes_veterinarios(veterinarios, limite)
+
+
+def opcao_tutor(pk):
+    """{'id', 'texto'} do tutor `pk` (valor já escolhido no campo), ou None"""
+    opcoes = _opcoes_tutores(Tutor.objects.filter(pk=pk))
+    return opcoes[0] if opcoes else None
+
+
+def opcao_veterinario(pk):
+    opcoes = _opcoes_veterinarios(Veterinario.objects.filter(pk=pk))
+    return opcoes[0] if opcoes else None
+
+
+class BuscaAutocompleteWidget(forms.Widget):
+    """
+    Campo de texto que busca as opções em `url_name` (?q=) enquanto o usuário
+    digita e guarda o id escolhido em um input oculto com o nome do campo. O
+    input oculto dispara 'change' quando a escolha muda.
+    """
+    template_name = 'tutores/widgets/busca_autocomplete.html'
+
+    def __init__(self, url_name, opcao_por_id, attrs=None):
+        super().__init__(attrs)
+        self.url_name = url_name
+        self.opcao_por_id = opcao_por_id
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        widget = context['widget']
+        opcao = None
+        if value is not None and str(value).isdigit():
+            # Só o registro já escolhido (ex.: formulário reexibido com erros)
+            opcao = self.opcao_por_id(value)
+        widget['texto'] = opcao['texto'] if opcao else ''
+        widget['url'] = reverse(self.url_name)
+        widget['minimo'] = TAMANHO_MINIMO_NOME
+        # id, class etc. vão para o campo de texto; o input oculto fica com o id do campo
+        attrs_busca = dict(widget['attrs'])
+        id_campo = attrs_busca.pop('id', None)
+        widget['id_campo'] = id_campo
+        widget['id_busca'] = self.id_for_label(id_campo)
+        widget['attrs_busca'] = attrs_busca
+        return context
+
+    def id_for_label(self, id_):
+        return f'{id_}_busca' if id_ else id_
+
+
+class CampoAutocomplete(forms.ModelChoiceField):
+    """ModelChoiceField com BuscaAutocompleteWidget: não carrega as opções, só valida o id enviado"""
+
+    def __init__(self, queryset, url_name, opcao_por_id, **kwargs):
+        kwargs.setdefault('widget', BuscaAutocompleteWidget(url_name, opcao_por_id))
+        super().__init__(queryset, **kwargs)
+
+
+def atualizar_nome_busca(sender, instance, created=False, raw=False, **kwargs):
+    """post_save do usuário: o nome faz parte da chave de busca do tutor/veterinário"""
+    update_fields = kwargs.get('update_fields')
+    if raw or created or (
+        update_fields is not None and not {'first_name', 'last_name', 'username'} & set(update_fields)
+    ):
+        return
+    nome = normalizar_texto(instance.get_full_name() or instance.username)[:300]
+    Tutor.objects.filter(usuario_id=instance.pk).update(nome_normalizado=nome)
+    Veterinario.objects.filter(usuario_id=instance.pk).update(nome_normalizado=nome)
@@ -0,0 +1,111 @@
+# tutores/cadastro.py
+"""
+Cadastro de tutores e veterinários com o mínimo de idas ao banco.
+
+- Na validação do formulário, todas as chaves únicas (email, CPF, CRMV)
+  são conferidas em uma única consulta (conflitos_de_cadastro).
+- A gravação roda em uma transação curta. O CRMV e o CPF do tutor têm
+  índice único: se outro cadastro gravar o mesmo valor entre a validação
+  e o INSERT, o banco recusa e o IntegrityError volta como erro do campo
+  no formulário.
+- O email e o CPF do usuário (CustomUser) não têm índice único (o CPF
+  vazio é gravado como ''), então para eles a conferência da validação é
+  a única: dois cadastros simultâneos com o mesmo valor podem ser gravados.
+"""
+from django.db import IntegrityError, connection, transaction
+from django.db.models import CharField, Value
+
+from veterinarios.texto import normalizar_texto
+from .models import Tutor
+
+MENSAGENS_CONFLITO = {
+    'email': 'Este e-mail já está em uso.',
+    'cpf': 'Este CPF já está cadastrado.',
+    'crmv': 'Este CRMV já está cadastrado.',
+}
+
+
+def conflitos_de_cadastro(*chaves):
+    """
+    chaves: pares (campo do formulário, queryset dos registros que já usam o
+    valor), ou (campo, None) quando o campo não foi preenchido. Retorna o
+    conjunto dos campos em conflito, em uma consulta (UNION das buscas).
+    """
+    consultas = [
+        queryset.annotate(campo=Value(campo, output_field=CharField())).values('campo')
+        for campo, queryset in chaves if queryset is not None
+    ]
+    if not consultas:
+        return set()
+    return {linha['campo'] for linha in consultas[0].union(*consultas[1:])}
+
+
+def adicionar_erros_de_conflito(form, *chaves):
+    """Adiciona ao formulário o erro de cada campo já cadastrado"""
+    for campo in conflitos_de_cadastro(*chaves):
+        form.add_error(campo, MENSAGENS_CONFLITO[campo])
+
+
+def _restricao_violada(erro):
+    """Parte da mensagem do IntegrityError que nomeia o índice (sem o valor duplicado)"""
+    mensagem = str(erro).split('\n')[0]
+    # MySQL: Duplicate entry 'valor' for key 'tabela.coluna'
+    if 'for key' in mensagem:
+        mensagem = mensagem.rsplit('for key', 1)[1]
+    return mensagem.lower()
+
+
+def _erro_no_campo(form, erro, campos):
+    """Converte o IntegrityError de um índice único de `campos` em erro do formulário"""
+    restricao = _restricao_violada(erro)
+    campo = next((campo for campo in campos if campo in restricao), None)
+    if campo is None:
+        return False
+    form.add_error(campo, MENSAGENS_CONFLITO[campo])
+    return True
+
+
+def cadastrar_tutor(form):
+    """
+    Cria o usuário e o perfil de tutor de um CadastroTutorForm válido.
+    Retorna o usuário, ou None se um valor único já tiver sido cadastrado
+    (o erro fica no formulário).
+    """
+    try:
+        with transaction.atomic():
+            user = form.save()
+            Tutor.objects.create(
+                usuario=user,
+                cpf=form.cleaned_data.get('cpf') or None,
+                telefone=form.cleaned_data.get('telefone') or None,
+                latitude=form.cleaned_data.get('latitude'),
+                longitude=form.cleaned_data.get('longitude'),
+            )
+    except IntegrityError as erro:
+        if not _erro_no_campo(form, erro, ('cpf',)):
+            raise
+        return None
+    return user
+
+
+def cadastrar_veterinario(form):
+    """
+    Cria o usuário e o perfil de veterinário de um CadastroVeterinarioForm
+    válido. Retorna o usuário, ou None se um valor único já tiver sido
+    cadastrado (o erro fica no formulário).
+    """
+    try:
+        with transaction.atomic():
+            user = form.save()
+            # SQL direto: a tabela veterinarios_veterinario pode não ter as
+            # colunas opcionais do perfil (especialidade, formação...)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO veterinarios_veterinario (usuario_id, crmv, nome_normalizado) VALUES (%s, %s, %s)",
+                    [user.pk, form.cleaned_data['crmv'], normalizar_texto(user.get_full_name() or user.username)[:300]]
+                )
+    except IntegrityError as erro:
+        if not _erro_no_campo(form, erro, ('crmv',)):
+            raise
+        return None
+    return user
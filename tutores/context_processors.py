@@ -1,11 +1,15 @@
 # tutores/context_processors.py
+from .middleware import PAPEL_TUTOR
 from .models import Tutor
 
 
 def user_is_tutor(request):
     """Adiciona informação se o usuário é tutor ao contexto"""
     is_tutor = False
-    if request.user.is_authenticated:
+    if hasattr(request, 'papel'):
+        # Já resolvido pelo PerfilUsuarioMiddleware
+        is_tutor = request.papel == PAPEL_TUTOR
+    elif request.user.is_authenticated:
         try:
             # Usa o manager customizado que só busca campos existentes
             is_tutor = Tutor.objects.filter(usuario=request.user).exists()
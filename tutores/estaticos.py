@@ -0,0 +1,200 @@
+# tutores/estaticos.py
+"""
+Arquivos estáticos servidos pelo próprio Django (não há CDN nem nginx na
+frente).
+
+- ArmazenamentoEstatico: no collectstatic, grava os arquivos com o hash do
+  conteúdo no nome (style.css -> style.3f2a9c1b7d4e.css) e, ao lado de cada
+  arquivo compressível, as versões .gz e .br (brotli, se o pacote estiver
+  instalado).
+- ArquivosEstaticosMiddleware: serve o STATIC_ROOT escolhendo a versão
+  comprimida pelo Accept-Encoding, com ETag e, para os nomes com hash,
+  Cache-Control imutável.
+"""
+import gzip
+import json
+import mimetypes
+import os
+import posixpath
+from email.utils import formatdate
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, HttpResponseNotModified
+
+# Brotli é opcional: sem ele só é gerada a versão gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+EXTENSOES_COMPRESSIVEIS = {
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico', '.ttf', '.otf', '.eot',
+}
+# Versões comprimidas que não economizam pelo menos isso não são gravadas
+ECONOMIA_MINIMA = 0.05
+# Ordem de preferência: (Content-Encoding, extensão do arquivo)
+CODIFICACOES = (('br', '.br'), ('gzip', '.gz'))
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+# Arquivos sem hash no nome (referenciados direto, sem {% static %})
+CACHE_SEM_HASH = 'public, max-age=3600'
+
+
+def _comprimir(conteudo):
+    """{extensão: bytes} das versões comprimidas que valem a pena"""
+    versoes = {'.gz': gzip.compress(conteudo, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        versoes['.br'] = brotli.compress(conteudo, quality=11)
+    limite = len(conteudo) * (1 - ECONOMIA_MINIMA)
+    return {extensao: dados for extensao, dados in versoes.items() if len(dados) < limite}
+
+
+class ArmazenamentoEstatico(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage que também grava as versões .gz/.br"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        for original, processado, alterado in super().post_process(paths, dry_run, **options):
+            if not dry_run and processado and not isinstance(alterado, Exception):
+                # O nome original também fica no STATIC_ROOT (acessos sem {% static %})
+                self._gravar_comprimidos(original)
+                self._gravar_comprimidos(processado)
+            yield original, processado, alterado
+
+    def _gravar_comprimidos(self, nome):
+        if os.path.splitext(nome)[1].lower() not in EXTENSOES_COMPRESSIVEIS:
+            return
+        with self.open(nome) as arquivo:
+            conteudo = arquivo.read()
+        for extensao, dados in _comprimir(conteudo).items():
+            caminho = self.path(nome + extensao)
+            with open(caminho, 'wb') as destino:
+                destino.write(dados)
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # collectstatic ainda não rodou (ex.: testes com DEBUG=False): usa o nome sem hash
+            return name
+
+
+class _Arquivo:
+    """Um arquivo do STATIC_ROOT e as suas versões comprimidas"""
+
+    __slots__ = ('caminho', 'content_type', 'imutavel', 'versoes')
+
+    def __init__(self, caminho, imutavel):
+        self.caminho = caminho
+        self.content_type = mimetypes.guess_type(caminho)[0] or 'application/octet-stream'
+        self.imutavel = imutavel
+        # [(Content-Encoding ou None, caminho, tamanho, etag, last-modified)]
+        self.versoes = []
+        for codificacao, extensao in CODIFICACOES + ((None, ''),):
+            variante = caminho + extensao
+            try:
+                info = os.stat(variante)
+            except OSError:
+                continue
+            etag = f'"{int(info.st_mtime):x}-{info.st_size:x}{"-" + codificacao if codificacao else ""}"'
+            self.versoes.append(
+                (codificacao, variante, info.st_size, etag, formatdate(info.st_mtime, usegmt=True))
+            )
+
+    def escolher(self, accept_encoding):
+        aceitas = codificacoes_aceitas(accept_encoding)
+        for versao in self.versoes:
+            if versao[0] is None or aceitas.get(versao[0], aceitas.get('*', 0)) > 0:
+                return versao
+        return self.versoes[-1]
+
+
+def codificacoes_aceitas(accept_encoding):
+    """
+    {codificação: q} do cabeçalho Accept-Encoding ("gzip, br;q=0.5" ->
+    {'gzip': 1.0, 'br': 0.5}). q=0 quer dizer "não aceito".
+    """
+    aceitas = {}
+    for item in accept_encoding.split(','):
+        codificacao, *parametros = [parte.strip() for parte in item.split(';')]
+        if not codificacao:
+            continue
+        q = 1.0
+        for parametro in parametros:
+            nome, _, valor = parametro.partition('=')
+            if nome.strip().lower() == 'q':
+                try:
+                    q = float(valor)
+                except ValueError:
+                    q = 0.0
+        aceitas[codificacao.lower()] = q
+    return aceitas
+
+
+def indexar_estaticos(raiz):
+    """{url relativa: _Arquivo} de tudo que está em `raiz` (o STATIC_ROOT)"""
+    try:
+        with open(os.path.join(raiz, 'staticfiles.json'), encoding='utf-8') as manifesto:
+            com_hash = set(json.load(manifesto).get('paths', {}).values())
+    except (OSError, ValueError):
+        com_hash = set()
+    indice = {}
+    for pasta, _, arquivos in os.walk(raiz):
+        for nome in arquivos:
+            if nome.endswith(('.gz', '.br')) and os.path.exists(os.path.join(pasta, nome[:-3])):
+                continue
+            caminho = os.path.join(pasta, nome)
+            relativo = os.path.relpath(caminho, raiz).replace(os.sep, '/')
+            indice[relativo] = _Arquivo(caminho, imutavel=relativo in com_hash)
+    return indice
+
+
+class ArquivosEstaticosMiddleware:
+    """
+    Serve STATIC_URL a partir do STATIC_ROOT, antes do resto dos
+    middlewares (sessão, autenticação...). O STATIC_ROOT é indexado uma vez
+    por processo; rode o collectstatic antes de (re)iniciar o servidor.
+    Fica logo depois do SecurityMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefixo = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else f'/{settings.STATIC_URL}'
+        self._indice = None
+
+    @property
+    def indice(self):
+        if self._indice is None:
+            raiz = settings.STATIC_ROOT
+            self._indice = indexar_estaticos(str(raiz)) if raiz and os.path.isdir(raiz) else {}
+        return self._indice
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefixo):
+            relativo = posixpath.normpath(unquote(request.path_info[len(self.prefixo):])).lstrip('/')
+            arquivo = self.indice.get(relativo)
+            if arquivo is not None:
+                return self.servir(request, arquivo)
+        return self.get_response(request)
+
+    def servir(self, request, arquivo):
+        codificacao, caminho, tamanho, etag, modificado = arquivo.escolher(
+            request.headers.get('Accept-Encoding', '')
+        )
+        if etag in request.headers.get('If-None-Match', ''):
+            resposta = HttpResponseNotModified()
+        else:
+            # Content-Type do original, não o da versão .gz/.br aberta
+            resposta = FileResponse(open(caminho, 'rb'), content_type=arquivo.content_type)
+            # O FileResponse põe Content-Disposition com o nome do arquivo aberto
+            # (app.css.gz); estáticos não precisam dele
+            resposta.headers.pop('Content-Disposition', None)
+            resposta['Content-Length'] = tamanho
+            if codificacao:
+                resposta['Content-Encoding'] = codificacao
+        resposta['ETag'] = etag
+        resposta['Last-Modified'] = modificado
+        resposta['Cache-Control'] = CACHE_IMUTAVEL if arquivo.imutavel else CACHE_SEM_HASH
+        if len(arquivo.versoes) > 1:
+            resposta['Vary'] = 'Accept-Encoding'
+        return resposta
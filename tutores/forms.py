@@ -1,20 +1,35 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 import re
+from .autocomplete import CampoAutocomplete, opcao_veterinario
+from .cadastro import adicionar_erros_de_conflito
 from .models import Tutor, Animal, CustomUser, PetHistory
+from .nomes_usuario import base_do_email, proximo_username, salvar_com_username
+from .uploads import processar_foto_enviada
 from veterinarios.models import Veterinario
 
 
 class CadastroTutorForm(UserCreationForm):
     cpf = forms.CharField(required=False)
     telefone = forms.CharField(required=False)
-    localizacao_placeholder = forms.CharField(required=False)
+    latitude = forms.DecimalField(max_digits=9, decimal_places=6, min_value=-90, max_value=90, required=False)
+    longitude = forms.DecimalField(max_digits=9, decimal_places=6, min_value=-180, max_value=180, required=False)
 
     class Meta:
         model = CustomUser
         fields = ('first_name', 'email',
                 'telefone', 'cpf', 'password1', 'password2')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # Latitude e longitude só fazem sentido juntas
+        if (cleaned_data.get('latitude') is None) != (cleaned_data.get('longitude') is None):
+            raise ValidationError("Informe latitude e longitude juntas.")
+        cpf = cleaned_data.get('cpf')
+        adicionar_erros_de_conflito(self, ('cpf', Tutor.objects.filter(cpf=cpf) if cpf else None))
+        return cleaned_data
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -22,6 +37,20 @@ class CadastroTutorForm(UserCreationForm):
         if 'username' in self.fields:
             del self.fields['username']
 
+    def save(self, commit=True):
+        user = super().save(commit=False)
+        # Gera username automaticamente a partir do email (parte antes do @)
+        base = base_do_email(self.cleaned_data.get('email'))
+        if commit:
+            def salvar_usuario(username):
+                user.username = username
+                user.save()
+
+            salvar_com_username(base, salvar_usuario)
+        else:
+            user.username = proximo_username(base)
+        return user
+
     def clean_cpf(self):
         cpf = self.cleaned_data.get('cpf')
         if cpf:
@@ -45,11 +74,19 @@ class CadastroTutorForm(UserCreationForm):
 class EditarPerfilTutorForm(forms.ModelForm):
     cpf = forms.CharField(required=False)
     telefone = forms.CharField(required=False)
-    localizacao_placeholder = forms.CharField(required=False)
+    latitude = forms.DecimalField(max_digits=9, decimal_places=6, min_value=-90, max_value=90, required=False)
+    longitude = forms.DecimalField(max_digits=9, decimal_places=6, min_value=-180, max_value=180, required=False)
 
     class Meta:
         model = CustomUser
-        fields = ('first_name', 'last_name', 'email', 'cpf', 'telefone', 'localizacao_placeholder')
+        fields = ('first_name', 'last_name', 'email', 'cpf', 'telefone', 'latitude', 'longitude', 'receber_resumo_email')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # Latitude e longitude só fazem sentido juntas
+        if (cleaned_data.get('latitude') is None) != (cleaned_data.get('longitude') is None):
+            raise ValidationError("Informe latitude e longitude juntas.")
+        return cleaned_data
 
     def clean_cpf(self):
         cpf = self.cleaned_data.get('cpf')
@@ -98,11 +135,24 @@ class CadastroAnimalForm(forms.ModelForm):
         choices.insert(0, ('', 'Selecione a raça'))
         return choices
 
+    def clean_foto(self):
+        foto = self.cleaned_data.get('foto')
+        # Só processa arquivos recém-enviados, não a foto já salva
+        if isinstance(foto, UploadedFile):
+            foto = processar_foto_enviada(foto)
+        return foto
+
 class PetHistoryForm(forms.ModelForm):
+    # Busca no servidor enquanto digita (não lista todos os veterinários na página)
+    veterinarian = CampoAutocomplete(
+        queryset=Veterinario.objects.all(),
+        url_name='tutores:api_buscar_veterinarios',
+        opcao_por_id=opcao_veterinario,
+        required=False,
+        label='Veterinário',
+        help_text='Digite o nome ou o CRMV do veterinário'
+    )
+
     class Meta:
         model = PetHistory
         fields = ['description', 'veterinarian']
-
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.fields['veterinarian'].queryset = Veterinario.objects.all()
@@ -0,0 +1,165 @@
+# tutores/geo.py
+import heapq
+from math import radians, cos, sin, asin, sqrt
+
+from django.db.models import Q
+
+# NumPy é opcional: sem ele o cálculo em lote usa a implementação em Python puro
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Raio médio da Terra em km
+RAIO_TERRA_KM = 6371
+# Quilômetros por grau de latitude
+KM_POR_GRAU = 111.045
+
+
+def calcular_distancia(lat1, lon1, lat2, lon2):
+    """Calcula a distância entre dois pontos usando a fórmula de Haversine"""
+    # 0 é uma coordenada válida (equador, meridiano de Greenwich): só None falta
+    if any(valor is None for valor in (lat1, lon1, lat2, lon2)):
+        return None
+
+    # Raio da Terra em km
+    R = RAIO_TERRA_KM
+
+    lat1, lon1, lat2, lon2 = map(radians, [float(lat1), float(lon1), float(lat2), float(lon2)])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+
+    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+    c = 2 * asin(sqrt(a))
+
+    return R * c
+
+
+def caixa_delimitadora(lat, lon, raio_km):
+    """
+    Retorna (lat_min, lat_max, lon_min, lon_max) do retângulo que contém o
+    círculo de raio `raio_km` em volta do ponto. Perto dos polos a faixa de
+    longitude cobre o globo inteiro.
+    """
+    lat = float(lat)
+    lon = float(lon)
+    delta_lat = raio_km / KM_POR_GRAU
+    lat_min = max(lat - delta_lat, -90.0)
+    lat_max = min(lat + delta_lat, 90.0)
+
+    cos_lat = cos(radians(lat))
+    if lat_min <= -90.0 or lat_max >= 90.0 or cos_lat < 1e-6:
+        return lat_min, lat_max, -180.0, 180.0
+    delta_lon = raio_km / (KM_POR_GRAU * cos_lat)
+    if delta_lon >= 180.0:
+        return lat_min, lat_max, -180.0, 180.0
+    return lat_min, lat_max, lon - delta_lon, lon + delta_lon
+
+
+def filtro_caixa_delimitadora(lat, lon, raio_km, prefixo=''):
+    """Monta o Q do pré-filtro por caixa delimitadora (usa o índice de latitude/longitude)"""
+    lat_min, lat_max, lon_min, lon_max = caixa_delimitadora(lat, lon, raio_km)
+    filtro = Q(**{f'{prefixo}latitude__range': (lat_min, lat_max)})
+    if lon_min < -180.0:
+        # A caixa cruza o antimeridiano: divide a faixa de longitude em duas
+        filtro &= (
+            Q(**{f'{prefixo}longitude__gte': lon_min + 360.0}) |
+            Q(**{f'{prefixo}longitude__lte': lon_max})
+        )
+    elif lon_max > 180.0:
+        filtro &= (
+            Q(**{f'{prefixo}longitude__gte': lon_min}) |
+            Q(**{f'{prefixo}longitude__lte': lon_max - 360.0})
+        )
+    else:
+        filtro &= Q(**{f'{prefixo}longitude__range': (lon_min, lon_max)})
+    return filtro
+
+
+def _distancias_numpy(lat, lon, latitudes, longitudes):
+    """Haversine vetorizado: calcula todas as distâncias em uma única passada"""
+    lat1 = np.radians(float(lat))
+    lon1 = np.radians(float(lon))
+    lat2 = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon2 = np.radians(np.asarray(longitudes, dtype=np.float64))
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _distancias_python(lat, lon, latitudes, longitudes):
+    """Mesmo cálculo do _distancias_numpy, ponto a ponto, para quando não há NumPy"""
+    lat1 = radians(float(lat))
+    lon1 = radians(float(lon))
+    cos_lat1 = cos(lat1)
+    distancias = []
+    for lat2, lon2 in zip(latitudes, longitudes):
+        if lat2 is None or lon2 is None:
+            distancias.append(float('nan'))
+            continue
+        lat2 = radians(float(lat2))
+        lon2 = radians(float(lon2))
+        a = sin((lat2 - lat1) / 2) ** 2 + cos_lat1 * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+        distancias.append(2 * RAIO_TERRA_KM * asin(sqrt(min(a, 1.0))))
+    return distancias
+
+
+def distancias_em_lote(lat, lon, latitudes, longitudes):
+    """
+    Calcula a distância (km) da origem até cada par de coordenadas.
+    Coordenadas ausentes (None) resultam em NaN.
+    """
+    if np is not None:
+        return _distancias_numpy(lat, lon, latitudes, longitudes)
+    return _distancias_python(lat, lon, latitudes, longitudes)
+
+
+def mais_proximas(lat, lon, latitudes, longitudes, k=None, raio_km=None):
+    """
+    Retorna uma lista de (índice, distância) ordenada pela distância, com no
+    máximo `k` itens e apenas os que estão dentro de `raio_km` (se informado).
+
+    Com NumPy usa ordenação parcial (argpartition) para não ordenar o
+    conjunto inteiro quando só os k mais próximos interessam.
+    """
+    if np is not None:
+        distancias = _distancias_numpy(lat, lon, latitudes, longitudes)
+        validos = ~np.isnan(distancias)
+        if raio_km is not None:
+            validos &= distancias <= raio_km
+        indices = np.flatnonzero(validos)
+        if k is not None and k < len(indices):
+            if k <= 0:
+                return []
+            parcial = np.argpartition(distancias[indices], k - 1)[:k]
+            indices = indices[parcial]
+        ordem = indices[np.argsort(distancias[indices], kind='stable')]
+        return [(int(i), float(distancias[i])) for i in ordem]
+
+    distancias = _distancias_python(lat, lon, latitudes, longitudes)
+    pares = [
+        (i, d) for i, d in enumerate(distancias)
+        if d == d and (raio_km is None or d <= raio_km)
+    ]
+    if k is not None and k < len(pares):
+        return heapq.nsmallest(max(k, 0), pares, key=lambda par: par[1])
+    return sorted(pares, key=lambda par: par[1])
+
+
+def ids_no_raio(queryset, lat, lon, raio_km):
+    """
+    Retorna [(id, distancia_km)] das linhas do queryset dentro do raio, da
+    mais próxima para a mais distante. O banco filtra pela caixa
+    delimitadora e devolve só id e coordenadas; a distância exata dos
+    candidatos é calculada em lote.
+    """
+    candidatos = list(
+        queryset.filter(filtro_caixa_delimitadora(lat, lon, raio_km)).values_list('id', 'latitude', 'longitude')
+    )
+    ranking = mais_proximas(
+        lat, lon,
+        [float(latitude) for _, latitude, _ in candidatos],
+        [float(longitude) for _, _, longitude in candidatos],
+        raio_km=raio_km,
+    )
+    return [(candidatos[indice][0], distancia) for indice, distancia in ranking]
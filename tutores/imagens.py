@@ -0,0 +1,189 @@
+# tutores/imagens.py
+"""
+Versões redimensionadas (derivados) das fotos enviadas.
+
+A foto original é mantida; para cada tamanho são gravados um WebP e um JPEG
+(fallback) em <pasta da foto>/derivados/. A geração roda em um pool de
+processos, fora da requisição. Este módulo não importa models: ele também é
+carregado pelos processos do pool, que não configuram o Django.
+"""
+import logging
+import multiprocessing
+import os
+import posixpath
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Maior lado (px) de cada tamanho gerado
+TAMANHOS_FOTO = {
+    'miniatura': 160,
+    'card': 480,
+    'grande': 1280,
+}
+# (extensão, formato do Pillow, opções de gravação)
+FORMATOS_DERIVADOS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+PASTA_DERIVADOS = 'derivados'
+
+
+def nome_derivado(nome, tamanho, extensao):
+    """Nome (no storage) do derivado de `nome`: animais/x.jpg -> animais/derivados/x_card.webp"""
+    pasta, arquivo = posixpath.split(nome)
+    base = posixpath.splitext(arquivo)[0]
+    return posixpath.join(pasta, PASTA_DERIVADOS, f'{base}_{tamanho}.{extensao}')
+
+
+def para_rgb(img):
+    """JPEG não tem transparência: aplica o fundo branco"""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        fundo = Image.new('RGB', img.size, (255, 255, 255))
+        fundo.paste(img, mask=img.getchannel('A'))
+        return fundo
+    return img.convert('RGB') if img.mode != 'RGB' else img
+
+
+def gravar_imagem(img, caminho, formato, opcoes):
+    """Grava `img` em `caminho` (no disco) sem que um leitor veja o arquivo pela metade"""
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    # Nome único: dois processos podem gerar o mesmo arquivo ao mesmo tempo
+    temporario = f'{caminho}.{os.getpid()}.{threading.get_ident()}.tmp'
+    img.save(temporario, formato, **opcoes)
+    # Troca atômica: quem estiver servindo o arquivo nunca vê um derivado pela metade
+    os.replace(temporario, caminho)
+
+
+def reduzir_na_decodificacao(img, maior_lado):
+    """
+    Pede ao decodificador do JPEG a menor escala (1/2, 1/4 ou 1/8) que ainda
+    cubra `maior_lado`; nos demais formatos não faz nada. O draft compara
+    cada eixo separadamente, então recebe o tamanho final com a proporção da
+    foto (uma caixa quadrada não reduziria fotos retangulares).
+    """
+    largura, altura = img.size
+    escala = maior_lado / max(largura, altura)
+    if escala < 1:
+        img.draft('RGB', (max(1, int(largura * escala)), max(1, int(altura * escala))))
+
+
+def gerar_derivados(origem, destinos):
+    """
+    Gera os derivados da imagem em `origem` (caminho no disco).
+    `destinos` é {maior_lado: {extensao: caminho}}. Roda nos processos do
+    pool. Retorna a lista de arquivos gravados.
+    """
+    if not os.path.exists(origem):
+        return []
+    gravados = []
+    with Image.open(origem) as original:
+        # JPEG: decodifica direto na escala mais próxima do maior tamanho pedido
+        reduzir_na_decodificacao(original, max(destinos))
+        img = ImageOps.exif_transpose(original)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'P') else 'RGB')
+        # Do maior para o menor: cada tamanho parte do anterior, que já é menor que o original
+        for maior_lado in sorted(destinos, reverse=True):
+            img.thumbnail((maior_lado, maior_lado), Image.Resampling.LANCZOS)
+            for extensao, formato, opcoes in FORMATOS_DERIVADOS:
+                caminho = destinos[maior_lado].get(extensao)
+                if caminho is None:
+                    continue
+                gravar_imagem(img if formato == 'WEBP' else para_rgb(img), caminho, formato, opcoes)
+                gravados.append(caminho)
+    return gravados
+
+
+def destinos_da_foto(arquivo):
+    """{maior_lado: {extensao: caminho}} dos derivados de um FieldFile, ou None se não estiver em disco"""
+    storage = arquivo.storage
+    destinos = {}
+    try:
+        for tamanho, maior_lado in TAMANHOS_FOTO.items():
+            destinos[maior_lado] = {
+                extensao: storage.path(nome_derivado(arquivo.name, tamanho, extensao))
+                for extensao, _, _ in FORMATOS_DERIVADOS
+            }
+    except NotImplementedError:
+        # Storage remoto (sem caminho local)
+        return None
+    return destinos
+
+
+def urls_derivados(arquivo):
+    """{tamanho: {extensao: url}} dos derivados de um FieldFile"""
+    return {
+        tamanho: {
+            extensao: arquivo.storage.url(nome_derivado(arquivo.name, tamanho, extensao))
+            for extensao, _, _ in FORMATOS_DERIVADOS
+        }
+        for tamanho in TAMANHOS_FOTO
+    }
+
+
+# Pool de processos
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _obter_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: não herda conexões/threads do servidor como o fork herdaria
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.IMAGENS_PROCESSOS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def agendar_derivados(arquivo, ao_concluir=None):
+    """
+    Agenda a geração dos derivados de `arquivo` depois do commit da
+    transação atual. `ao_concluir()` é chamado (no processo do Django)
+    quando todos os arquivos forem gravados. Com IMAGENS_PROCESSOS = 0
+    a geração é feita na hora, sem pool.
+    """
+    destinos = destinos_da_foto(arquivo)
+    if not destinos:
+        return
+    origem = arquivo.path
+
+    def concluir(gravados):
+        if gravados and ao_concluir is not None:
+            ao_concluir()
+
+    def callback(futuro):
+        # Roda em uma thread do pool, que tem a sua própria conexão com o banco
+        try:
+            concluir(futuro.result())
+        except Exception:
+            logger.exception("Falha ao gerar os derivados de %s", origem)
+        finally:
+            close_old_connections()
+
+    def submeter():
+        if settings.IMAGENS_PROCESSOS <= 0:
+            try:
+                concluir(gerar_derivados(origem, destinos))
+            except Exception:
+                logger.exception("Falha ao gerar os derivados de %s", origem)
+            return
+        try:
+            futuro = _obter_pool().submit(gerar_derivados, origem, destinos)
+        except RuntimeError:
+            # Pool encerrado (ex.: desligando o servidor)
+            logger.warning("Pool de imagens indisponível; derivados de %s não gerados", origem)
+            return
+        futuro.add_done_callback(callback)
+
+    transaction.on_commit(submeter)
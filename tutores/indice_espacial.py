@@ -0,0 +1,294 @@
+# tutores/indice_espacial.py
+import logging
+import math
+import sys
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from veterinarios.utils import cache_compartilhado
+
+from .geo import KM_POR_GRAU, caixa_delimitadora, ids_no_raio, mais_proximas
+
+logger = logging.getLogger(__name__)
+
+# Tamanho da célula da grade em graus (0.1° ≈ 11 km de latitude)
+TAMANHO_CELULA_GRAUS = 0.1
+# Distância máxima possível entre dois pontos da Terra (km)
+DISTANCIA_MAXIMA_KM = 20038
+# Versão das clínicas no cache compartilhado, trocada a cada alteração
+CHAVE_VERSAO = 'indice_clinicas:versao'
+
+
+class IndiceEspacialClinicas:
+    """
+    Índice espacial em memória (grade uniforme) das coordenadas das clínicas.
+
+    É construído na primeira consulta e mantido atualizado pelos sinais
+    post_save/post_delete de Clinica. Cada processo tem sua própria cópia:
+    as alterações feitas em outros processos chegam pela versão gravada no
+    cache compartilhado (quem consulta passa a versão que leu e o índice é
+    reconstruído se ela mudou). O índice também é reconstruído depois de
+    `ttl` segundos.
+    """
+
+    def __init__(self, tamanho_celula=TAMANHO_CELULA_GRAUS, ttl=None):
+        self.tamanho_celula = tamanho_celula
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._celulas = {}
+        self._pontos = {}
+        self._construido_em = None
+        self._versao = None
+        self._tempo_reconstrucao_ms = None
+        self._reconstrucoes = 0
+        self._consultas = 0
+
+    # Construção e atualização
+
+    def _celula(self, lat, lon):
+        return (math.floor(lat / self.tamanho_celula), math.floor(lon / self.tamanho_celula))
+
+    def _ttl(self):
+        if self.ttl is not None:
+            return self.ttl
+        return getattr(settings, 'INDICE_CLINICAS_TTL', 300)
+
+    def construido(self):
+        return self._construido_em is not None
+
+    def reconstruir(self, versao=None):
+        """Carrega todas as clínicas com coordenadas em uma única query"""
+        Clinica = apps.get_model('veterinarios', 'Clinica')
+        inicio = time.perf_counter()
+        linhas = Clinica.objects.filter(
+            latitude__isnull=False, longitude__isnull=False
+        ).values_list('id', 'latitude', 'longitude')
+
+        celulas = {}
+        pontos = {}
+        for clinica_id, lat, lon in linhas.iterator():
+            lat, lon = float(lat), float(lon)
+            celula = self._celula(lat, lon)
+            pontos[clinica_id] = (lat, lon, celula)
+            celulas.setdefault(celula, set()).add(clinica_id)
+
+        with self._lock:
+            self._celulas = celulas
+            self._pontos = pontos
+            self._construido_em = time.monotonic()
+            self._versao = versao
+            self._tempo_reconstrucao_ms = (time.perf_counter() - inicio) * 1000
+            self._reconstrucoes += 1
+        logger.info(
+            "Índice de clínicas reconstruído: %d clínicas em %.1f ms",
+            len(pontos), self._tempo_reconstrucao_ms
+        )
+
+    def _desatualizado(self, versao):
+        ttl = self._ttl()
+        return (
+            self._construido_em is None
+            or (ttl and time.monotonic() - self._construido_em > ttl)
+            or (versao is not None and versao != self._versao)
+        )
+
+    def _garantir_construido(self, versao=None):
+        if self._desatualizado(versao):
+            with self._lock:
+                if self._desatualizado(versao):
+                    self.reconstruir(versao)
+
+    def atualizar(self, clinica_id, latitude, longitude):
+        """Insere, move ou remove uma clínica do índice (se já estiver construído)"""
+        if not self.construido():
+            return
+        with self._lock:
+            self._remover(clinica_id)
+            if latitude is None or longitude is None:
+                return
+            lat, lon = float(latitude), float(longitude)
+            celula = self._celula(lat, lon)
+            self._pontos[clinica_id] = (lat, lon, celula)
+            self._celulas.setdefault(celula, set()).add(clinica_id)
+
+    def adotar_versao(self, versao):
+        """
+        Depois de aplicar uma alteração deste processo, assume a versão que
+        ela gerou, se o índice estava na anterior; senão outro processo
+        alterou algo no meio e o índice será reconstruído.
+        """
+        with self._lock:
+            if self._versao is not None and self._versao == versao - 1:
+                self._versao = versao
+
+    def remover(self, clinica_id):
+        if not self.construido():
+            return
+        with self._lock:
+            self._remover(clinica_id)
+
+    def _remover(self, clinica_id):
+        ponto = self._pontos.pop(clinica_id, None)
+        if ponto is None:
+            return
+        ids = self._celulas.get(ponto[2])
+        if ids is not None:
+            ids.discard(clinica_id)
+            if not ids:
+                del self._celulas[ponto[2]]
+
+    def invalidar(self):
+        """Descarta o índice; ele será reconstruído na próxima consulta"""
+        with self._lock:
+            self._celulas = {}
+            self._pontos = {}
+            self._construido_em = None
+            self._versao = None
+
+    # Consultas
+
+    def _candidatos(self, lat, lon, raio_km):
+        lat_min, lat_max, lon_min, lon_max = caixa_delimitadora(lat, lon, raio_km)
+        linha_min, coluna_min = self._celula(lat_min, lon_min)
+        linha_max, coluna_max = self._celula(lat_max, lon_max)
+        colunas_por_volta = math.ceil(360 / self.tamanho_celula)
+
+        ids, latitudes, longitudes = [], [], []
+        with self._lock:
+            self._consultas += 1
+            if (linha_max - linha_min + 1) * (coluna_max - coluna_min + 1) > len(self._celulas):
+                # Caixa maior que o número de células ocupadas: percorre as ocupadas
+                celulas = [c for c in self._celulas if linha_min <= c[0] <= linha_max]
+            else:
+                celulas = []
+                for linha in range(linha_min, linha_max + 1):
+                    for coluna in range(coluna_min, coluna_max + 1):
+                        # Normaliza colunas que cruzam o antimeridiano
+                        coluna_real = (coluna + colunas_por_volta // 2) % colunas_por_volta - colunas_por_volta // 2
+                        celulas.append((linha, coluna_real))
+            for celula in celulas:
+                for clinica_id in self._celulas.get(celula, ()):
+                    ponto_lat, ponto_lon, _ = self._pontos[clinica_id]
+                    ids.append(clinica_id)
+                    latitudes.append(ponto_lat)
+                    longitudes.append(ponto_lon)
+        return ids, latitudes, longitudes
+
+    def no_raio(self, lat, lon, raio_km, limite=None, versao=None):
+        """Retorna [(clinica_id, distancia_km)] dentro do raio, da mais próxima para a mais distante"""
+        self._garantir_construido(versao)
+        ids, latitudes, longitudes = self._candidatos(lat, lon, raio_km)
+        ranking = mais_proximas(lat, lon, latitudes, longitudes, k=limite, raio_km=raio_km)
+        return [(ids[indice], distancia) for indice, distancia in ranking]
+
+    def mais_proximas(self, lat, lon, k, versao=None):
+        """Retorna as k clínicas mais próximas como [(clinica_id, distancia_km)]"""
+        self._garantir_construido(versao)
+        total = len(self._pontos)
+        raio_km = self.tamanho_celula * KM_POR_GRAU
+        while True:
+            resultado = self.no_raio(lat, lon, raio_km, limite=k)
+            # Uma busca por raio é exata: se já achou k (ou todas), o resultado é definitivo
+            if len(resultado) >= min(k, total) or raio_km >= DISTANCIA_MAXIMA_KM:
+                return resultado
+            raio_km = min(raio_km * 2, DISTANCIA_MAXIMA_KM)
+
+    # Métricas
+
+    def memoria_bytes(self):
+        """Estimativa do espaço ocupado pelas estruturas do índice"""
+        with self._lock:
+            total = sys.getsizeof(self._celulas) + sys.getsizeof(self._pontos)
+            for celula, ids in self._celulas.items():
+                total += sys.getsizeof(celula) + sys.getsizeof(ids)
+            for ponto in self._pontos.values():
+                total += sys.getsizeof(ponto) + sys.getsizeof(ponto[0]) + sys.getsizeof(ponto[1])
+        return total
+
+    def metricas(self):
+        return {
+            'construido': self.construido(),
+            'versao': self._versao,
+            'clinicas': len(self._pontos),
+            'celulas': len(self._celulas),
+            'memoria_bytes': self.memoria_bytes(),
+            'tempo_reconstrucao_ms': self._tempo_reconstrucao_ms,
+            'reconstrucoes': self._reconstrucoes,
+            'consultas': self._consultas,
+            'idade_segundos': (
+                time.monotonic() - self._construido_em if self._construido_em is not None else None
+            ),
+        }
+
+
+# Instância única por processo
+indice_clinicas = IndiceEspacialClinicas()
+
+
+def versao_clinicas():
+    """
+    Versão das clínicas no cache compartilhado. None se o cache não for
+    compartilhado ou falhar: aí não há como saber se outro processo
+    alterou alguma clínica.
+    """
+    if not cache_compartilhado():
+        return None
+    try:
+        return cache.get(CHAVE_VERSAO, 0)
+    except Exception:
+        logger.warning("Cache indisponível ao ler a versão das clínicas", exc_info=True)
+        return None
+
+
+def clinicas_no_raio(lat, lon, raio_km):
+    """
+    Retorna [(clinica_id, distancia_km)] das clínicas dentro do raio, da
+    mais próxima para a mais distante.
+
+    O banco é a fonte da verdade: o índice em memória só responde quando a
+    versão do cache compartilhado diz que ele está em dia. Sem ela a busca
+    vai ao banco pela caixa delimitadora (índice clinica_lat_lon_idx).
+    """
+    versao = versao_clinicas()
+    if versao is None:
+        Clinica = apps.get_model('veterinarios', 'Clinica')
+        return ids_no_raio(Clinica.objects.all(), lat, lon, raio_km)
+    return indice_clinicas.no_raio(lat, lon, raio_km, versao=versao)
+
+
+def _publicar_alteracao():
+    """Troca a versão das clínicas para que os outros processos reconstruam o índice"""
+    if not cache_compartilhado():
+        return
+    try:
+        cache.add(CHAVE_VERSAO, 0, None)
+        versao = cache.incr(CHAVE_VERSAO)
+    except Exception:
+        logger.warning("Cache indisponível ao trocar a versão das clínicas", exc_info=True)
+        return
+    indice_clinicas.adotar_versao(versao)
+
+
+def atualizar_indice_clinica(sender, instance, **kwargs):
+    """post_save de Clinica: atualiza o índice depois do commit"""
+    clinica_id, latitude, longitude = instance.pk, instance.latitude, instance.longitude
+
+    def atualizar():
+        indice_clinicas.atualizar(clinica_id, latitude, longitude)
+        _publicar_alteracao()
+    transaction.on_commit(atualizar)
+
+
+def remover_indice_clinica(sender, instance, **kwargs):
+    """post_delete de Clinica: remove do índice depois do commit"""
+    clinica_id = instance.pk
+
+    def remover():
+        indice_clinicas.remover(clinica_id)
+        _publicar_alteracao()
+    transaction.on_commit(remover)
@@ -0,0 +1,70 @@
+# tutores/management/commands/benchmark_distancia.py
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from tutores import geo
+from tutores.geo import calcular_distancia, mais_proximas
+
+
+class Command(BaseCommand):
+    help = 'Compara calcular_distancia (um par por vez) com o ranking em lote de tutores.geo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanhos', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help='Quantidades de clínicas simuladas')
+        parser.add_argument('--k', type=int, default=20, help='Quantidade de clínicas mais próximas')
+        parser.add_argument('--repeticoes', type=int, default=3, help='Execuções por medição (usa a melhor)')
+        parser.add_argument('--semente', type=int, default=42)
+
+    def _medir(self, funcao, repeticoes):
+        melhor = None
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            funcao()
+            decorrido = time.perf_counter() - inicio
+            melhor = decorrido if melhor is None else min(melhor, decorrido)
+        return melhor * 1000
+
+    def handle(self, *args, **options):
+        aleatorio = random.Random(options['semente'])
+        k = options['k']
+        repeticoes = options['repeticoes']
+        # Origem e clínicas espalhadas pela região de São Paulo
+        origem = (-23.55, -46.63)
+
+        self.stdout.write(f"NumPy disponível: {'sim' if geo.np is not None else 'não'}")
+        self.stdout.write(f"{'clínicas':>10} {'escalar (ms)':>14} {'lote python (ms)':>18} {'lote numpy (ms)':>17}")
+
+        for tamanho in options['tamanhos']:
+            latitudes = [aleatorio.uniform(-24.5, -22.5) for _ in range(tamanho)]
+            longitudes = [aleatorio.uniform(-47.5, -45.5) for _ in range(tamanho)]
+
+            def escalar():
+                distancias = [
+                    (i, calcular_distancia(origem[0], origem[1], lat, lon))
+                    for i, (lat, lon) in enumerate(zip(latitudes, longitudes))
+                ]
+                distancias.sort(key=lambda par: par[1])
+                return distancias[:k]
+
+            def lote():
+                return mais_proximas(origem[0], origem[1], latitudes, longitudes, k=k)
+
+            tempo_escalar = self._medir(escalar, repeticoes)
+
+            # Força a implementação em Python puro para comparar com o NumPy
+            numpy = geo.np
+            geo.np = None
+            try:
+                tempo_python = self._medir(lote, repeticoes)
+            finally:
+                geo.np = numpy
+
+            if numpy is not None:
+                tempo_numpy = f"{self._medir(lote, repeticoes):17.2f}"
+            else:
+                tempo_numpy = f"{'-':>17}"
+
+            self.stdout.write(f"{tamanho:>10} {tempo_escalar:14.2f} {tempo_python:18.2f} {tempo_numpy}")
@@ -0,0 +1,45 @@
+# tutores/management/commands/benchmark_indice_clinicas.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from tutores.geo import ids_no_raio
+from tutores.indice_espacial import IndiceEspacialClinicas
+from veterinarios.models import Clinica
+
+
+class Command(BaseCommand):
+    help = (
+        'Constrói neste processo um índice espacial das clínicas, mostra suas métricas (memória, '
+        'tempo de reconstrução) e compara a busca por raio no índice com a do banco. Não mostra '
+        'o índice dos servidores em execução.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lat', type=float, default=-23.55, help='Latitude da origem')
+        parser.add_argument('--lon', type=float, default=-46.63, help='Longitude da origem')
+        parser.add_argument('--raios', type=float, nargs='+', default=[5, 20, 100], help='Raios (km) medidos')
+        parser.add_argument('--repeticoes', type=int, default=5, help='Execuções por medição (usa a melhor)')
+
+    def _medir(self, funcao, repeticoes):
+        melhor = None
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            resultado = funcao()
+            decorrido = time.perf_counter() - inicio
+            melhor = decorrido if melhor is None else min(melhor, decorrido)
+        return resultado, melhor * 1000
+
+    def handle(self, *args, **options):
+        lat, lon, repeticoes = options['lat'], options['lon'], options['repeticoes']
+        # Índice próprio: o indice_clinicas deste processo não é o dos servidores
+        indice = IndiceEspacialClinicas(ttl=0)
+        indice.reconstruir()
+        for nome, valor in indice.metricas().items():
+            self.stdout.write(f"{nome}: {valor}")
+
+        self.stdout.write(f"{'raio (km)':>10} {'clínicas':>9} {'índice (ms)':>12} {'banco (ms)':>11}")
+        for raio in options['raios']:
+            ranking, tempo_indice = self._medir(lambda: indice.no_raio(lat, lon, raio), repeticoes)
+            _, tempo_banco = self._medir(lambda: ids_no_raio(Clinica.objects.all(), lat, lon, raio), repeticoes)
+            self.stdout.write(f"{raio:>10g} {len(ranking):>9} {tempo_indice:12.2f} {tempo_banco:11.2f}")
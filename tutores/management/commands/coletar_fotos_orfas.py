@@ -0,0 +1,66 @@
+# tutores/management/commands/coletar_fotos_orfas.py
+import os
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from tutores.armazenamento import CAMPOS_POR_CONTEUDO, apagar_arquivo, armazenamento_por_conteudo, nomes_em_uso
+from tutores.imagens import PASTA_DERIVADOS
+
+
+class Command(BaseCommand):
+    help = 'Apaga as fotos (e os seus derivados) que nenhum animal ou clínica usa mais'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=float, default=24,
+                            help='Só apaga arquivos mais antigos que isso, para não pegar envios em andamento (padrão: 24)')
+        parser.add_argument('--simular', action='store_true', help='Só lista o que seria apagado')
+
+    def handle(self, *args, **options):
+        armazenamento = armazenamento_por_conteudo()
+        em_uso = nomes_em_uso()
+        bases_em_uso = {os.path.splitext(os.path.basename(nome))[0] for nome in em_uso}
+        limite = time.time() - options['horas'] * 3600
+        pastas = sorted({
+            apps.get_model(modelo)._meta.get_field(campo).upload_to.rstrip('/')
+            for modelo, campo in CAMPOS_POR_CONTEUDO
+        })
+
+        apagados = liberados = 0
+        for pasta in pastas:
+            if not armazenamento.exists(pasta):
+                continue
+            _, arquivos = armazenamento.listdir(pasta)
+            for arquivo in arquivos:
+                nome = f'{pasta}/{arquivo}'
+                if nome in em_uso or arquivo.endswith('.tmp'):
+                    continue
+                if os.path.getmtime(armazenamento.path(nome)) > limite:
+                    continue
+                liberados += os.path.getsize(armazenamento.path(nome))
+                apagados += 1
+                self.stdout.write(f"  {nome}")
+                if not options['simular']:
+                    apagar_arquivo(nome)
+
+            # Derivados cuja foto original já não existe
+            pasta_derivados = f'{pasta}/{PASTA_DERIVADOS}'
+            if armazenamento.exists(pasta_derivados):
+                _, derivados = armazenamento.listdir(pasta_derivados)
+                for arquivo in derivados:
+                    nome = f'{pasta_derivados}/{arquivo}'
+                    if arquivo.rsplit('_', 1)[0] in bases_em_uso:
+                        continue
+                    if os.path.getmtime(armazenamento.path(nome)) > limite:
+                        continue
+                    liberados += os.path.getsize(armazenamento.path(nome))
+                    apagados += 1
+                    if not options['simular']:
+                        armazenamento.delete(nome)
+
+        acao = 'seriam apagados' if options['simular'] else 'apagados'
+        self.stdout.write(self.style.SUCCESS(
+            f"{apagados} arquivo(s) {acao} ({liberados / 1024 / 1024:.1f} MB)."
+        ))
+
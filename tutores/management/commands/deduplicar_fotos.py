@@ -0,0 +1,43 @@
+# tutores/management/commands/deduplicar_fotos.py
+from django.apps import apps
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from tutores.armazenamento import CAMPOS_POR_CONTEUDO, armazenamento_por_conteudo, eh_nome_por_conteudo
+
+
+class Command(BaseCommand):
+    help = 'Passa as fotos já cadastradas para o armazenamento por conteúdo (arquivos iguais viram um só)'
+
+    def handle(self, *args, **options):
+        armazenamento = armazenamento_por_conteudo()
+        convertidas = ausentes = 0
+        novos_nomes = {}
+        for modelo, campo in CAMPOS_POR_CONTEUDO:
+            Model = apps.get_model(modelo)
+            registros = (
+                Model._default_manager.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+                .values_list('pk', campo)
+            )
+            for pk, nome in registros.iterator():
+                if eh_nome_por_conteudo(nome):
+                    continue
+                if nome not in novos_nomes:
+                    if not armazenamento.exists(nome):
+                        ausentes += 1
+                        continue
+                    with armazenamento.open(nome) as arquivo:
+                        novos_nomes[nome] = armazenamento.save(nome, File(arquivo))
+                # update(): os arquivos antigos ficam para o coletar_fotos_orfas
+                Model._default_manager.filter(pk=pk).update(**{campo: novos_nomes[nome]})
+                convertidas += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{convertidas} foto(s) convertidas em {len(set(novos_nomes.values()))} arquivo(s); "
+            f"{ausentes} ignorada(s) (arquivo ausente)."
+        ))
+        if convertidas:
+            self.stdout.write(
+                "Rode `coletar_fotos_orfas --horas 0` para apagar os arquivos antigos "
+                "e `gerar_derivados_fotos` para gerar os tamanhos das fotos dos animais."
+            )
@@ -0,0 +1,30 @@
+# tutores/management/commands/gerar_derivados_fotos.py
+from django.core.management.base import BaseCommand
+
+from tutores.imagens import destinos_da_foto, gerar_derivados
+from tutores.models import Animal
+from tutores.versoes import atualizar_versoes
+
+
+class Command(BaseCommand):
+    help = 'Gera os tamanhos (WebP + JPEG) das fotos de animais que ainda não têm derivados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true', help='Regera também as fotos que já têm derivados')
+
+    def handle(self, *args, **options):
+        animais = Animal.objects.exclude(foto='').exclude(foto__isnull=True).only('id', 'tutor_id', 'foto', 'foto_derivados')
+        gerados = ignorados = 0
+        for animal in animais.iterator():
+            if animal.derivados_prontos and not options['todas']:
+                continue
+            destinos = destinos_da_foto(animal.foto)
+            if not destinos or not gerar_derivados(animal.foto.path, destinos):
+                ignorados += 1
+                continue
+            Animal.objects.filter(pk=animal.pk).update(foto_derivados=animal.foto.name)
+            atualizar_versoes(('animal', animal.pk), ('tutor', animal.tutor_id))
+            gerados += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Derivados gerados para {gerados} foto(s); {ignorados} ignorada(s) (arquivo ausente)."
+        ))
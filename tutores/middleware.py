@@ -0,0 +1,159 @@
+# tutores/middleware.py
+import logging
+import time
+
+from django.apps import apps
+from django.core.cache import cache
+from django.http import Http404
+from django.utils.functional import SimpleLazyObject
+
+from veterinarios.utils import cache_compartilhado
+
+logger = logging.getLogger(__name__)
+
+# Chave da sessão com o papel já resolvido do usuário
+SESSAO_PERFIL = '_perfil_usuario'
+
+PAPEL_TUTOR = 'tutor'
+PAPEL_VETERINARIO = 'veterinario'
+
+
+def chave_versao_perfil(user_id):
+    return f'perfil:versao:{user_id}'
+
+
+def _versao_perfil(user_id):
+    """
+    Versão atual do perfil no cache (0 se nunca foi invalidado). None se o
+    cache falhar ou não for compartilhado: a invalidação feita em outro
+    processo não chegaria aqui, então o papel não pode vir da sessão.
+    """
+    if not cache_compartilhado():
+        return None
+    try:
+        return cache.get(chave_versao_perfil(user_id), 0)
+    except Exception:
+        logger.warning("Cache indisponível ao ler a versão do perfil", exc_info=True)
+        return None
+
+
+def invalidar_perfil_usuario(user_id):
+    """
+    Faz com que o papel guardado nas sessões do usuário seja resolvido de
+    novo na próxima requisição (em qualquer processo que use o mesmo cache).
+    """
+    if not cache_compartilhado():
+        return
+    try:
+        cache.set(chave_versao_perfil(user_id), time.time_ns(), None)
+    except Exception:
+        logger.warning("Cache indisponível ao invalidar o perfil", exc_info=True)
+
+
+def _buscar_papel(user):
+    """Descobre o papel do usuário no banco: (papel, id do perfil) ou (None, None)"""
+    Tutor = apps.get_model('tutores', 'Tutor')
+    Veterinario = apps.get_model('veterinarios', 'Veterinario')
+    tutor_id = Tutor.objects.filter(usuario_id=user.pk).values_list('id', flat=True).first()
+    if tutor_id is not None:
+        return PAPEL_TUTOR, tutor_id
+    veterinario_id = Veterinario.objects.filter(usuario_id=user.pk).values_list('id', flat=True).first()
+    if veterinario_id is not None:
+        return PAPEL_VETERINARIO, veterinario_id
+    return None, None
+
+
+def _resolver_papel(request):
+    """Papel do usuário da requisição, usando a sessão quando ainda é válida"""
+    user = request.user
+    if not user.is_authenticated:
+        return None, None
+
+    versao = _versao_perfil(user.pk)
+    salvo = request.session.get(SESSAO_PERFIL)
+    if versao is not None and salvo and salvo.get('usuario') == user.pk and salvo.get('versao') == versao:
+        return salvo.get('papel'), salvo.get('id')
+
+    papel, perfil_id = _buscar_papel(user)
+    if versao is not None:
+        request.session[SESSAO_PERFIL] = {
+            'usuario': user.pk, 'versao': versao, 'papel': papel, 'id': perfil_id
+        }
+    return papel, perfil_id
+
+
+def _carregar_perfil(request, modelo, perfil_id):
+    def carregar():
+        Model = apps.get_model(*modelo.split('.'))
+        perfil = Model.objects.filter(pk=perfil_id).first()
+        if perfil is None:
+            # O perfil foi removido por outro processo: resolve de novo na próxima requisição
+            request.session.pop(SESSAO_PERFIL, None)
+            raise Http404("Perfil não encontrado.")
+        # Evita uma query extra para perfil.usuario
+        perfil.usuario = request.user
+        return perfil
+    return SimpleLazyObject(carregar)
+
+
+def atualizar_perfil_da_requisicao(request):
+    """
+    (Re)define request.papel, request.perfil_id, request.tutor e
+    request.veterinario. Chame depois de login() ou de criar/remover o
+    perfil na mesma requisição.
+    """
+    papel, perfil_id = _resolver_papel(request)
+    request.papel = papel
+    # Id do Tutor/Veterinario, sem carregar o perfil
+    request.perfil_id = perfil_id
+    request.tutor = (
+        _carregar_perfil(request, 'tutores.Tutor', perfil_id) if papel == PAPEL_TUTOR else None
+    )
+    request.veterinario = (
+        _carregar_perfil(request, 'veterinarios.Veterinario', perfil_id) if papel == PAPEL_VETERINARIO else None
+    )
+
+
+def tutor_ou_404(request):
+    """Perfil de tutor do usuário logado (substitui get_object_or_404(Tutor, usuario=request.user))"""
+    if getattr(request, 'tutor', None) is None:
+        raise Http404("Perfil de tutor não encontrado.")
+    return request.tutor
+
+
+def veterinario_ou_404(request):
+    """Perfil de veterinário do usuário logado"""
+    if getattr(request, 'veterinario', None) is None:
+        raise Http404("Perfil de veterinário não encontrado.")
+    return request.veterinario
+
+
+class PerfilUsuarioMiddleware:
+    """
+    Resolve uma vez por requisição se o usuário é tutor ou veterinário.
+
+    Com cache compartilhado, o papel e o id do perfil ficam na sessão, então
+    as próximas requisições não consultam o banco; a criação/remoção de
+    Tutor ou Veterinario invalida o que está na sessão
+    (invalidar_perfil_usuario). Sem ele o papel é consultado a cada
+    requisição. Os perfis em request.tutor/request.veterinario só são
+    carregados se forem usados. Deve vir depois do AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        atualizar_perfil_da_requisicao(request)
+        return self.get_response(request)
+
+
+def invalidar_perfil_ao_salvar(sender, instance, created=False, raw=False, **kwargs):
+    """post_save de Tutor/Veterinario"""
+    if created and not raw:
+        invalidar_perfil_usuario(instance.usuario_id)
+
+
+def invalidar_perfil_ao_remover(sender, instance, **kwargs):
+    """post_delete de Tutor/Veterinario"""
+    invalidar_perfil_usuario(instance.usuario_id)
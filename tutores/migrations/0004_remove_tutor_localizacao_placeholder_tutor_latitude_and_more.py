@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutores', '0003_animal_microchip_alter_animal_especie_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='tutor',
+            name='localizacao_placeholder',
+        ),
+        migrations.AddField(
+            model_name='tutor',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='tutor',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+    ]
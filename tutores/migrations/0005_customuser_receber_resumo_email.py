@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutores', '0004_remove_tutor_localizacao_placeholder_tutor_latitude_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='receber_resumo_email',
+            field=models.BooleanField(default=False, verbose_name='Receber notificações por email em resumo'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutores', '0005_customuser_receber_resumo_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='animal',
+            name='foto_derivados',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:40
+
+import tutores.armazenamento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutores', '0006_animal_foto_derivados'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='animal',
+            name='foto',
+            field=models.ImageField(blank=True, default='animais/default_animal.jpg', null=True, storage=tutores.armazenamento.armazenamento_por_conteudo, upload_to='animais/'),
+        ),
+    ]
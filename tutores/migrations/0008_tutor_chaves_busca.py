@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+from veterinarios.texto import normalizar_texto, somente_digitos
+
+
+def preencher_chaves_busca(apps, schema_editor):
+    Tutor = apps.get_model('tutores', 'Tutor')
+    tutores = Tutor.objects.select_related('usuario').only(
+        'id', 'cpf', 'telefone', 'usuario__first_name', 'usuario__last_name', 'usuario__username'
+    ).order_by('id')
+    lote = []
+    for tutor in tutores.iterator(chunk_size=500):
+        usuario = tutor.usuario
+        nome = f"{usuario.first_name} {usuario.last_name}".strip() or usuario.username
+        tutor.nome_normalizado = normalizar_texto(nome)[:300]
+        tutor.cpf_digitos = somente_digitos(tutor.cpf)[:14]
+        tutor.telefone_digitos = somente_digitos(tutor.telefone)[:15]
+        lote.append(tutor)
+        if len(lote) >= 500:
+            Tutor.objects.bulk_update(lote, ['nome_normalizado', 'cpf_digitos', 'telefone_digitos'])
+            lote = []
+    if lote:
+        Tutor.objects.bulk_update(lote, ['nome_normalizado', 'cpf_digitos', 'telefone_digitos'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutores', '0007_alter_animal_foto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tutor',
+            name='cpf_digitos',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=14),
+        ),
+        migrations.AddField(
+            model_name='tutor',
+            name='nome_normalizado',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=300),
+        ),
+        migrations.AddField(
+            model_name='tutor',
+            name='telefone_digitos',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=15),
+        ),
+        migrations.RunPython(preencher_chaves_busca, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:45
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def preencher_contador(apps, schema_editor):
+    CustomUser = apps.get_model('tutores', 'CustomUser')
+    Notification = apps.get_model('veterinarios', 'Notification')
+    nao_lidas = Notification.objects.filter(user=OuterRef('pk'), is_read=False).order_by().values(
+        'user'
+    ).annotate(total=Count('id')).values('total')
+    CustomUser.objects.update(notificacoes_nao_lidas=Coalesce(Subquery(nao_lidas), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutores', '0008_tutor_chaves_busca'),
+        ('veterinarios', '0010_notification_notification_user_lida_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='notificacoes_nao_lidas',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(preencher_contador, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutores', '0009_customuser_notificacoes_nao_lidas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoDados',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('versao', models.BigIntegerField()),
+            ],
+            options={
+                'constraints': [
+                    models.UniqueConstraint(fields=('tipo', 'objeto_id'), name='versao_dados_tipo_objeto_unico'),
+                ],
+            },
+        ),
+    ]
@@ -1,13 +1,22 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
-from PIL import Image
-import os
+
+from .armazenamento import armazenamento_por_conteudo
+from veterinarios.texto import normalizar_texto, somente_digitos
 
 # Usuário personalizado
 class CustomUser(AbstractUser):
     telefone = models.CharField(max_length=15, blank=True, null=True)
     cpf = models.CharField(max_length=14, blank=True, null=True)
+    # Recebe as notificações por email agrupadas em um resumo periódico
+    receber_resumo_email = models.BooleanField(
+        default=False,
+        verbose_name='Receber notificações por email em resumo'
+    )
+    # Notificações não lidas, mantido por veterinarios.utils junto com as
+    # notificações (o menu mostra o número sem COUNT a cada página)
+    notificacoes_nao_lidas = models.IntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.username
@@ -26,22 +35,16 @@ class TutorManager(models.Manager):
     """Manager customizado para Tutor que sempre usa only() com campos que existem"""
     def get_queryset(self):
         # Usa only() para buscar apenas os campos que existem na tabela
-        return super().get_queryset().only('id', 'usuario_id', 'telefone', 'cpf', 'localizacao_placeholder')
+        return super().get_queryset().only('id', 'usuario_id', 'telefone', 'cpf', 'latitude', 'longitude')
     
     def get(self, *args, **kwargs):
-        return self.get_queryset().only('id', 'usuario_id', 'telefone', 'cpf', 'localizacao_placeholder').get(*args, **kwargs)
+        return self.get_queryset().only('id', 'usuario_id', 'telefone', 'cpf', 'latitude', 'longitude').get(*args, **kwargs)
     
     def filter(self, *args, **kwargs):
-        return self.get_queryset().only('id', 'usuario_id', 'telefone', 'cpf', 'localizacao_placeholder').filter(*args, **kwargs)
+        return self.get_queryset().only('id', 'usuario_id', 'telefone', 'cpf', 'latitude', 'longitude').filter(*args, **kwargs)
     
     def first(self):
-        return self.get_queryset().only('id', 'usuario_id', 'telefone', 'cpf', 'localizacao_placeholder').first()
-    
-    def create(self, **kwargs):
-        # Remove campos que não existem antes de criar
-        kwargs.pop('latitude', None)
-        kwargs.pop('longitude', None)
-        return super().create(**kwargs)
+        return self.get_queryset().only('id', 'usuario_id', 'telefone', 'cpf', 'latitude', 'longitude').first()
 
 
 # Tutor
@@ -57,12 +60,30 @@ class Tutor(models.Model):
         managed = True
     telefone = models.CharField(max_length=15, blank=True, null=True)
     cpf = models.CharField(max_length=14, unique=True, blank=True, null=True)
-    localizacao_placeholder = models.CharField(max_length=255, blank=True, null=True)
-    # Nota: Campos de geolocalização (latitude/longitude) não existem na tabela do banco
-    # Se necessário, podem ser adicionados via migração futura
+    # Localização opcional do tutor, usada na busca de clínicas próximas
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    # Chaves da busca por prefixo (autocomplete), preenchidas no save()
+    nome_normalizado = models.CharField(max_length=300, blank=True, default='', db_index=True, editable=False)
+    cpf_digitos = models.CharField(max_length=14, blank=True, default='', db_index=True, editable=False)
+    telefone_digitos = models.CharField(max_length=15, blank=True, default='', db_index=True, editable=False)
 
     objects = TutorManager()
 
+    def atualizar_chaves_busca(self):
+        """Preenche as chaves de busca a partir do nome do usuário, CPF e telefone"""
+        usuario = self.usuario
+        self.nome_normalizado = normalizar_texto(usuario.get_full_name() or usuario.username)[:300]
+        self.cpf_digitos = somente_digitos(self.cpf)[:14]
+        self.telefone_digitos = somente_digitos(self.telefone)[:15]
+
+    def save(self, *args, **kwargs):
+        self.atualizar_chaves_busca()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'nome_normalizado', 'cpf_digitos', 'telefone_digitos'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Tutor: {self.usuario.get_full_name() or self.usuario.username}"
 
@@ -116,23 +137,50 @@ class Animal(models.Model):
 
     foto = models.ImageField(
         upload_to='animais/',
+        storage=armazenamento_por_conteudo,
         blank=True,
         null=True,
         default='animais/default_animal.jpg'
     )
+    # Nome da foto cujos derivados (tamanhos em WebP/JPEG) já foram gerados
+    foto_derivados = models.CharField(max_length=100, blank=True, default='', editable=False)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'foto' in field_names:
+            instance._foto_salva = instance.foto.name
+        return instance
+
+    def foto_mudou(self):
+        """True se a foto é nova/trocada desde a leitura do banco (ou ainda não tem derivados)"""
+        if not self.foto:
+            return False
+        if not self.foto._committed:
+            return True
+        return self.foto.name != getattr(self, '_foto_salva', None) or self.foto_derivados != self.foto.name
+
+    @property
+    def derivados_prontos(self):
+        return bool(self.foto) and self.foto_derivados == self.foto.name
 
     def save(self, *args, **kwargs):
+        from .imagens import agendar_derivados
+        from .versoes import atualizar_versoes
+
+        gerar = self.foto_mudou()
         super().save(*args, **kwargs)
-        if self.foto:
-            try:
-                # Verifica se o arquivo existe antes de processar
-                if hasattr(self.foto, 'path') and os.path.exists(self.foto.path):
-                    img = Image.open(self.foto.path)
-                    img.thumbnail((300, 300))
-                    img.save(self.foto.path, quality=85)
-            except Exception as e:
-                # Se houver erro no processamento, apenas ignora mas não impede o salvamento
-                pass
+        if gerar:
+            # A original é mantida; os tamanhos menores são gerados fora da requisição
+            pk, tutor_id, nome = self.pk, self.tutor_id, self.foto.name
+
+            def derivados_gerados():
+                Animal.objects.filter(pk=pk, foto=nome).update(foto_derivados=nome)
+                # update() não dispara os sinais: as páginas passam a usar os derivados
+                atualizar_versoes(('animal', pk), ('tutor', tutor_id))
+
+            agendar_derivados(self.foto, ao_concluir=derivados_gerados)
+        self._foto_salva = self.foto.name if self.foto else None
 
     def __str__(self):
         return f"{self.nome} ({self.especie})"
@@ -157,3 +205,23 @@ class PetHistory(models.Model):
 
     def __str__(self):
         return f"Histórico: {self.animal.nome} - {self.date}"
+
+
+class VersaoDados(models.Model):
+    """
+    Versão (carimbo de tempo em ns) de um objeto mostrado nas páginas, para
+    o GET condicional quando o cache não é compartilhado entre os processos.
+    Mantida por tutores.versoes.
+    """
+    tipo = models.CharField(max_length=20)
+    objeto_id = models.BigIntegerField()
+    versao = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            # Permite gravar as versões com bulk_create(update_conflicts=True)
+            models.UniqueConstraint(fields=['tipo', 'objeto_id'], name='versao_dados_tipo_objeto_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo}:{self.objeto_id} = {self.versao}"
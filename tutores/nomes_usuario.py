@@ -0,0 +1,70 @@
+# tutores/nomes_usuario.py
+"""
+Username dos cadastros, gerado a partir do email: joao@x.com -> joao,
+joao1, joao2...
+
+O próximo sufixo livre sai de uma única consulta (a do maior sufixo já
+usado, pelo índice do username), em vez de uma consulta por nome já
+ocupado. Dois cadastros simultâneos podem escolher o mesmo nome; quem
+perde recebe IntegrityError do índice único e tenta o sufixo seguinte.
+"""
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Length
+
+# Tentativas antes de desistir quando outros cadastros pegam o mesmo nome
+MAX_TENTATIVAS = 10
+TAMANHO_MAXIMO = 150  # AbstractUser.username
+BASE_PADRAO = 'usuario'
+
+
+def base_do_email(email):
+    """Parte do email antes do @, cortada para caber o sufixo numérico"""
+    base = (email or '').split('@')[0].strip()
+    return base[:TAMANHO_MAXIMO - 10] or BASE_PADRAO
+
+
+def proximo_username(base, minimo=0):
+    """
+    Primeiro username livre para `base` (base, base1, base2...), com sufixo
+    maior que `minimo` quando informado.
+    """
+    User = get_user_model()
+    # O startswith usa o índice do username; o regex descarta "joaozinho" etc.
+    maior = (
+        User.objects.filter(username__startswith=base, username__regex=rf'^{re.escape(base)}[0-9]*$')
+        .order_by(Length('username').desc(), '-username')
+        .values_list('username', flat=True)
+        .first()
+    )
+    if maior is None:
+        sufixo = 0
+    else:
+        # Sufixos de mesmo tamanho comparam como texto na mesma ordem dos números
+        sufixo = int(maior[len(base):] or 0) + 1
+    sufixo = max(sufixo, minimo)
+    return f'{base}{sufixo}' if sufixo else base
+
+
+def salvar_com_username(base, salvar, tentativas=MAX_TENTATIVAS):
+    """
+    Chama salvar(username) com o próximo username livre para `base` e
+    retorna o que ela retornar. Se outro cadastro gravar o mesmo username
+    antes, tenta o sufixo seguinte (cada tentativa em um savepoint, então
+    pode ser usada dentro de transaction.atomic()).
+    """
+    minimo = 0
+    for tentativa in range(tentativas):
+        username = proximo_username(base, minimo)
+        try:
+            with transaction.atomic():
+                return salvar(username)
+        except IntegrityError as erro:
+            # Outros campos únicos (ex.: CPF) não se resolvem trocando o nome
+            if 'username' not in str(erro) or tentativa == tentativas - 1:
+                raise
+        # Em REPEATABLE READ a próxima consulta pode não ver o nome que
+        # acabou de ser gravado: garante que o sufixo avance
+        minimo = int(username[len(base):] or 0) + 1
@@ -0,0 +1,93 @@
+# tutores/paginacao.py
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def codificar_cursor(dados):
+    """Serializa os dados do cursor em uma string segura para URL"""
+    texto = json.dumps(dados, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Lê um cursor gerado por codificar_cursor; retorna None se for inválido"""
+    if not cursor:
+        return None
+    try:
+        preenchimento = '=' * (-len(cursor) % 4)
+        dados = json.loads(base64.urlsafe_b64decode(cursor + preenchimento).decode())
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return dados if isinstance(dados, dict) else None
+
+
+def ler_tamanho_pagina(request, padrao, maximo):
+    """Lê ?por_pagina= da requisição respeitando o máximo configurado"""
+    try:
+        tamanho = int(request.GET.get('por_pagina', padrao))
+    except (TypeError, ValueError):
+        return padrao
+    return max(1, min(tamanho, maximo))
+
+
+def pagina_keyset(queryset, campos, cursor, tamanho, decrescente=False):
+    """
+    Paginação por chave (keyset): em vez de OFFSET, filtra as linhas depois
+    da última linha da página anterior, usando a ordenação por `campos`
+    (o último deve ser único, normalmente 'id').
+
+    Retorna (itens, proximo_cursor); proximo_cursor é None na última página.
+    """
+    prefixo = '-' if decrescente else ''
+    queryset = queryset.order_by(*[f'{prefixo}{campo}' for campo in campos])
+
+    dados = decodificar_cursor(cursor)
+    if dados and all(campo in dados for campo in campos):
+        operador = 'lt' if decrescente else 'gt'
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+        filtro = Q()
+        for i, campo in enumerate(campos):
+            condicao = Q(**{f'{campo}__{operador}': dados[campo]})
+            for anterior in campos[:i]:
+                condicao &= Q(**{anterior: dados[anterior]})
+            filtro |= condicao
+        try:
+            queryset = queryset.filter(filtro)
+        except (ValueError, TypeError, ValidationError):
+            # Cursor alterado (valor que não serve para o campo): volta à primeira página
+            pass
+
+    # Busca um item a mais só para saber se existe próxima página
+    itens = list(queryset[:tamanho + 1])
+    proximo_cursor = None
+    if len(itens) > tamanho:
+        itens = itens[:tamanho]
+        ultimo = itens[-1]
+        proximo_cursor = codificar_cursor({campo: getattr(ultimo, campo) for campo in campos})
+    return itens, proximo_cursor
+
+
+def pagina_de_ranking(queryset, ids_ordenados, cursor, tamanho):
+    """
+    Pagina uma lista de ids já ordenada (ranking de relevância ou de
+    distância calculado fora do banco). Só os ids da página são buscados.
+
+    Retorna (itens, proximo_cursor).
+    """
+    dados = decodificar_cursor(cursor) or {}
+    try:
+        inicio = max(int(dados.get('inicio', 0)), 0)
+    except (TypeError, ValueError):
+        inicio = 0
+
+    ids_pagina = ids_ordenados[inicio:inicio + tamanho]
+    por_id = queryset.in_bulk(ids_pagina)
+    itens = [por_id[i] for i in ids_pagina if i in por_id]
+
+    proximo_cursor = None
+    if len(ids_ordenados) > inicio + tamanho:
+        proximo_cursor = codificar_cursor({'inicio': inicio + tamanho})
+    return itens, proximo_cursor
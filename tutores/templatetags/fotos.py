@@ -0,0 +1,44 @@
+# tutores/templatetags/fotos.py
+from django import template
+
+from tutores.imagens import TAMANHOS_FOTO, urls_derivados
+from veterinarios.miniaturas import urls_miniaturas_clinica
+
+register = template.Library()
+
+
+@register.inclusion_tag('tutores/_foto_responsiva.html')
+def foto_animal(animal, tamanho='card', classe='', sizes=None):
+    """
+    <picture> com srcset em WebP e fallback JPEG dos derivados da foto.
+    Enquanto os derivados não existirem, usa a foto original.
+
+    Uso: {% foto_animal animal 'miniatura' 'pet-photo' '80px' %}
+    """
+    contexto = {
+        'animal': animal,
+        'classe': classe,
+        'original': animal.foto.url if animal.foto else '',
+        'prontos': animal.derivados_prontos,
+    }
+    if contexto['prontos']:
+        urls = urls_derivados(animal.foto)
+        contexto.update({
+            'src': urls[tamanho]['jpg'],
+            'srcset_webp': ', '.join(f"{urls[t]['webp']} {largura}w" for t, largura in TAMANHOS_FOTO.items()),
+            'srcset_jpg': ', '.join(f"{urls[t]['jpg']} {largura}w" for t, largura in TAMANHOS_FOTO.items()),
+            'sizes': sizes or f'{TAMANHOS_FOTO[tamanho]}px',
+        })
+    return contexto
+
+
+@register.simple_tag
+def miniaturas_clinica(clinica, largura=480):
+    """
+    URLs das miniaturas da foto da clínica: {'src': ..., 'srcset': ...}.
+    As URLs levam o hash da foto, então mudam quando a foto muda.
+
+    Uso: {% miniaturas_clinica clinica 480 as miniaturas %}
+         <img src="{{ miniaturas.src }}" srcset="{{ miniaturas.srcset }}" sizes="...">
+    """
+    return urls_miniaturas_clinica(clinica, largura)
@@ -1,3 +1,764 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import Http404, HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, features
+
+from tutores.armazenamento import armazenamento_por_conteudo
+from tutores.autocomplete import buscar_tutores
+from tutores.estaticos import CACHE_IMUTAVEL, CACHE_SEM_HASH, ArquivosEstaticosMiddleware, codificacoes_aceitas
+from tutores import geo, imagens
+from tutores.geo import calcular_distancia, distancias_em_lote, mais_proximas
+from tutores.imagens import gerar_derivados, nome_derivado
+from tutores.indice_espacial import CHAVE_VERSAO, IndiceEspacialClinicas, clinicas_no_raio, indice_clinicas
+from tutores.middleware import (
+    PAPEL_TUTOR, PAPEL_VETERINARIO, SESSAO_PERFIL, PerfilUsuarioMiddleware, atualizar_perfil_da_requisicao,
+)
+from tutores.models import Animal, CustomUser, Tutor, VersaoDados
+from tutores.nomes_usuario import proximo_username, salvar_com_username
+from tutores.paginacao import codificar_cursor, pagina_keyset
+from tutores.uploads import TAG_ORIENTACAO, processar_foto_enviada
+from veterinarios.forms import AppointmentForm
+from veterinarios.models import Clinica, Veterinario
+
+
+# Mede, em um processo novo, quanto a memória (RSS) sobe ao processar a foto.
+# "completa" é o caminho antigo: decodifica a foto inteira antes de reduzir.
+SCRIPT_PICO_MEMORIA = """
+import sys
+import django
+django.setup()
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from tutores.uploads import processar_foto_enviada
+
+def memoria_kb(campo):
+    with open('/proc/self/status') as status:
+        linha = next(l for l in status if l.startswith(campo + ':'))
+    return int(linha.split()[1])
+
+caminho, modo = sys.argv[1:]
+dados = open(caminho, 'rb').read()
+# Zera o pico (VmHWM) para medir só o processamento
+with open('/proc/self/clear_refs', 'w') as clear_refs:
+    clear_refs.write('5')
+antes = memoria_kb('VmRSS')
+if modo == 'completa':
+    with Image.open(caminho) as img:
+        img.load()
+        img.thumbnail((2560, 2560), Image.Resampling.LANCZOS)
+else:
+    processar_foto_enviada(SimpleUploadedFile('foto.jpg', dados, 'image/jpeg'), max_lado=2560)
+print(memoria_kb('VmHWM') - antes)
+"""
+
+
+def usar_cache_compartilhado(teste):
+    """Troca o cache padrão (LocMem, de um processo só) por um compartilhado até o fim do teste"""
+    pasta = tempfile.TemporaryDirectory()
+    teste.addCleanup(pasta.cleanup)
+    configuracao = override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': pasta.name,
+    }})
+    configuracao.enable()
+    teste.addCleanup(configuracao.disable)
+
+
+def _imagem(largura, altura, formato='JPEG', modo='RGB', exif=None):
+    saida = io.BytesIO()
+    img = Image.new(modo, (largura, altura), 'red')
+    opcoes = {'exif': exif} if exif is not None else {}
+    img.save(saida, formato, **opcoes)
+    return saida.getvalue()
+
+
+class ProcessarFotoEnviadaTests(SimpleTestCase):
+
+    def test_foto_pequena_e_mantida_sem_reprocessar(self):
+        arquivo = SimpleUploadedFile('pet.jpg', _imagem(800, 600), 'image/jpeg')
+        self.assertIs(processar_foto_enviada(arquivo, max_lado=2560), arquivo)
+
+    def test_reduz_e_aplica_orientacao_exif(self):
+        exif = Image.Exif()
+        exif[TAG_ORIENTACAO] = 6  # girada 90°
+        arquivo = SimpleUploadedFile('pet.jpg', _imagem(4000, 3000, exif=exif), 'image/jpeg')
+        resultado = processar_foto_enviada(arquivo, max_lado=1000)
+        with Image.open(resultado) as img:
+            self.assertEqual(img.size, (750, 1000))
+            self.assertEqual(img.getexif().get(TAG_ORIENTACAO, 1), 1)
+
+    def test_recusa_acima_do_limite_de_pixels(self):
+        arquivo = SimpleUploadedFile('pet.jpg', _imagem(3000, 2000), 'image/jpeg')
+        with self.assertRaises(ValidationError):
+            processar_foto_enviada(arquivo, max_pixels=5_000_000)
+
+    def test_recusa_arquivo_que_nao_e_imagem(self):
+        arquivo = SimpleUploadedFile('pet.jpg', b'nao sou uma imagem', 'image/jpeg')
+        with self.assertRaises(ValidationError):
+            processar_foto_enviada(arquivo)
+
+    @unittest.skipUnless(features.check('avif'), 'Pillow sem suporte a AVIF')
+    def test_converte_avif_para_jpeg(self):
+        arquivo = SimpleUploadedFile('clinica.avif', _imagem(640, 480, formato='AVIF'), 'image/avif')
+        resultado = processar_foto_enviada(arquivo)
+        self.assertEqual(resultado.name, 'clinica.jpg')
+        with Image.open(resultado) as img:
+            self.assertEqual(img.format, 'JPEG')
+
+    @unittest.skipUnless(os.path.exists('/proc/self/clear_refs'), 'medição de pico só no Linux')
+    def test_pico_de_memoria_fica_abaixo_da_decodificacao_completa(self):
+        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as arquivo:
+            arquivo.write(_imagem(6000, 4500))  # 27 MP
+        self.addCleanup(os.remove, arquivo.name)
+
+        def pico_kb(modo):
+            processo = subprocess.run(
+                [sys.executable, '-c', SCRIPT_PICO_MEMORIA, arquivo.name, modo],
+                cwd=settings.BASE_DIR,
+                env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'guardiao_animal.settings'},
+                capture_output=True, text=True, check=True,
+            )
+            return int(processo.stdout)
+
+        # Com o draft do JPEG a foto é decodificada em 1/2 da resolução (1/4 dos pixels)
+        self.assertLess(pico_kb('processar'), pico_kb('completa') // 2)
+
+
+class ArmazenamentoPorConteudoTests(TestCase):
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        configuracao = override_settings(MEDIA_ROOT=pasta.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.armazenamento = armazenamento_por_conteudo()
+
+    def _clinica(self, nome, conteudo):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Clinica.objects.create(nome=nome, foto=SimpleUploadedFile('foto.jpg', conteudo, 'image/jpeg'))
+
+    def _envelhecer(self, nome):
+        antigo = time.time() - 2 * 86400
+        os.utime(self.armazenamento.path(nome), (antigo, antigo))
+
+    def test_foto_igual_compartilha_o_arquivo_ate_o_ultimo_registro(self):
+        foto = _imagem(10, 10)
+        a, b = self._clinica('A', foto), self._clinica('B', foto)
+        nome = a.foto.name
+        self.assertEqual(b.foto.name, nome)
+        self._envelhecer(nome)
+
+        # Trocar a foto de A não apaga o arquivo que B ainda usa
+        with self.captureOnCommitCallbacks(execute=True):
+            a.foto = SimpleUploadedFile('outra.jpg', _imagem(20, 20), 'image/jpeg')
+            a.save()
+        self.assertTrue(self.armazenamento.exists(nome))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            b.delete()
+        self.assertFalse(self.armazenamento.exists(nome))
+
+    def test_reenvio_em_andamento_protege_o_arquivo_liberado(self):
+        foto = _imagem(10, 10)
+        a = self._clinica('A', foto)
+        nome = a.foto.name
+        self._envelhecer(nome)
+        # Outro envio do mesmo conteúdo, ainda sem o registro gravado
+        self.assertEqual(self.armazenamento.save('clinicas/foto.jpg', SimpleUploadedFile('foto.jpg', foto)), nome)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            a.delete()
+        self.assertTrue(self.armazenamento.exists(nome))
+
+
+class ArquivosEstaticosMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        conteudo = b'body { color: red; }' * 50
+        for nome, dados in [
+            ('app.css', conteudo), ('app.css.gz', gzip.compress(conteudo)), ('app.css.br', b'brotli'),
+            ('app.1a2b3c.css', conteudo),
+        ]:
+            with open(os.path.join(pasta.name, nome), 'wb') as arquivo:
+                arquivo.write(dados)
+        with open(os.path.join(pasta.name, 'staticfiles.json'), 'w') as manifesto:
+            json.dump({'paths': {'app.css': 'app.1a2b3c.css'}}, manifesto)
+        configuracao = override_settings(STATIC_ROOT=pasta.name, STATIC_URL='/static/')
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.middleware = ArquivosEstaticosMiddleware(lambda request: HttpResponse('app'))
+
+    def _get(self, caminho='/static/app.css', **cabecalhos):
+        return self.middleware(RequestFactory().get(caminho, **cabecalhos))
+
+    def test_escolhe_a_codificacao_pelo_accept_encoding(self):
+        for accept_encoding, esperada in [
+            ('gzip, deflate, br', 'br'),
+            ('gzip', 'gzip'),
+            ('br;q=0, gzip;q=0.8', 'gzip'),
+            ('gzip;q=0, br;q=0', None),
+            ('br;q=0, *', 'gzip'),
+            ('*;q=0', None),
+            ('', None),
+        ]:
+            with self.subTest(accept_encoding):
+                resposta = self._get(HTTP_ACCEPT_ENCODING=accept_encoding)
+                self.assertEqual(resposta.get('Content-Encoding'), esperada)
+                self.assertEqual(resposta['Vary'], 'Accept-Encoding')
+
+    def test_tipo_do_original_sem_content_disposition(self):
+        for accept_encoding in ['gzip', 'br', '']:
+            with self.subTest(accept_encoding):
+                resposta = self._get(HTTP_ACCEPT_ENCODING=accept_encoding)
+                self.assertEqual(resposta['Content-Type'], 'text/css')
+                self.assertFalse(resposta.has_header('Content-Disposition'))
+
+    def test_le_os_valores_de_q(self):
+        self.assertEqual(codificacoes_aceitas('gzip, BR;q=0.5, identity; q=0'), {'gzip': 1.0, 'br': 0.5, 'identity': 0.0})
+
+    def test_etag_igual_responde_304(self):
+        etag = self._get(HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        self.assertEqual(self._get(HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Outra codificação é outra representação
+        self.assertEqual(self._get(HTTP_ACCEPT_ENCODING='br', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cache_imutavel_so_para_nomes_com_hash(self):
+        self.assertEqual(self._get('/static/app.1a2b3c.css')['Cache-Control'], CACHE_IMUTAVEL)
+        self.assertEqual(self._get()['Cache-Control'], CACHE_SEM_HASH)
+
+    def test_fora_do_static_root_segue_para_a_view(self):
+        self.assertEqual(self._get('/static/nao_existe.css').content, b'app')
+
+
+class GeoTests(SimpleTestCase):
+
+    def test_distancia_aceita_coordenada_zero(self):
+        self.assertAlmostEqual(calcular_distancia(0, 0, 0, 1), 111.19, places=2)
+        self.assertAlmostEqual(calcular_distancia(Decimal('0'), Decimal('0.0'), Decimal('1'), 0), 111.19, places=2)
+
+    def test_distancia_sem_coordenada(self):
+        self.assertIsNone(calcular_distancia(None, 0, 0, 0))
+        self.assertIsNone(calcular_distancia(-23.5, -46.6, -22.9, None))
+
+
+class RankingDistanciasTests(SimpleTestCase):
+    ORIGEM = (-23.55, -46.63)
+    LATITUDES = [-23.56, None, -22.90, -23.55, -23.60, -23.50]
+    LONGITUDES = [-46.64, -46.60, -43.17, -46.63, -46.70, -46.60]
+
+    def _nas_duas_implementacoes(self, funcao):
+        """Resultado com NumPy e com a implementação em Python puro"""
+        resultado_numpy = funcao()
+        numpy, geo.np = geo.np, None
+        try:
+            return resultado_numpy, funcao()
+        finally:
+            geo.np = numpy
+
+    def test_lote_igual_ao_calculo_por_par(self):
+        com_numpy, sem_numpy = self._nas_duas_implementacoes(
+            lambda: list(distancias_em_lote(*self.ORIGEM, self.LATITUDES, self.LONGITUDES))
+        )
+        for i, (lat, lon) in enumerate(zip(self.LATITUDES, self.LONGITUDES)):
+            esperada = calcular_distancia(*self.ORIGEM, lat, lon)
+            if esperada is None:
+                self.assertNotEqual(sem_numpy[i], sem_numpy[i])  # NaN
+            else:
+                self.assertAlmostEqual(com_numpy[i], esperada, places=6)
+                self.assertAlmostEqual(sem_numpy[i], esperada, places=6)
+
+    def test_mais_proximas_com_raio_e_limite(self):
+        com_numpy, sem_numpy = self._nas_duas_implementacoes(
+            lambda: mais_proximas(*self.ORIGEM, self.LATITUDES, self.LONGITUDES, k=3, raio_km=20)
+        )
+        self.assertEqual([i for i, _ in com_numpy], [3, 0, 5])
+        self.assertEqual([i for i, _ in sem_numpy], [3, 0, 5])
+        for (_, d1), (_, d2) in zip(com_numpy, sem_numpy):
+            self.assertAlmostEqual(d1, d2, places=6)
+
+    def test_sem_limite_ordena_tudo_que_tem_coordenada(self):
+        ranking = mais_proximas(*self.ORIGEM, self.LATITUDES, self.LONGITUDES)
+        self.assertEqual([i for i, _ in ranking], [3, 0, 5, 4, 2])
+
+
+class IndiceEspacialClinicasTests(TestCase):
+    ORIGEM = (-23.55, -46.63)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ids = {}
+        for nome, lat, lon in [
+            ('Centro', -23.55, -46.63), ('Pinheiros', -23.56, -46.69), ('Santos', -23.96, -46.33),
+            ('Rio', -22.90, -43.17), ('Sem endereço', None, None),
+        ]:
+            cls.ids[nome] = Clinica.objects.create(nome=nome, latitude=lat, longitude=lon).id
+
+    def setUp(self):
+        indice_clinicas.invalidar()
+        self.addCleanup(indice_clinicas.invalidar)
+        self.reconstrucoes = indice_clinicas.metricas()['reconstrucoes']
+
+    def _nomes(self, ranking):
+        por_id = {clinica_id: nome for nome, clinica_id in self.ids.items()}
+        return [por_id[clinica_id] for clinica_id, _ in ranking]
+
+    def _criar_sem_sinais(self, nome, lat, lon):
+        # Como a inserção feita por outro processo: este índice não fica sabendo
+        self.ids[nome] = Clinica.objects.bulk_create([Clinica(nome=nome, latitude=lat, longitude=lon)])[0].id
+
+    def test_busca_no_raio_ordenada_pela_distancia(self):
+        indice = IndiceEspacialClinicas(ttl=0)
+        with self.assertNumQueries(1):
+            ranking = indice.no_raio(*self.ORIGEM, 80)
+        self.assertEqual(self._nomes(ranking), ['Centro', 'Pinheiros', 'Santos'])
+        with self.assertNumQueries(0):
+            indice.no_raio(*self.ORIGEM, 80)
+
+    def test_k_mais_proximas_amplia_o_raio(self):
+        ranking = IndiceEspacialClinicas(ttl=0).mais_proximas(*self.ORIGEM, 4)
+        self.assertEqual(self._nomes(ranking), ['Centro', 'Pinheiros', 'Santos', 'Rio'])
+
+    def test_sinais_mantem_o_indice_sem_reconstruir(self):
+        indice_clinicas.no_raio(*self.ORIGEM, 10)
+        with self.captureOnCommitCallbacks(execute=True):
+            nova = Clinica.objects.create(nome='Nova', latitude=-23.551, longitude=-46.631)
+            pinheiros = Clinica.objects.get(id=self.ids['Pinheiros'])
+            pinheiros.latitude, pinheiros.longitude = -22.91, -43.18
+            pinheiros.save()
+            Clinica.objects.get(id=self.ids['Centro']).delete()
+        self.ids['Nova'] = nova.id
+        with self.assertNumQueries(0):
+            self.assertEqual(self._nomes(indice_clinicas.no_raio(*self.ORIGEM, 10)), ['Nova'])
+
+    def test_reconstroi_depois_do_ttl(self):
+        indice = IndiceEspacialClinicas(ttl=60)
+        indice.no_raio(*self.ORIGEM, 10)
+        indice._construido_em -= 61
+        with self.assertNumQueries(1):
+            indice.no_raio(*self.ORIGEM, 10)
+        self.assertEqual(indice.metricas()['reconstrucoes'], 2)
+
+    def test_cruza_o_antimeridiano(self):
+        fiji = Clinica.objects.create(nome='Fiji', latitude=-17.7, longitude=179.99).id
+        ranking = IndiceEspacialClinicas(ttl=0).no_raio(-17.7, -179.99, 10)
+        self.assertEqual([clinica_id for clinica_id, _ in ranking], [fiji])
+        self.assertEqual([clinica_id for clinica_id, _ in clinicas_no_raio(-17.7, -179.99, 10)], [fiji])
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'plano de execução do SQLite')
+    def test_caixa_delimitadora_usa_o_indice_de_coordenadas(self):
+        plano = Clinica.objects.filter(geo.filtro_caixa_delimitadora(*self.ORIGEM, 10)).values_list('id').explain()
+        self.assertIn('clinica_lat_lon_idx', plano)
+
+    def test_sem_cache_compartilhado_consulta_o_banco(self):
+        indice_clinicas.no_raio(*self.ORIGEM, 10)
+        self._criar_sem_sinais('Nova', -23.551, -46.631)
+        with self.assertNumQueries(1):
+            ranking = clinicas_no_raio(*self.ORIGEM, 80)
+        self.assertEqual(self._nomes(ranking), ['Centro', 'Nova', 'Pinheiros', 'Santos'])
+
+    def test_versao_do_cache_compartilhado_reconstroi_o_indice(self):
+        usar_cache_compartilhado(self)
+        clinicas_no_raio(*self.ORIGEM, 5)
+        # Alteração deste processo: o índice é atualizado e adota a nova versão
+        with self.captureOnCommitCallbacks(execute=True):
+            Clinica.objects.get(id=self.ids['Centro']).delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(clinicas_no_raio(*self.ORIGEM, 5), [])
+        # Alteração de outro processo: só a versão no cache muda
+        self._criar_sem_sinais('Nova', -23.551, -46.631)
+        cache.incr(CHAVE_VERSAO)
+        self.assertEqual(self._nomes(clinicas_no_raio(*self.ORIGEM, 5)), ['Nova'])
+        self.assertEqual(indice_clinicas.metricas()['reconstrucoes'] - self.reconstrucoes, 2)
+
+    def test_benchmark_usa_um_indice_proprio(self):
+        saida = io.StringIO()
+        call_command('benchmark_indice_clinicas', raios=[80], repeticoes=1, stdout=saida)
+        self.assertIn('clinicas: 4', saida.getvalue())
+        self.assertRegex(saida.getvalue(), r'\n\s+80\s+3\s')
+        self.assertFalse(indice_clinicas.construido())
+
+    def test_busca_de_veterinario_por_raio(self):
+        usuario = CustomUser.objects.create_user('tutor', password='x')
+        Tutor.objects.create(usuario=usuario)
+        self.client.force_login(usuario)
+        indice_clinicas.no_raio(*self.ORIGEM, 10)
+        self._criar_sem_sinais('Nova', -23.551, -46.631)
+        resposta = self.client.get(reverse('tutores:buscar_veterinario'), {'lat': -23.55, 'lon': -46.63, 'raio': 80})
+        clinicas = resposta.context['clinicas']
+        self.assertEqual([c.nome for c in clinicas], ['Centro', 'Nova', 'Pinheiros', 'Santos'])
+        self.assertAlmostEqual(clinicas[2].distancia, 6.22, places=2)
+        self.assertTrue(resposta.context['busca_por_proximidade'])
+
+
+class AutocompleteTutoresTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i, (nome, cpf, telefone) in enumerate([
+            ('João Silva', '123.456.789-00', '(11) 98765-4321'),
+            ('Joana Souza', '987.654.321-00', '(21) 91234-5678'),
+            ('Maria Lima', None, None),
+        ]):
+            primeiro, ultimo = nome.split()
+            usuario = CustomUser.objects.create_user(f'tutor{i}', first_name=primeiro, last_name=ultimo)
+            Tutor.objects.create(usuario=usuario, cpf=cpf, telefone=telefone)
+
+    def _nomes(self, termo):
+        return [opcao['texto'].split(' - ')[0] for opcao in buscar_tutores(termo)]
+
+    def test_busca_por_prefixo_do_nome_sem_acentos(self):
+        self.assertEqual(self._nomes('JOA'), ['Joana Souza', 'João Silva'])
+        self.assertEqual(self._nomes('joão s'), ['João Silva'])
+        self.assertEqual(self._nomes('j'), [])
+
+    def test_busca_pelos_digitos_do_cpf_e_do_telefone(self):
+        self.assertEqual(self._nomes('123.456'), ['João Silva'])
+        self.assertEqual(self._nomes('(21) 9123'), ['Joana Souza'])
+
+    def test_limita_a_quantidade_de_resultados(self):
+        self.assertEqual(len(buscar_tutores('jo', limite=1)), 1)
+
+    def test_renomear_usuario_atualiza_a_busca(self):
+        usuario = CustomUser.objects.get(username='tutor2')
+        usuario.first_name = 'Marta'
+        usuario.save()
+        self.assertEqual(self._nomes('marta'), ['Marta Lima'])
+
+    def test_campo_valida_so_o_tutor_escolhido(self):
+        tutor = Tutor.objects.get(usuario__username='tutor1')
+        campo = AppointmentForm().fields['tutor']
+        with self.assertNumQueries(1):
+            self.assertEqual(campo.clean(str(tutor.pk)), tutor)
+        with self.assertRaises(ValidationError):
+            campo.clean('999999')
+
+
+class NomesUsuarioTests(TestCase):
+
+    def test_base_livre(self):
+        self.assertEqual(proximo_username('joao'), 'joao')
+
+    def test_proximo_sufixo_em_uma_consulta(self):
+        for username in ['joao', 'joaozinho', 'joao.silva'] + [f'joao{i}' for i in range(1, 12)]:
+            CustomUser.objects.create_user(username)
+        with self.assertNumQueries(1):
+            self.assertEqual(proximo_username('joao'), 'joao12')
+
+    def test_tenta_o_sufixo_seguinte_se_outro_cadastro_pegar_o_nome(self):
+        tentativas = []
+
+        def salvar(username):
+            tentativas.append(username)
+            if len(tentativas) == 1:
+                # Outro cadastro grava o mesmo nome antes
+                CustomUser.objects.create_user(username)
+            return CustomUser.objects.create_user(username)
+
+        usuario = salvar_com_username('maria', salvar)
+        self.assertEqual(tentativas, ['maria', 'maria1'])
+        self.assertEqual(usuario.username, 'maria1')
+
+
+class PaginaKeysetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Nomes repetidos: o id desempata a ordenação
+        for nome in ['Bela', 'Ana', 'Caio', 'Ana', 'Duda', 'Bela', 'Eva']:
+            Clinica.objects.create(nome=nome + str(Clinica.objects.count()))
+        cls.ordem = list(Clinica.objects.order_by('nome', 'id').values_list('id', flat=True))
+
+    def test_percorre_todas_as_paginas_sem_repetir(self):
+        vistos, cursor = [], None
+        while True:
+            itens, cursor = pagina_keyset(Clinica.objects.all(), ('nome', 'id'), cursor, 3)
+            vistos += [clinica.id for clinica in itens]
+            if cursor is None:
+                break
+        self.assertEqual(vistos, self.ordem)
+
+    def test_decrescente(self):
+        itens, cursor = pagina_keyset(Clinica.objects.all(), ('nome', 'id'), None, 4, decrescente=True)
+        restantes, _ = pagina_keyset(Clinica.objects.all(), ('nome', 'id'), cursor, 4, decrescente=True)
+        self.assertEqual([c.id for c in itens + restantes], self.ordem[::-1])
+
+    def test_cursor_invalido_volta_a_primeira_pagina(self):
+        primeira, _ = pagina_keyset(Clinica.objects.all(), ('nome', 'id'), None, 3)
+        for cursor in ['lixo', codificar_cursor(['nome']), codificar_cursor({'nome': 'x', 'id': 'abc'}),
+                       codificar_cursor({'nome': 'x', 'id': [1]})]:
+            itens, _ = pagina_keyset(Clinica.objects.all(), ('nome', 'id'), cursor, 3)
+            self.assertEqual(itens, primeira)
+
+    def test_busca_com_cursor_alterado_nao_quebra(self):
+        usuario = CustomUser.objects.create_user('tutor', password='x')
+        Tutor.objects.create(usuario=usuario)
+        self.client.force_login(usuario)
+        resposta = self.client.get(reverse('tutores:buscar_veterinario'), {'cursor': codificar_cursor({'nome': 'x', 'id': 'abc'})})
+        self.assertEqual(resposta.status_code, 200)
+
+
+class GetCondicionalTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = CustomUser.objects.create_user('tutor', password='x')
+        cls.tutor = Tutor.objects.create(usuario=cls.usuario)
+        cls.animal = Animal.objects.create(tutor=cls.tutor, nome='Rex', especie='cachorro')
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+        self.url = reverse('tutores:painel_tutor')
+
+    def _etag(self):
+        # A primeira resposta grava o cookie CSRF, que faz parte do ETag
+        self.client.get(self.url)
+        return self.client.get(self.url)['ETag']
+
+    def test_pagina_sem_alteracao_responde_304(self):
+        usar_cache_compartilhado(self)
+        etag = self._etag()
+        resposta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 304)
+
+    def test_alteracao_troca_o_etag(self):
+        usar_cache_compartilhado(self)
+        etag = self._etag()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.animal.nome = 'Totó'
+            self.animal.save()
+        resposta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertContains(resposta, 'Totó')
+        self.assertNotEqual(resposta['ETag'], etag)
+
+    def test_sem_cache_compartilhado_as_versoes_ficam_no_banco(self):
+        etag = self._etag()
+        resposta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 304)
+        # Outro processo, com o seu LocMemCache, altera o animal
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'outro-processo',
+        }}):
+            self.animal.nome = 'Totó'
+            self.animal.save()
+        resposta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertContains(resposta, 'Totó')
+        self.assertTrue(VersaoDados.objects.filter(tipo='tutor', objeto_id=self.tutor.id).exists())
+
+
+class PerfilUsuarioMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = CustomUser.objects.create_user('ana')
+        cls.tutor = Tutor.objects.create(usuario=cls.usuario)
+
+    def setUp(self):
+        usar_cache_compartilhado(self)
+        self.sessao = SessionStore()
+
+    def _requisicao(self, usuario=None):
+        request = RequestFactory().get('/')
+        request.user = usuario or self.usuario
+        request.session = self.sessao
+        atualizar_perfil_da_requisicao(request)
+        return request
+
+    def test_resolve_o_papel_uma_vez_e_guarda_na_sessao(self):
+        with self.assertNumQueries(1):
+            request = self._requisicao()
+        self.assertEqual((request.papel, request.perfil_id), (PAPEL_TUTOR, self.tutor.id))
+        self.assertIsNone(request.veterinario)
+        with self.assertNumQueries(0):
+            request = self._requisicao()
+        self.assertEqual(request.perfil_id, self.tutor.id)
+        # O perfil só é carregado quando usado, já com o usuário da requisição
+        with self.assertNumQueries(1):
+            self.assertEqual(request.tutor.pk, self.tutor.id)
+            self.assertIs(request.tutor.usuario, self.usuario)
+
+    def test_criar_ou_remover_perfil_invalida_a_sessao(self):
+        usuario = CustomUser.objects.create_user('bia')
+        self.assertIsNone(self._requisicao(usuario).papel)
+        veterinario = Veterinario(usuario=usuario, crmv='SP1')
+        veterinario.save()
+        request = self._requisicao(usuario)
+        self.assertEqual((request.papel, request.perfil_id), (PAPEL_VETERINARIO, veterinario.id))
+        self.assertIsNone(request.tutor)
+
+        outro = CustomUser.objects.create_user('caio')
+        tutor = Tutor.objects.create(usuario=outro)
+        self.assertEqual(self._requisicao(outro).papel, PAPEL_TUTOR)
+        tutor.delete()
+        self.assertIsNone(self._requisicao(outro).papel)
+
+    def test_sessao_de_outro_usuario_nao_e_usada(self):
+        self._requisicao()
+        outro = CustomUser.objects.create_user('bia')
+        request = self._requisicao(outro)
+        self.assertIsNone(request.papel)
+        self.assertEqual(self.sessao[SESSAO_PERFIL]['usuario'], outro.pk)
+
+    def test_perfil_removido_por_outro_processo(self):
+        self._requisicao()
+        # Remoção sem sinais, como a de outro processo antes da invalidação chegar
+        Tutor.objects.filter(id=self.tutor.id)._raw_delete(Tutor.objects.db)
+        request = self._requisicao()
+        with self.assertRaises(Http404):
+            request.tutor.pk
+        self.assertNotIn(SESSAO_PERFIL, self.sessao)
+
+    def test_cache_indisponivel_consulta_o_banco(self):
+        with mock.patch('tutores.middleware.cache.get', side_effect=ConnectionError):
+            with self.assertLogs('tutores.middleware', 'WARNING'):
+                request = self._requisicao()
+        self.assertEqual(request.papel, PAPEL_TUTOR)
+        self.assertNotIn(SESSAO_PERFIL, self.sessao)
+
+    def test_sem_cache_compartilhado_consulta_a_cada_requisicao(self):
+        # Dois processos, cada um com o seu LocMemCache
+        processo_a, processo_b = [
+            override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': local,
+            }})
+            for local in ('processo-a', 'processo-b')
+        ]
+        with processo_a:
+            self.assertEqual(self._requisicao().papel, PAPEL_TUTOR)
+        with processo_b:
+            # A invalidação do perfil removido não chega ao cache do processo A
+            self.tutor.delete()
+        with processo_a, self.assertNumQueries(2):
+            request = self._requisicao()
+        self.assertIsNone(request.papel)
+        self.assertNotIn(SESSAO_PERFIL, self.sessao)
+
+    def test_anonimo_e_middleware(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        request.session = self.sessao
+        PerfilUsuarioMiddleware(lambda request: HttpResponse('ok'))(request)
+        self.assertEqual((request.papel, request.perfil_id, request.tutor, request.veterinario), (None,) * 4)
+
+
+@override_settings(IMAGENS_PROCESSOS=0)
+class DerivadosFotoAnimalTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tutor = Tutor.objects.create(usuario=CustomUser.objects.create_user('ana'))
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(self.pasta.cleanup)
+        configuracao = override_settings(MEDIA_ROOT=self.pasta.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def _animal(self, conteudo, executar=True):
+        with self.captureOnCommitCallbacks(execute=executar):
+            return Animal.objects.create(
+                tutor=self.tutor, nome='Rex', especie='cachorro',
+                foto=SimpleUploadedFile('rex.jpg', conteudo, 'image/jpeg'),
+            )
+
+    def _tamanho(self, animal, tamanho, extensao):
+        with Image.open(animal.foto.storage.path(nome_derivado(animal.foto.name, tamanho, extensao))) as img:
+            return img.format, img.size
+
+    def test_nome_derivado(self):
+        self.assertEqual(nome_derivado('animais/rex.jpg', 'card', 'webp'), 'animais/derivados/rex_card.webp')
+
+    def test_gera_os_tamanhos_depois_do_commit(self):
+        animal = self._animal(_imagem(1600, 1200))
+        self.assertEqual(self._tamanho(animal, 'grande', 'jpg'), ('JPEG', (1280, 960)))
+        self.assertEqual(self._tamanho(animal, 'card', 'webp'), ('WEBP', (480, 360)))
+        self.assertEqual(self._tamanho(animal, 'miniatura', 'jpg'), ('JPEG', (160, 120)))
+        animal.refresh_from_db()
+        self.assertTrue(animal.derivados_prontos)
+
+    def test_so_gera_quando_a_foto_muda(self):
+        animal = self._animal(_imagem(600, 400))
+        animal.refresh_from_db()
+        with mock.patch('tutores.imagens.gerar_derivados') as gerar:
+            with self.captureOnCommitCallbacks(execute=True):
+                animal.nome = 'Rex II'
+                animal.save()
+            gerar.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                animal.foto = SimpleUploadedFile('outra.jpg', _imagem(500, 400), 'image/jpeg')
+                animal.save()
+            gerar.assert_called_once()
+
+    def test_foto_trocada_antes_de_concluir_nao_marca_derivados(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            animal = Animal.objects.create(
+                tutor=self.tutor, nome='Rex', especie='cachorro',
+                foto=SimpleUploadedFile('rex.jpg', _imagem(600, 400), 'image/jpeg'),
+            )
+        # Outra requisição troca a foto antes de os derivados ficarem prontos
+        Animal.objects.filter(pk=animal.pk).update(foto='animais/outra.jpg')
+        for callback in callbacks:
+            callback()
+        animal.refresh_from_db()
+        self.assertEqual(animal.foto_derivados, '')
+
+    def test_transparencia_vira_fundo_branco_no_jpeg(self):
+        origem = os.path.join(self.pasta.name, 'logo.png')
+        Image.new('RGBA', (300, 200), (0, 0, 0, 0)).save(origem)
+        destinos = {100: {'jpg': os.path.join(self.pasta.name, 'd', 'logo.jpg'),
+                          'webp': os.path.join(self.pasta.name, 'd', 'logo.webp')}}
+        self.assertEqual(len(gerar_derivados(origem, destinos)), 2)
+        with Image.open(destinos[100]['jpg']) as img:
+            self.assertEqual(img.size, (100, 67))
+            self.assertEqual(img.getpixel((50, 30)), (255, 255, 255))
+        with Image.open(destinos[100]['webp']) as img:
+            self.assertEqual(img.mode, 'RGBA')
+        self.assertEqual(gerar_derivados(os.path.join(self.pasta.name, 'nao_existe.jpg'), destinos), [])
+
+    def test_comando_gera_os_pendentes(self):
+        animal = self._animal(_imagem(600, 400), executar=False)
+        saida = io.StringIO()
+        call_command('gerar_derivados_fotos', stdout=saida)
+        self.assertIn('Derivados gerados para 1 foto(s)', saida.getvalue())
+        animal.refresh_from_db()
+        self.assertTrue(animal.derivados_prontos)
+        self.assertEqual(self._tamanho(animal, 'card', 'jpg'), ('JPEG', (480, 320)))
+        call_command('gerar_derivados_fotos', stdout=saida)
+        self.assertIn('Derivados gerados para 0 foto(s)', saida.getvalue())
+
+    def test_template_usa_os_derivados_quando_prontos(self):
+        template = Template("{% load fotos %}{% foto_animal animal 'card' %}")
+        animal = self._animal(_imagem(600, 400), executar=False)
+        html = template.render(Context({'animal': animal}))
+        self.assertIn(animal.foto.url, html)
+        self.assertNotIn('/derivados/', html)
+        with self.captureOnCommitCallbacks(execute=True):
+            animal.save()
+        animal.refresh_from_db()
+        html = template.render(Context({'animal': animal}))
+        self.assertIn(imagens.urls_derivados(animal.foto)['card']['webp'] + ' 480w', html)
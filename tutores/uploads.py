@@ -0,0 +1,95 @@
+# tutores/uploads.py
+"""
+Validação e normalização das fotos enviadas (animais e clínicas), antes de
+chegarem ao model.
+
+Só o cabeçalho é lido para validar formato e dimensões. Fotos grandes são
+decodificadas já reduzidas (draft do JPEG, que decodifica em 1/2, 1/4 ou
+1/8 da resolução), então o bitmap completo de uma foto de celular nunca
+fica inteiro na memória.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .imagens import reduzir_na_decodificacao
+
+# Formatos guardados como vieram (se não precisarem de ajuste); os demais
+# formatos que o Pillow abre (AVIF, HEIF, BMP, TIFF, GIF...) são convertidos
+FORMATOS_MANTIDOS = {'JPEG', 'PNG', 'WEBP'}
+TAG_ORIENTACAO = 0x0112
+
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp'}
+EXTENSOES = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+
+
+def _tem_transparencia(img):
+    return img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info)
+
+
+def processar_foto_enviada(arquivo, max_pixels=None, max_lado=None):
+    """
+    Valida a foto enviada e devolve o arquivo a ser salvo:
+
+    - recusa o que não for imagem e imagens acima de `max_pixels`;
+    - JPEG/PNG/WebP já dentro de `max_lado` e sem rotação EXIF são mantidos
+      sem decodificar;
+    - os demais são reduzidos a `max_lado`, têm a orientação EXIF aplicada
+      (uma vez, removendo os metadados) e são regravados; formatos fora de
+      FORMATOS_MANTIDOS viram JPEG (ou PNG, se tiverem transparência).
+
+    Levanta ValidationError com a mensagem para o formulário.
+    """
+    max_pixels = max_pixels or settings.FOTO_MAX_PIXELS
+    max_lado = max_lado or settings.FOTO_MAX_LADO
+
+    arquivo.seek(0)
+    try:
+        # Image.open só lê o cabeçalho
+        img = Image.open(arquivo)
+    except Image.DecompressionBombError:
+        raise ValidationError("Imagem grande demais.")
+    except (UnidentifiedImageError, OSError):
+        raise ValidationError("Envie uma imagem válida (JPEG, PNG ou WebP).")
+
+    with img:
+        largura, altura = img.size
+        if largura * altura > max_pixels:
+            raise ValidationError(
+                f"Imagem grande demais ({largura}x{altura}). "
+                f"O limite é de {max_pixels / 1_000_000:g} megapixels."
+            )
+
+        formato = img.format
+        orientacao = img.getexif().get(TAG_ORIENTACAO, 1)
+        if formato in FORMATOS_MANTIDOS and max(largura, altura) <= max_lado and orientacao == 1:
+            arquivo.seek(0)
+            return arquivo
+
+        try:
+            # Para JPEG, decodifica direto em escala reduzida (no-op nos outros formatos)
+            reduzir_na_decodificacao(img, max_lado)
+            img.thumbnail((max_lado, max_lado), Image.Resampling.LANCZOS)
+            img = ImageOps.exif_transpose(img)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            raise ValidationError("Não foi possível ler a imagem enviada.")
+
+        if formato not in FORMATOS_MANTIDOS:
+            formato = 'PNG' if _tem_transparencia(img) else 'JPEG'
+        if formato == 'JPEG' and img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        opcoes = {'icc_profile': img.info.get('icc_profile')}
+        if formato == 'JPEG':
+            opcoes.update(quality=88, optimize=True)
+        elif formato == 'WEBP':
+            opcoes.update(quality=88)
+        saida = io.BytesIO()
+        img.save(saida, formato, **{k: v for k, v in opcoes.items() if v is not None})
+
+    nome = os.path.splitext(os.path.basename(arquivo.name))[0] + EXTENSOES[formato]
+    return SimpleUploadedFile(nome, saida.getvalue(), CONTENT_TYPES[formato])
@@ -15,5 +15,8 @@ urlpatterns = [
     path('veterinario/<int:veterinario_id>/', views.perfil_publico_veterinario, name='perfil_publico_veterinario'),
     path('notificacoes/', views.notificacoes, name='notificacoes'),
     path('notificacao/<int:notificacao_id>/marcar_lida/', views.marcar_notificacao_lida, name='marcar_notificacao_lida'),
+    path('notificacoes/marcar_lidas/', views.marcar_notificacoes_lidas, name='marcar_notificacoes_lidas'),
     path('api/animais/', views.api_animais_por_tutor, name='api_animais_por_tutor'),
+    path('api/tutores/', views.api_buscar_tutores, name='api_buscar_tutores'),
+    path('api/veterinarios/', views.api_buscar_veterinarios, name='api_buscar_veterinarios'),
 ]
@@ -0,0 +1,202 @@
+# tutores/versoes.py
+"""
+Versões (carimbos de tempo) dos dados mostrados nas páginas, para GET
+condicional (ETag / Last-Modified).
+
+Cada versão fica no cache em versao:<tipo>:<id> e é trocada pelos sinais de
+save/delete dos models que aparecem nas páginas. As views calculam o ETag
+só com o cache e respondem 304 sem consultar o banco quando nada mudou.
+
+Tipos: 'usuario' (nome no cabeçalho), 'tutor' (painel e animais do tutor),
+'animal' (perfil do animal e histórico), 'veterinario' (perfil público).
+
+As versões precisam ser vistas por todos os processos: com o LocMemCache
+cada worker teria as suas e continuaria respondendo 304 com dados antigos
+depois de uma alteração feita em outro. Sem cache compartilhado elas ficam
+no banco (VersaoDados): o ETag custa uma consulta, mas ainda evita
+renderizar a página.
+"""
+import hashlib
+import logging
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from veterinarios.utils import cache_compartilhado, contar_nao_lidas
+
+from .models import VersaoDados
+
+logger = logging.getLogger(__name__)
+
+
+def chave_versao(tipo, id):
+    return f'versao:{tipo}:{id}'
+
+
+def _ler_versoes_do_banco(pares):
+    filtro = Q()
+    for tipo, id in pares:
+        filtro |= Q(tipo=tipo, objeto_id=id)
+    encontradas = {
+        (tipo, id): versao
+        for tipo, id, versao in VersaoDados.objects.filter(filtro).values_list('tipo', 'objeto_id', 'versao')
+    }
+    faltando = {par: time.time_ns() for par in pares if par not in encontradas}
+    if faltando:
+        # Outro processo pode criar a mesma versão ao mesmo tempo: fica a dele
+        VersaoDados.objects.bulk_create(
+            [VersaoDados(tipo=tipo, objeto_id=id, versao=versao) for (tipo, id), versao in faltando.items()],
+            ignore_conflicts=True,
+        )
+        encontradas.update(faltando)
+    return encontradas
+
+
+def _gravar_versoes_no_banco(pares, versao):
+    VersaoDados.objects.bulk_create(
+        [VersaoDados(tipo=tipo, objeto_id=id, versao=versao) for tipo, id in pares],
+        update_conflicts=True,
+        unique_fields=['tipo', 'objeto_id'],
+        update_fields=['versao'],
+    )
+
+
+def ler_versoes(*pares):
+    """
+    {(tipo, id): versão} em uma ida ao cache (ou uma consulta, se o cache
+    não for compartilhado). Versões que ainda não existem (nunca alteradas
+    ou descartadas) começam agora. None se o cache falhar.
+    """
+    if not cache_compartilhado():
+        return _ler_versoes_do_banco(set(pares))
+    chaves = {chave_versao(tipo, id): (tipo, id) for tipo, id in pares}
+    try:
+        encontradas = cache.get_many(chaves)
+        faltando = {chave: time.time_ns() for chave in chaves if chave not in encontradas}
+        if faltando:
+            cache.set_many(faltando, None)
+            encontradas.update(faltando)
+    except Exception:
+        logger.warning("Cache indisponível ao ler as versões", exc_info=True)
+        return None
+    return {chaves[chave]: valor for chave, valor in encontradas.items()}
+
+
+def atualizar_versoes(*pares):
+    """
+    Troca as versões: no banco, na transação atual; no cache, depois do
+    commit dela.
+    """
+    pares = {(tipo, id) for tipo, id in pares if id is not None}
+    if not pares:
+        return
+    if not cache_compartilhado():
+        _gravar_versoes_no_banco(pares, time.time_ns())
+        return
+
+    def atualizar():
+        agora = time.time_ns()
+        try:
+            cache.set_many({chave_versao(tipo, id): agora for tipo, id in pares}, None)
+        except Exception:
+            logger.warning("Cache indisponível ao atualizar as versões", exc_info=True)
+
+    transaction.on_commit(atualizar)
+
+
+# Sinais (post_save/post_delete)
+
+def versoes_de_animal(sender, instance, raw=False, **kwargs):
+    if not raw:
+        atualizar_versoes(('animal', instance.pk), ('tutor', instance.tutor_id))
+
+
+def versoes_de_historico(sender, instance, raw=False, **kwargs):
+    if not raw:
+        atualizar_versoes(('animal', instance.animal_id))
+
+
+def versoes_de_consulta(sender, instance, raw=False, **kwargs):
+    if not raw:
+        atualizar_versoes(
+            ('animal', instance.animal_id), ('tutor', instance.tutor_id),
+            ('veterinario', instance.veterinarian_id),
+        )
+
+
+def versoes_de_clinica(sender, instance, raw=False, **kwargs):
+    if not raw:
+        atualizar_versoes(('veterinario', instance.veterinario_id))
+
+
+def versoes_de_tutor(sender, instance, raw=False, **kwargs):
+    if not raw:
+        atualizar_versoes(('tutor', instance.pk))
+
+
+def versoes_de_veterinario(sender, instance, raw=False, **kwargs):
+    if not raw:
+        atualizar_versoes(('veterinario', instance.pk))
+
+
+def versoes_de_usuario(sender, instance, raw=False, created=False, **kwargs):
+    """O nome do usuário aparece no cabeçalho e, para veterinários, no perfil público"""
+    # Usuário novo não tem páginas em cache; o login só grava o last_login
+    update_fields = kwargs.get('update_fields')
+    if raw or created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    from veterinarios.models import Veterinario
+    veterinario_id = Veterinario.objects.filter(usuario_id=instance.pk).values_list('id', flat=True).first()
+    atualizar_versoes(('usuario', instance.pk), ('veterinario', veterinario_id))
+
+
+# ETag / Last-Modified
+
+def _tem_mensagens(request):
+    """Mensagens (messages framework) pendentes só aparecem se a página for renderizada"""
+    armazenamento = getattr(request, '_messages', None)
+    # len() carrega as mensagens sem marcá-las como lidas
+    return armazenamento is not None and len(armazenamento) > 0
+
+
+def _etag(*partes):
+    return hashlib.md5(':'.join(map(str, partes)).encode()).hexdigest()
+
+
+def etag_da_pagina(request, *pares):
+    """
+    ETag de uma página do usuário logado: versões de `pares` e do usuário,
+    contador de notificações do cabeçalho e token CSRF. None (sem GET
+    condicional) se houver mensagens pendentes ou o cache falhar.
+    """
+    if _tem_mensagens(request):
+        return None
+    versoes = ler_versoes(('usuario', request.user.pk), *pares)
+    if versoes is None:
+        return None
+    return _etag(
+        request.user.pk,
+        *[versoes[par] for par in sorted(versoes)],
+        contar_nao_lidas(request.user),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    )
+
+
+def etag_dos_dados(*pares):
+    """ETag de uma resposta que só depende dos objetos em `pares` (ex.: JSON)"""
+    versoes = ler_versoes(*pares)
+    if versoes is None:
+        return None
+    return _etag(*pares, *[versoes[par] for par in sorted(versoes)])
+
+
+def ultima_modificacao(*pares):
+    """Data (UTC) da versão mais recente de `pares`"""
+    versoes = ler_versoes(*pares)
+    if not versoes:
+        return None
+    return datetime.fromtimestamp(max(versoes.values()) / 1e9, tz=timezone.utc)
@@ -5,19 +5,37 @@ from django.db import transaction
 from django.contrib import messages
 from django.db.models import Q
 from django.http import JsonResponse
-from math import radians, cos, sin, asin, sqrt
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from .autocomplete import buscar_tutores, buscar_veterinarios
+from .cadastro import cadastrar_tutor
 from .forms import CadastroTutorForm, CadastroAnimalForm, EditarPerfilTutorForm
-from .models import Tutor, Animal, CustomUser
+from .models import Tutor, Animal
+from .indice_espacial import clinicas_no_raio
+from .middleware import PAPEL_TUTOR, PAPEL_VETERINARIO, atualizar_perfil_da_requisicao, tutor_ou_404, veterinario_ou_404
+from .paginacao import ler_tamanho_pagina, pagina_de_ranking, pagina_keyset
+from .versoes import etag_da_pagina, etag_dos_dados, ultima_modificacao
 from veterinarios.models import Clinica, Veterinario
+from veterinarios.busca import buscar_clinicas
+from veterinarios.miniaturas import urls_miniaturas_clinica
+
+# Raio padrão e máximo (km) da busca de clínicas por proximidade
+RAIO_PADRAO_KM = 10
+RAIO_MAXIMO_KM = 200
+# Limite do ?por_pagina= da busca de clínicas
+BUSCA_MAXIMO_POR_PAGINA = 100
+# Limite do ?por_pagina= das notificações
+NOTIFICACOES_MAXIMO_POR_PAGINA = 100
 
 def home(request):
     # Se o usuário estiver autenticado, redireciona para o painel apropriado
     if request.user.is_authenticated:
-        # Verifica se é tutor usando query segura
-        if Tutor.objects.filter(usuario=request.user).exists():
+        # Papel já resolvido pelo PerfilUsuarioMiddleware
+        if request.papel == PAPEL_TUTOR:
             return redirect('tutores:painel_tutor')
-        # Verifica se é veterinário
-        elif hasattr(request.user, 'veterinario'):
+        elif request.papel == PAPEL_VETERINARIO:
             return redirect('veterinarios:painel_veterinario')
     return render(request, 'home.html')
 
@@ -33,11 +51,11 @@ def login_view(request):
         if user is not None:
             login(request, user)
             messages.success(request, f'Bem-vindo, {user.first_name or user.username}!')
-            # redireciona conforme tipo de conta
-            # Verifica se é tutor usando query segura (evita buscar campos que não existem)
-            if Tutor.objects.filter(usuario=user).exists():
+            # redireciona conforme tipo de conta (o papel muda com o login)
+            atualizar_perfil_da_requisicao(request)
+            if request.papel == PAPEL_TUTOR:
                 return redirect('tutores:painel_tutor')
-            elif hasattr(user, 'veterinario'):
+            elif request.papel == PAPEL_VETERINARIO:
                 return redirect('veterinarios:painel_veterinario')
             else:
                 return redirect('home')
@@ -55,53 +73,8 @@ def cadastro_tutor(request):
         form = CadastroTutorForm(request.POST)
         if form.is_valid():
             try:
-                # Usa transação atômica para garantir consistência no banco online
-                with transaction.atomic():
-                    # Gera username automaticamente a partir do email (parte antes do @)
-                    email = form.cleaned_data.get('email')
-                    username = email.split('@')[0] if email else None
-                    
-                    # Garante que o username seja único
-                    base_username = username
-                    counter = 1
-                    while CustomUser.objects.filter(username=username).exists():
-                        username = f"{base_username}{counter}"
-                        counter += 1
-                    
-                    # Define o username antes de salvar
-                    user = form.save(commit=False)
-                    user.username = username
-                    user.save()
-                    
-                    # Verifica se já existe um tutor para este usuário (proteção contra duplicatas)
-                    if Tutor.objects.filter(usuario=user).exists():
-                        messages.error(request, 'Este usuário já possui um perfil de tutor.')
-                        user.delete()  # Remove o usuário criado se já existe tutor
-                        return render(request, 'tutores/cadastro_tutor.html', {'form': form})
-                    
-                    # Verifica se o CPF já existe (se foi fornecido)
-                    cpf = form.cleaned_data.get('cpf', '').strip()
-                    if cpf:
-                        # Remove caracteres não numéricos do CPF para comparação
-                        cpf_limpo = ''.join(filter(str.isdigit, cpf))
-                        if Tutor.objects.filter(cpf=cpf_limpo).exists():
-                            messages.error(request, 'Este CPF já está cadastrado.')
-                            user.delete()  # Remove o usuário criado se CPF duplicado
-                            return render(request, 'tutores/cadastro_tutor.html', {'form': form})
-                        cpf = cpf_limpo
-                    
-                    # Cria o perfil de tutor vinculado ao usuário
-                    Tutor.objects.create(
-                        usuario=user,
-                        cpf=cpf if cpf else None,
-                        telefone=form.cleaned_data.get('telefone', '').strip() or None
-                    )
-                    
-                    # Faz login do usuário
-                    login(request, user)
-                    messages.success(request, 'Cadastro realizado com sucesso!')
-                    return redirect('tutores:painel_tutor')
-                    
+                # Usuário e perfil de tutor em uma transação curta (CPF já cadastrado volta como erro do campo)
+                user = cadastrar_tutor(form)
             except Exception as e:
                 # Tratamento de erros específicos para banco online
                 error_msg = str(e)
@@ -112,14 +85,27 @@ def cadastro_tutor(request):
                 else:
                     messages.error(request, f'Erro ao cadastrar tutor: {error_msg}')
                 return render(request, 'tutores/cadastro_tutor.html', {'form': form})
+            if user is not None:
+                # Faz login do usuário
+                login(request, user)
+                messages.success(request, 'Cadastro realizado com sucesso!')
+                return redirect('tutores:painel_tutor')
         # Se o formulário for inválido, os erros serão exibidos automaticamente no template
     else:
         form = CadastroTutorForm()
     return render(request, 'tutores/cadastro_tutor.html', {'form': form})
 
+def _etag_painel_tutor(request):
+    if request.papel != PAPEL_TUTOR:
+        return None
+    return etag_da_pagina(request, ('tutor', request.perfil_id))
+
+
 @login_required(login_url='/login/')
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_painel_tutor)
 def painel_tutor(request):
-    tutor_perfil = get_object_or_404(Tutor, usuario=request.user)
+    tutor_perfil = tutor_ou_404(request)
     animais = tutor_perfil.animais.all().order_by('nome')
     return render(request, 'tutores/painel_tutor.html', {
         'tutor_perfil': tutor_perfil,
@@ -128,7 +114,7 @@ def painel_tutor(request):
 
 @login_required(login_url='/login/')
 def cadastro_animal(request):
-    tutor_perfil = get_object_or_404(Tutor, usuario=request.user)
+    tutor_perfil = tutor_ou_404(request)
     if request.method == 'POST':
         form = CadastroAnimalForm(request.POST, request.FILES)
         if form.is_valid():
@@ -147,7 +133,7 @@ def cadastro_animal(request):
 
 @login_required(login_url='/login/')
 def editar_animal(request, animal_id):
-    tutor_perfil = get_object_or_404(Tutor, usuario=request.user)
+    tutor_perfil = tutor_ou_404(request)
     animal = get_object_or_404(Animal, id=animal_id, tutor=tutor_perfil)
     if request.method == 'POST':
         form = CadastroAnimalForm(request.POST, request.FILES, instance=animal)
@@ -161,7 +147,7 @@ def editar_animal(request, animal_id):
 
 @login_required(login_url='/login/')
 def editar_perfil(request):
-    tutor_perfil = get_object_or_404(Tutor, usuario=request.user)
+    tutor_perfil = tutor_ou_404(request)
     if request.method == 'POST':
         form = EditarPerfilTutorForm(request.POST, instance=request.user)
         if form.is_valid():
@@ -174,7 +160,8 @@ def editar_perfil(request):
                     # Atualiza os dados do perfil de tutor usando os dados limpos do formulário
                     cpf = form.cleaned_data.get('cpf')
                     telefone = form.cleaned_data.get('telefone')
-                    localizacao_placeholder = form.cleaned_data.get('localizacao_placeholder', '').strip() or None
+                    latitude = form.cleaned_data.get('latitude')
+                    longitude = form.cleaned_data.get('longitude')
 
                     # Verifica se o CPF já existe em outro tutor
                     if cpf and Tutor.objects.filter(cpf=cpf).exclude(usuario=request.user).exists():
@@ -186,7 +173,8 @@ def editar_perfil(request):
 
                     tutor_perfil.telefone = telefone
                     tutor_perfil.cpf = cpf
-                    tutor_perfil.localizacao_placeholder = localizacao_placeholder
+                    tutor_perfil.latitude = latitude
+                    tutor_perfil.longitude = longitude
                     tutor_perfil.save()
 
                     messages.success(request, 'Perfil atualizado com sucesso!')
@@ -204,7 +192,8 @@ def editar_perfil(request):
         initial_data = {
             'telefone': tutor_perfil.telefone,
             'cpf': tutor_perfil.cpf,
-            'localizacao_placeholder': tutor_perfil.localizacao_placeholder,
+            'latitude': tutor_perfil.latitude,
+            'longitude': tutor_perfil.longitude,
         }
         form = EditarPerfilTutorForm(instance=request.user, initial=initial_data)
     return render(request, 'tutores/editar_perfil.html', {
@@ -214,14 +203,22 @@ def editar_perfil(request):
 
 @login_required(login_url='/login/')
 def perfil_tutor(request):
-    tutor_perfil = get_object_or_404(Tutor, usuario=request.user)
+    tutor_perfil = tutor_ou_404(request)
     return render(request, 'tutores/perfil_tutor.html', {
         'tutor_perfil': tutor_perfil
     })
 
+def _etag_animal_profile(request, animal_id):
+    if request.papel != PAPEL_TUTOR:
+        return None
+    return etag_da_pagina(request, ('animal', animal_id))
+
+
 @login_required(login_url='/login/')
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_animal_profile)
 def animal_profile(request, animal_id):
-    tutor_perfil = get_object_or_404(Tutor, usuario=request.user)
+    tutor_perfil = tutor_ou_404(request)
     animal = get_object_or_404(Animal, id=animal_id, tutor=tutor_perfil)
     history = animal.history.all().order_by('-date')
     return render(request, 'tutores/animal_profile.html', {
@@ -231,7 +228,7 @@ def animal_profile(request, animal_id):
 
 @login_required(login_url='/login/')
 def deletar_animal(request, animal_id):
-    tutor_perfil = get_object_or_404(Tutor, usuario=request.user)
+    tutor_perfil = tutor_ou_404(request)
     animal = get_object_or_404(Animal, id=animal_id, tutor=tutor_perfil)
     if request.method == 'POST':
         animal.delete()
@@ -241,7 +238,7 @@ def deletar_animal(request, animal_id):
 
 @login_required(login_url='/login/')
 def add_pet_history(request, animal_id):
-    tutor_perfil = get_object_or_404(Tutor, usuario=request.user)
+    tutor_perfil = tutor_ou_404(request)
     animal = get_object_or_404(Animal, id=animal_id, tutor=tutor_perfil)
     if request.method == 'POST':
         form = PetHistoryForm(request.POST)
@@ -256,72 +253,146 @@ def add_pet_history(request, animal_id):
     return render(request, 'tutores/add_pet_history.html', {'form': form, 'animal': animal})
 
 
-def calcular_distancia(lat1, lon1, lat2, lon2):
-    """Calcula a distância entre dois pontos usando a fórmula de Haversine"""
-    if not all([lat1, lon1, lat2, lon2]):
+def _ler_localizacao_busca(request):
+    """
+    Lê latitude, longitude e raio (km) da busca. Se a latitude/longitude não
+    vierem na URL mas um raio for informado, usa a localização salva do tutor.
+    Retorna None quando a busca não é por proximidade.
+    """
+    lat = request.GET.get('lat', '').strip()
+    lon = request.GET.get('lon', '').strip()
+    raio = request.GET.get('raio', '').strip()
+    if not (lat and lon) and not raio:
         return None
-    
-    # Raio da Terra em km
-    R = 6371
-    
-    lat1, lon1, lat2, lon2 = map(radians, [float(lat1), float(lon1), float(lat2), float(lon2)])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    
-    return R * c
+    try:
+        raio_km = float(raio) if raio else RAIO_PADRAO_KM
+        if lat and lon:
+            lat, lon = float(lat), float(lon)
+        else:
+            tutor = getattr(request, 'tutor', None)
+            if not tutor or tutor.latitude is None or tutor.longitude is None:
+                return None
+            lat, lon = float(tutor.latitude), float(tutor.longitude)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or raio_km <= 0:
+        return None
+    return lat, lon, min(raio_km, RAIO_MAXIMO_KM)
+
+
+def _clinica_json(clinica, html):
+    """Campos da clínica usados pelo "carregar mais" da busca"""
+    veterinario = None
+    if clinica.veterinario_id and clinica.veterinario.usuario_id:
+        usuario = clinica.veterinario.usuario
+        veterinario = {
+            'id': clinica.veterinario_id,
+            'nome': usuario.get_full_name() or usuario.username,
+        }
+    return {
+        'id': clinica.id,
+        'nome': clinica.nome,
+        'rua': clinica.rua,
+        'numero': clinica.numero,
+        'bairro': clinica.bairro,
+        'telefone': clinica.telefone,
+        'foto_url': urls_miniaturas_clinica(clinica)['src'] or None,
+        'distancia': getattr(clinica, 'distancia', None),
+        'veterinario': veterinario,
+        'html': html,
+    }
 
 
 @login_required(login_url='/login/')
 def buscar_veterinario(request):
-    """Busca clínicas e veterinários, ordenando por proximidade se houver geolocalização"""
+    """
+    Busca clínicas e veterinários, ordenando por proximidade se houver geolocalização.
+
+    Os resultados são paginados sem OFFSET: a listagem sem termo usa keyset
+    por (nome, id) e as buscas ranqueadas (relevância/distância) buscam só
+    os ids da página. Com ?formato=json devolve a página em JSON para o
+    botão "Carregar mais".
+    """
     termo = request.GET.get('termo_busca', '').strip()
-    from veterinarios.models import Clinica
-    
+    cursor = request.GET.get('cursor', '')
+    por_pagina = ler_tamanho_pagina(request, settings.BUSCA_CLINICAS_POR_PAGINA, BUSCA_MAXIMO_POR_PAGINA)
+    localizacao = _ler_localizacao_busca(request)
+
+    # Usa select_related para buscar veterinário e usuário em uma única query
+    base = Clinica.objects.select_related('veterinario', 'veterinario__usuario')
     try:
+        ranking = None
         if termo:
-            # Busca clínicas pelo nome, endereço ou veterinário
-            # Usa select_related para buscar veterinário e usuário em uma única query
-            clinicas = Clinica.objects.select_related(
-                'veterinario',
-                'veterinario__usuario'
-            ).filter(
-                Q(nome__icontains=termo) |
-                Q(rua__icontains=termo) |
-                Q(bairro__icontains=termo) |
-                Q(veterinario__usuario__first_name__icontains=termo) |
-                Q(veterinario__usuario__last_name__icontains=termo)
-            ).distinct().order_by('nome')
+            # Busca clínicas pelo nome, endereço, veterinário ou serviços no
+            # documento de busca com índice full-text, ordenado por relevância
+            ranking = [clinica_id for clinica_id, _ in buscar_clinicas(termo)]
+
+        if localizacao:
+            # Busca por proximidade: acha e ordena as clínicas no raio (pelo
+            # índice em memória ou pela caixa delimitadora no banco); o
+            # banco só carrega as da página
+            lat, lon, raio_km = localizacao
+            proximas = clinicas_no_raio(lat, lon, raio_km)
+            if ranking is not None:
+                encontradas = set(ranking)
+                proximas = [(i, d) for i, d in proximas if i in encontradas]
+            distancias = dict(proximas)
+            clinicas, proximo_cursor = pagina_de_ranking(base, [i for i, _ in proximas], cursor, por_pagina)
+            for clinica in clinicas:
+                clinica.distancia = distancias[clinica.id]
+        elif ranking is not None:
+            clinicas, proximo_cursor = pagina_de_ranking(base, ranking, cursor, por_pagina)
         else:
-            # Se não há termo, mostra todas as clínicas
-            clinicas = Clinica.objects.select_related(
-                'veterinario',
-                'veterinario__usuario'
-            ).all().order_by('nome')
+            # Se não há termo, lista todas as clínicas por nome
+            clinicas, proximo_cursor = pagina_keyset(base, ('nome', 'id'), cursor, por_pagina)
     except Exception as e:
         # Se houver erro, tenta buscar sem select_related
         messages.warning(request, f'Aviso: Alguns dados podem não estar completos. Erro: {str(e)}')
+        clinicas = Clinica.objects.all()
         if termo:
-            clinicas = Clinica.objects.filter(
+            clinicas = clinicas.filter(
                 Q(nome__icontains=termo) |
                 Q(rua__icontains=termo) |
                 Q(bairro__icontains=termo)
-            ).distinct().order_by('nome')
-        else:
-            clinicas = Clinica.objects.all().order_by('nome')
-    
+            )
+        clinicas, proximo_cursor = pagina_keyset(clinicas, ('nome', 'id'), cursor, por_pagina)
+
+    proxima_url = None
+    if proximo_cursor:
+        parametros = request.GET.copy()
+        parametros['cursor'] = proximo_cursor
+        parametros.pop('formato', None)
+        proxima_url = f"{request.path}?{parametros.urlencode()}"
+
+    if request.GET.get('formato') == 'json':
+        return JsonResponse({
+            'clinicas': [
+                _clinica_json(clinica, render_to_string('tutores/_clinica_card.html', {'clinica': clinica}, request=request))
+                for clinica in clinicas
+            ],
+            'proximo_cursor': proximo_cursor,
+            'proxima_url': proxima_url,
+        })
+
     return render(request, 'tutores/buscar_veterinario.html', {
         'clinicas': clinicas,
-        'termo_busca': termo
+        'termo_busca': termo,
+        'busca_por_proximidade': bool(localizacao),
+        'raio_km': localizacao[2] if localizacao else RAIO_PADRAO_KM,
+        'proxima_url': proxima_url,
     })
 
 
+def _etag_perfil_publico_veterinario(request, veterinario_id):
+    return etag_da_pagina(request, ('veterinario', veterinario_id))
+
+
 @login_required(login_url='/login/')
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_perfil_publico_veterinario)
 def perfil_publico_veterinario(request, veterinario_id):
     """Exibe o perfil público do veterinário"""
-    veterinario = get_object_or_404(Veterinario, id=veterinario_id)
+    veterinario = get_object_or_404(Veterinario.objects.select_related('usuario').com_perfil(), id=veterinario_id)
     clinicas = []
     
     # Busca clínicas do veterinário
@@ -336,36 +407,94 @@ def perfil_publico_veterinario(request, veterinario_id):
 
 @login_required(login_url='/login/')
 def notificacoes(request):
-    """Exibe as notificações do usuário"""
-    from veterinarios.models import Notification
-    notificacoes = Notification.objects.filter(user=request.user).order_by('-created_at')
-    nao_lidas = notificacoes.filter(is_read=False).count()
-    
+    """Exibe as notificações do usuário, paginadas"""
+    from veterinarios.utils import contar_nao_lidas, pagina_notificacoes
+    somente_nao_lidas = request.GET.get('nao_lidas') == '1'
+    por_pagina = ler_tamanho_pagina(request, settings.NOTIFICACOES_POR_PAGINA, NOTIFICACOES_MAXIMO_POR_PAGINA)
+    notificacoes, proximo_cursor = pagina_notificacoes(
+        request.user, request.GET.get('cursor'), por_pagina, somente_nao_lidas
+    )
+    nao_lidas = contar_nao_lidas(request.user)
+
+    proxima_url = None
+    if proximo_cursor:
+        parametros = request.GET.copy()
+        parametros['cursor'] = proximo_cursor
+        proxima_url = f"{request.path}?{parametros.urlencode()}"
+
     return render(request, 'tutores/notificacoes.html', {
         'notificacoes': notificacoes,
-        'nao_lidas': nao_lidas
+        'nao_lidas': nao_lidas,
+        'somente_nao_lidas': somente_nao_lidas,
+        'proxima_url': proxima_url,
     })
 
 
 @login_required(login_url='/login/')
 def marcar_notificacao_lida(request, notificacao_id):
     """Marca uma notificação como lida"""
-    from veterinarios.models import Notification
-    notificacao = get_object_or_404(Notification, id=notificacao_id, user=request.user)
-    notificacao.is_read = True
-    notificacao.save()
+    from veterinarios.utils import marcar_notificacoes_lidas
+    marcar_notificacoes_lidas(request.user, [notificacao_id])
+    return redirect('tutores:notificacoes')
+
+
+@login_required(login_url='/login/')
+def marcar_notificacoes_lidas(request):
+    """Marca as notificações selecionadas (ou todas, com todas=1) como lidas"""
+    from veterinarios.utils import marcar_notificacoes_lidas as marcar_lidas
+    if request.method == 'POST':
+        ids = None if request.POST.get('todas') else [
+            int(i) for i in request.POST.getlist('ids') if i.isdigit()
+        ]
+        if ids == []:
+            messages.info(request, 'Nenhuma notificação selecionada.')
+        else:
+            total = marcar_lidas(request.user, ids)
+            messages.success(request, f'{total} notificação(ões) marcada(s) como lida(s).')
     return redirect('tutores:notificacoes')
 
 
+def _tutor_da_api(request):
+    tutor_id = request.GET.get('tutor_id', '')
+    return ('tutor', int(tutor_id)) if tutor_id.isdigit() else None
+
+
+def _etag_api_animais(request):
+    par = _tutor_da_api(request)
+    return etag_dos_dados(par) if par else None
+
+
+def _ultima_modificacao_api_animais(request):
+    par = _tutor_da_api(request)
+    return ultima_modificacao(par) if par else None
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=_etag_api_animais, last_modified_func=_ultima_modificacao_api_animais)
 def api_animais_por_tutor(request):
     """API para retornar animais de um tutor (usado no formulário de consulta)"""
-    tutor_id = request.GET.get('tutor_id')
-    if not tutor_id:
+    par = _tutor_da_api(request)
+    if not par:
         return JsonResponse({'animais': []})
     
     try:
-        tutor = Tutor.objects.get(id=tutor_id)
+        tutor = Tutor.objects.get(id=par[1])
         animais = Animal.objects.filter(tutor=tutor).values('id', 'nome', 'especie')
         return JsonResponse({'animais': list(animais)})
     except Tutor.DoesNotExist:
         return JsonResponse({'animais': []})
+
+
+@login_required(login_url='/login/')
+@cache_control(private=True, max_age=60)
+def api_buscar_tutores(request):
+    """Autocomplete de tutores por nome, CPF ou telefone (formulário de consulta do veterinário)"""
+    veterinario_ou_404(request)
+    return JsonResponse({'resultados': buscar_tutores(request.GET.get('q', ''))})
+
+
+@login_required(login_url='/login/')
+@cache_control(private=True, max_age=60)
+def api_buscar_veterinarios(request):
+    """Autocomplete de veterinários por nome ou CRMV (histórico do animal)"""
+    return JsonResponse({'resultados': buscar_veterinarios(request.GET.get('q', ''))})
@@ -1,10 +1,19 @@
-from django.contrib import admin
-from .models import Veterinario, Clinica, Service, Appointment, Notification, Rating, Message
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth import get_user_model
+from django.template.response import TemplateResponse
+from .forms import NotificacaoEmMassaForm
+from .utils import enviar_notificacao_em_massa
+from .models import Veterinario, Clinica, Service, Appointment, Notification, Rating, Message, EmailSaida, ServicoCatalogo
 
 @admin.register(Veterinario)
 class VeterinarioAdmin(admin.ModelAdmin):
     list_display = ('usuario', 'crmv', 'telefone', 'get_cpf', 'especialidade')
     search_fields = ('usuario__username', 'usuario__first_name', 'crmv', 'usuario__cpf')
+
+    def get_queryset(self, request):
+        # Carrega usuário e colunas opcionais de toda a página de uma vez
+        return super().get_queryset(request).select_related('usuario').com_perfil()
     
     def get_cpf(self, obj):
         """Retorna o CPF do usuário vinculado"""
@@ -15,11 +24,53 @@ class VeterinarioAdmin(admin.ModelAdmin):
 class ClinicaAdmin(admin.ModelAdmin):
     list_display = ('nome', 'cnpj', 'veterinario', 'telefone')
     search_fields = ('nome', 'cnpj', 'veterinario__usuario__username')
+    actions = ['notificar_tutores']
+
+    @admin.action(description='Enviar aviso aos tutores atendidos nas clínicas selecionadas')
+    def notificar_tutores(self, request, queryset):
+        # Tutores com alguma consulta nas clínicas selecionadas
+        usuarios = get_user_model().objects.filter(
+            tutor__appointment__clinic__in=queryset
+        ).distinct()
+
+        if 'aplicar' in request.POST:
+            form = NotificacaoEmMassaForm(request.POST)
+            if form.is_valid():
+                notificacoes, emails = enviar_notificacao_em_massa(
+                    usuarios,
+                    form.cleaned_data['mensagem'],
+                    enviar_email=form.cleaned_data['enviar_email']
+                )
+                self.message_user(
+                    request,
+                    f"{notificacoes} notificação(ões) criada(s) e {emails} email(s) na caixa de saída.",
+                    messages.SUCCESS
+                )
+                return None
+        else:
+            form = NotificacaoEmMassaForm()
+
+        return TemplateResponse(request, 'admin/veterinarios/clinica/notificar_tutores.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Enviar aviso aos tutores',
+            'opts': self.model._meta,
+            'form': form,
+            'clinicas': queryset,
+            'total_destinatarios': usuarios.count(),
+            'selecionados': request.POST.getlist(ACTION_CHECKBOX_NAME),
+            'action_checkbox_name': ACTION_CHECKBOX_NAME,
+        })
 
 @admin.register(Service)
 class ServiceAdmin(admin.ModelAdmin):
     list_display = ('name', 'clinic', 'price')
 
+@admin.register(ServicoCatalogo)
+class ServicoCatalogoAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'veterinario', 'preco', 'ativo')
+    list_filter = ('ativo',)
+    search_fields = ('nome',)
+
 @admin.register(Appointment)
 class AppointmentAdmin(admin.ModelAdmin):
     list_display = ('animal', 'clinic', 'veterinarian', 'date', 'status')
@@ -29,6 +80,13 @@ class AppointmentAdmin(admin.ModelAdmin):
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ('user', 'message', 'created_at', 'is_read')
 
+@admin.register(EmailSaida)
+class EmailSaidaAdmin(admin.ModelAdmin):
+    list_display = ('destinatario', 'assunto', 'status', 'quantidade_agrupada', 'tentativas', 'criado_em', 'enviado_em')
+    list_filter = ('status',)
+    search_fields = ('destinatario', 'assunto')
+    readonly_fields = ('criado_em', 'enviado_em', 'ultimo_erro')
+
 @admin.register(Rating)
 class RatingAdmin(admin.ModelAdmin):
     pass
@@ -1,6 +1,23 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_migrate, post_save, post_delete
 
 
 class VeterinariosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'veterinarios'
+
+    def ready(self):
+        from .schema import invalidar_cache_apos_migracao
+        from .busca import atualizar_busca_clinica, atualizar_busca_servico, atualizar_busca_usuario
+        # Migrações podem adicionar/remover colunas opcionais
+        post_migrate.connect(invalidar_cache_apos_migracao, dispatch_uid='veterinarios_invalidar_schema')
+        # Mantém o documento de busca das clínicas em dia
+        post_save.connect(atualizar_busca_clinica, sender='veterinarios.Clinica',
+                          dispatch_uid='veterinarios_busca_clinica')
+        post_save.connect(atualizar_busca_servico, sender='veterinarios.Service',
+                          dispatch_uid='veterinarios_busca_servico_save')
+        post_delete.connect(atualizar_busca_servico, sender='veterinarios.Service',
+                            dispatch_uid='veterinarios_busca_servico_delete')
+        post_save.connect(atualizar_busca_usuario, sender=settings.AUTH_USER_MODEL,
+                          dispatch_uid='veterinarios_busca_usuario')
@@ -0,0 +1,199 @@
+# veterinarios/busca.py
+import re
+from collections import defaultdict
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+
+from .models import Clinica, ClinicaBusca, Service
+from .texto import normalizar_texto
+
+# Quantidade máxima de clínicas retornadas por uma busca textual
+LIMITE_RESULTADOS = 200
+# Tamanho mínimo de palavra indexada pelo FULLTEXT do InnoDB (innodb_ft_min_token_size)
+TAMANHO_MINIMO_MYSQL = 3
+
+
+def montar_documento(clinica, servicos=None):
+    """
+    Concatena os textos pesquisáveis da clínica em um único documento, já
+    sem acentos e em minúsculas para não depender da collation do banco.
+    `servicos` (nomes) evita a consulta quando já foram carregados.
+    """
+    partes = [clinica.nome, clinica.rua, clinica.bairro]
+    veterinario = clinica.veterinario
+    if veterinario is not None:
+        usuario = veterinario.usuario
+        partes += [usuario.first_name, usuario.last_name]
+    if servicos is None:
+        try:
+            with transaction.atomic():
+                servicos = list(Service.objects.filter(clinic=clinica).values_list('name', flat=True))
+        except DatabaseError:
+            servicos = []
+    partes += servicos
+    return normalizar_texto(' '.join(p for p in partes if p))
+
+
+def atualizar_documento_busca(clinica):
+    """Recria o documento de busca de uma clínica"""
+    ClinicaBusca.objects.update_or_create(
+        clinica=clinica,
+        defaults={'documento': montar_documento(clinica)}
+    )
+
+
+def reindexar_clinicas(clinicas=None):
+    """Recria os documentos de todas as clínicas (ou das informadas). Retorna a quantidade."""
+    if clinicas is None:
+        clinicas = Clinica.objects.select_related('veterinario', 'veterinario__usuario')
+    total = 0
+    for clinica in clinicas.iterator():
+        atualizar_documento_busca(clinica)
+        total += 1
+    return total
+
+
+def atualizar_documentos_em_lote(clinica_ids):
+    """Recria os documentos de busca de várias clínicas com um número fixo de consultas"""
+    clinicas = list(
+        Clinica.objects.filter(id__in=clinica_ids).select_related('veterinario', 'veterinario__usuario')
+    )
+    servicos = defaultdict(list)
+    for clinica_id, nome in Service.objects.filter(clinic_id__in=clinica_ids).values_list('clinic_id', 'name'):
+        servicos[clinica_id].append(nome)
+    ClinicaBusca.objects.bulk_create(
+        [
+            ClinicaBusca(clinica=clinica, documento=montar_documento(clinica, servicos[clinica.id]))
+            for clinica in clinicas
+        ],
+        update_conflicts=True,
+        unique_fields=['clinica'],
+        update_fields=['documento', 'atualizado_em'],
+    )
+
+
+def _palavras(termo):
+    return re.findall(r'\w+', normalizar_texto(termo))
+
+
+def _buscar_sqlite(palavras, limite):
+    # Cada palavra vira um prefixo entre aspas: "joao"* "clinica"*
+    consulta = ' '.join(f'"{p}"*' for p in palavras)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT rowid, rank FROM veterinarios_clinicabusca_fts "
+            "WHERE veterinarios_clinicabusca_fts MATCH %s ORDER BY rank LIMIT %s",
+            [consulta, limite]
+        )
+        # rank do FTS5 (bm25) é menor para os mais relevantes
+        return [(row[0], -row[1]) for row in cursor.fetchall()]
+
+
+def _buscar_mysql(palavras, limite):
+    palavras = [p for p in palavras if len(p) >= TAMANHO_MINIMO_MYSQL]
+    if not palavras:
+        return None
+    consulta = ' '.join(f'+{p}*' for p in palavras)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT clinica_id, MATCH(documento) AGAINST (%s IN BOOLEAN MODE) AS relevancia "
+            "FROM veterinarios_clinicabusca "
+            "WHERE MATCH(documento) AGAINST (%s IN BOOLEAN MODE) "
+            "ORDER BY relevancia DESC LIMIT %s",
+            [consulta, consulta, limite]
+        )
+        return [(row[0], row[1]) for row in cursor.fetchall()]
+
+
+def _buscar_postgresql(palavras, limite):
+    consulta = ' & '.join(f'{p}:*' for p in palavras)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT clinica_id, ts_rank(to_tsvector('portuguese', documento), to_tsquery('portuguese', %s)) AS relevancia "
+            "FROM veterinarios_clinicabusca "
+            "WHERE to_tsvector('portuguese', documento) @@ to_tsquery('portuguese', %s) "
+            "ORDER BY relevancia DESC LIMIT %s",
+            [consulta, consulta, limite]
+        )
+        return [(row[0], row[1]) for row in cursor.fetchall()]
+
+
+_BUSCAS_POR_BANCO = {
+    'sqlite': _buscar_sqlite,
+    'mysql': _buscar_mysql,
+    'postgresql': _buscar_postgresql,
+}
+
+
+def buscar_clinicas(termo, limite=LIMITE_RESULTADOS):
+    """
+    Busca clínicas pelo documento de busca usando o índice full-text do banco.
+    Retorna [(clinica_id, relevancia)] da mais para a menos relevante.
+    Se o banco não tiver índice full-text (ou o termo for curto demais para
+    ele), usa busca por prefixo nas chaves normalizadas da clínica.
+    """
+    palavras = _palavras(termo)
+    if not palavras:
+        return []
+
+    buscar = _BUSCAS_POR_BANCO.get(connection.vendor)
+    if buscar is not None:
+        try:
+            with transaction.atomic():
+                resultado = buscar(palavras, limite)
+            if resultado is not None:
+                return resultado
+        except DatabaseError:
+            pass
+
+    return buscar_por_prefixo(termo, limite)
+
+
+def buscar_por_prefixo(termo, limite=LIMITE_RESULTADOS):
+    """
+    Busca por prefixo nas colunas normalizadas e indexadas de Clinica
+    (LIKE 'termo%'), que usam índice em qualquer banco.
+    """
+    prefixo = normalizar_texto(termo)
+    if not prefixo:
+        return []
+    ids = Clinica.objects.filter(
+        Q(nome_normalizado__startswith=prefixo) |
+        Q(rua_normalizada__startswith=prefixo) |
+        Q(bairro_normalizado__startswith=prefixo) |
+        Q(veterinario_nome_normalizado__startswith=prefixo)
+    ).order_by('nome_normalizado').values_list('id', flat=True)[:limite]
+    return [(clinica_id, 0) for clinica_id in ids]
+
+
+# Sinais que mantêm os documentos em dia
+
+def atualizar_busca_clinica(sender, instance, raw=False, **kwargs):
+    """post_save de Clinica"""
+    if raw:
+        return
+    atualizar_documento_busca(instance)
+
+
+def atualizar_busca_servico(sender, instance, raw=False, **kwargs):
+    """post_save/post_delete de Service: o nome do serviço faz parte do documento"""
+    # Na exclusão em cascata da própria clínica não há o que atualizar
+    if raw or isinstance(kwargs.get('origin'), Clinica):
+        return
+    clinica = Clinica.objects.filter(id=instance.clinic_id).first()
+    if clinica is not None:
+        atualizar_documento_busca(clinica)
+
+
+def atualizar_busca_usuario(sender, instance, raw=False, created=False, **kwargs):
+    """post_save do usuário: o nome do veterinário faz parte do documento das clínicas dele"""
+    update_fields = kwargs.get('update_fields')
+    # Usuário recém-criado ainda não tem clínicas
+    if raw or created or (update_fields is not None and not {'first_name', 'last_name'} & set(update_fields)):
+        return
+    clinicas = Clinica.objects.filter(veterinario__usuario_id=instance.pk)
+    clinicas.update(veterinario_nome_normalizado=normalizar_texto(
+        f"{instance.first_name} {instance.last_name}"
+    )[:300])
+    reindexar_clinicas(clinicas.select_related('veterinario', 'veterinario__usuario'))
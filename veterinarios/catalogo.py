@@ -0,0 +1,60 @@
+# veterinarios/catalogo.py
+"""
+Catálogo de serviços: os serviços (nome, descrição e preço) criados
+automaticamente nas clínicas.
+
+O catálogo padrão (ServicoCatalogo sem veterinário) é editado no admin;
+itens com veterinário substituem, para ele, o padrão de mesmo nome. A
+aplicação é um bulk_create(ignore_conflicts=True) contra a restrição única
+(clínica, nome) de Service: serviços que a clínica já tem (inclusive os
+editados pelo veterinário) ficam como estão, e aplicar de novo não duplica
+nada. O número de consultas não depende de quantas clínicas ou serviços
+são criados.
+"""
+from django.db.models import F, Q
+
+from .busca import atualizar_documentos_em_lote
+from .models import Clinica, Service, ServicoCatalogo
+
+TAMANHO_LOTE = 500
+
+
+def servicos_do_catalogo(veterinario=None):
+    """Itens ativos do catálogo que valem para `veterinario` (os dele no lugar dos padrão de mesmo nome)"""
+    filtro = Q(veterinario__isnull=True)
+    if veterinario is not None:
+        filtro |= Q(veterinario=veterinario)
+    itens = {}
+    # Os padrão vêm primeiro (veterinario_id nulo) e são sobrescritos pelos do veterinário
+    ordem = (F('veterinario_id').asc(nulls_first=True), 'nome')
+    for item in ServicoCatalogo.objects.filter(filtro, ativo=True).order_by(*ordem):
+        itens[item.nome] = item
+    return list(itens.values())
+
+
+def aplicar_catalogo(clinica_ids, veterinario=None):
+    """
+    Cria em cada clínica de `clinica_ids` os serviços do catálogo que ela
+    ainda não tem e atualiza os documentos de busca dessas clínicas.
+    """
+    clinica_ids = list(clinica_ids)
+    itens = servicos_do_catalogo(veterinario)
+    if not clinica_ids or not itens:
+        return
+    Service.objects.bulk_create(
+        [
+            Service(clinic_id=clinica_id, name=item.nome, description=item.descricao, price=item.preco)
+            for clinica_id in clinica_ids for item in itens
+        ],
+        batch_size=TAMANHO_LOTE,
+        ignore_conflicts=True,
+    )
+    # bulk_create não dispara o post_save que mantém o documento de busca
+    atualizar_documentos_em_lote(clinica_ids)
+
+
+def aplicar_catalogo_nas_clinicas(veterinario):
+    """Aplica o catálogo a todas as clínicas do veterinário. Retorna a quantidade de clínicas."""
+    clinica_ids = list(Clinica.objects.filter(veterinario=veterinario).values_list('id', flat=True))
+    aplicar_catalogo(clinica_ids, veterinario)
+    return len(clinica_ids)
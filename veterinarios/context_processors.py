@@ -1,12 +1,13 @@
 # veterinarios/context_processors.py
-from .models import Notification
+from .utils import contar_nao_lidas
 
 
 def notificacoes_nao_lidas(request):
     """Adiciona a contagem de notificações não lidas ao contexto"""
     if request.user.is_authenticated:
         try:
-            nao_lidas = Notification.objects.filter(user=request.user, is_read=False).count()
+            # Contador gravado no próprio usuário: não consulta o banco
+            nao_lidas = contar_nao_lidas(request.user)
         except:
             nao_lidas = 0
     else:
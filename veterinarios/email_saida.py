@@ -0,0 +1,196 @@
+# veterinarios/email_saida.py
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import EmailSaida
+
+logger = logging.getLogger(__name__)
+
+# Tempo que um email fica reservado para um worker; depois disso outro worker
+# pode pegá-lo de novo (ex.: o primeiro morreu no meio do envio)
+TEMPO_RESERVA = timedelta(minutes=10)
+# Espera antes da 1ª nova tentativa; dobra a cada falha até o máximo
+ESPERA_INICIAL = timedelta(minutes=1)
+ESPERA_MAXIMA = timedelta(hours=6)
+
+
+def reservar_lote(tamanho):
+    """
+    Marca como 'enviando' até `tamanho` emails prontos para envio e os
+    retorna. Em bancos com SELECT ... FOR UPDATE SKIP LOCKED vários workers
+    podem rodar ao mesmo tempo sem pegar o mesmo email.
+    """
+    agora = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            EmailSaida.objects.select_for_update(skip_locked=True)
+            .filter(status__in=['pendente', 'enviando'], proxima_tentativa__lte=agora)
+            .order_by('proxima_tentativa', 'id')[:tamanho]
+        )
+        if emails:
+            EmailSaida.objects.filter(id__in=[e.id for e in emails]).update(
+                status='enviando', proxima_tentativa=agora + TEMPO_RESERVA
+            )
+    return emails
+
+
+def _enviar_parte(emails):
+    """
+    Envia os emails por uma única conexão SMTP (roda em uma thread do pool).
+    Retorna [(email, erro ou None)].
+    """
+    resultados = []
+    conexao = get_connection()
+    try:
+        conexao.open()
+    except Exception as e:
+        return [(email, f"Falha ao conectar: {e}") for email in emails]
+    try:
+        for email in emails:
+            mensagem = EmailMessage(
+                subject=email.assunto,
+                body=email.mensagem,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[email.destinatario],
+                connection=conexao,
+            )
+            try:
+                mensagem.send()
+                resultados.append((email, None))
+            except Exception as e:
+                resultados.append((email, str(e) or e.__class__.__name__))
+    finally:
+        try:
+            conexao.close()
+        except Exception:
+            pass
+    return resultados
+
+
+def _espera(tentativas):
+    """Backoff exponencial com variação aleatória de até 10%"""
+    espera = min(ESPERA_INICIAL * (2 ** (tentativas - 1)), ESPERA_MAXIMA)
+    return espera + espera * random.uniform(0, 0.1)
+
+
+def _registrar_resultados(resultados):
+    agora = timezone.now()
+    max_tentativas = settings.EMAIL_SAIDA_MAX_TENTATIVAS
+    for email, erro in resultados:
+        email.tentativas += 1
+        if erro is None:
+            email.status = 'enviado'
+            email.enviado_em = agora
+            email.ultimo_erro = ''
+        else:
+            email.ultimo_erro = erro
+            if email.tentativas >= max_tentativas:
+                email.status = 'falhou'
+            else:
+                email.status = 'pendente'
+                email.proxima_tentativa = agora + _espera(email.tentativas)
+    EmailSaida.objects.bulk_update(
+        [email for email, _ in resultados],
+        ['status', 'tentativas', 'enviado_em', 'ultimo_erro', 'proxima_tentativa']
+    )
+
+
+def processar_caixa_saida(tamanho_lote=100, threads=None):
+    """
+    Reserva um lote de emails, divide entre as threads (cada uma com a sua
+    conexão SMTP reaproveitada para toda a sua parte) e grava o resultado
+    de cada mensagem. Retorna (enviados, falhas).
+    """
+    emails = reservar_lote(tamanho_lote)
+    if not emails:
+        return 0, 0
+    threads = max(1, min(threads or settings.EMAIL_SAIDA_THREADS, len(emails)))
+    partes = [emails[i::threads] for i in range(threads)]
+
+    resultados = []
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for parte in executor.map(_enviar_parte, partes):
+            resultados.extend(parte)
+
+    _registrar_resultados(resultados)
+    falhas = sum(1 for _, erro in resultados if erro is not None)
+    if falhas:
+        logger.warning("%d de %d email(s) falharam nesta rodada", falhas, len(resultados))
+    return len(resultados) - falhas, falhas
+
+
+def _texto_resumo(emails):
+    linhas = [f"Você recebeu {len(emails)} notificações no Guardião Animal:", ""]
+    for email in emails:
+        quando = timezone.localtime(email.criado_em).strftime('%d/%m/%Y %H:%M')
+        linhas.append(f"[{quando}] {email.mensagem}")
+        linhas.append("")
+    return "\n".join(linhas).rstrip()
+
+
+def agrupar_resumos():
+    """
+    Junta em um único email os emails retidos ('resumo') de cada destinatário
+    cuja janela de agrupamento já terminou. O resumo entra na fila normal
+    ('pendente') e os emails agrupados são removidos. Retorna
+    (resumos_criados, emails_agrupados).
+    """
+    agora = timezone.now()
+    destinatarios = (
+        EmailSaida.objects.filter(status='resumo', proxima_tentativa__lte=agora)
+        .order_by().values_list('destinatario', flat=True).distinct()
+    )
+    resumos = agrupados = 0
+    for destinatario in list(destinatarios):
+        with transaction.atomic():
+            emails = list(
+                EmailSaida.objects.select_for_update()
+                .filter(status='resumo', destinatario=destinatario)
+                .order_by('criado_em', 'id')
+            )
+            if not emails:
+                continue
+            if len(emails) == 1:
+                # Nada para agrupar: vai como um email comum
+                EmailSaida.objects.filter(id=emails[0].id).update(status='pendente', proxima_tentativa=agora)
+                continue
+            EmailSaida.objects.create(
+                usuario_id=emails[-1].usuario_id,
+                destinatario=destinatario,
+                assunto=f"Resumo: {len(emails)} notificações - Guardião Animal",
+                mensagem=_texto_resumo(emails),
+                quantidade_agrupada=sum(email.quantidade_agrupada for email in emails),
+            )
+            EmailSaida.objects.filter(id__in=[email.id for email in emails]).delete()
+        resumos += 1
+        agrupados += len(emails)
+    return resumos, agrupados
+
+
+def estatisticas_resumos():
+    """Quantos resumos foram montados e quantos emails deixaram de ser enviados por causa deles"""
+    totais = EmailSaida.objects.filter(quantidade_agrupada__gt=1).aggregate(
+        resumos=Count('id'), notificacoes=Sum('quantidade_agrupada')
+    )
+    notificacoes = totais['notificacoes'] or 0
+    return {
+        'resumos': totais['resumos'],
+        'notificacoes_agrupadas': notificacoes,
+        'emails_economizados': notificacoes - totais['resumos'],
+    }
+
+
+def resumo_caixa_saida():
+    """Quantidade de emails por status"""
+    resumo = dict.fromkeys(dict(EmailSaida.STATUS_CHOICES), 0)
+    for linha in EmailSaida.objects.values('status').order_by().annotate(total=Count('id')):
+        resumo[linha['status']] = linha['total']
+    return resumo
@@ -2,7 +2,13 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import get_user_model
-from .models import Clinica, Service, Appointment, Notification
+from django.core.files.uploadedfile import UploadedFile
+from .models import Clinica, Service, Appointment, Notification, Veterinario
+from tutores.autocomplete import CampoAutocomplete, opcao_tutor
+from tutores.cadastro import adicionar_erros_de_conflito
+from tutores.models import Tutor
+from tutores.nomes_usuario import base_do_email, proximo_username, salvar_com_username
+from tutores.uploads import processar_foto_enviada
 import re
 
 User = get_user_model()
@@ -95,25 +101,24 @@ class CadastroVeterinarioForm(UserCreationForm):
             raise forms.ValidationError("Telefone deve ter 11 dígitos.")
         return telefone_numeros
 
-    def clean_email(self):
-        email = self.cleaned_data.get('email')
-        if User.objects.filter(email=email).exists():
-            raise forms.ValidationError("Este e-mail já está em uso.")
-        return email
+    def clean(self):
+        cleaned_data = super().clean()
+        # Email, CPF e CRMV já cadastrados, em uma consulta
+        email, cpf, crmv = (cleaned_data.get(campo) for campo in ('email', 'cpf', 'crmv'))
+        adicionar_erros_de_conflito(
+            self,
+            ('email', User.objects.filter(email=email) if email else None),
+            # O CPF do veterinário fica no usuário
+            ('cpf', User.objects.filter(cpf=cpf) if cpf else None),
+            ('crmv', Veterinario.objects.filter(crmv=crmv) if crmv else None),
+        )
+        return cleaned_data
 
     def save(self, commit=True):
         user = super().save(commit=False)
         email = self.cleaned_data['email']
-        # Gera username automaticamente a partir do email
-        base_username = email.split('@')[0]
-        username = base_username
-        counter = 1
-        while User.objects.filter(username=username).exists():
-            username = f"{base_username}{counter}"
-            counter += 1
         nome_completo = self.cleaned_data['nome_completo'].strip()
         partes = nome_completo.split(maxsplit=1)
-        user.username = username
         user.email = email
         user.first_name = partes[0]
         user.last_name = partes[1] if len(partes) > 1 else ''
@@ -122,8 +127,16 @@ class CadastroVeterinarioForm(UserCreationForm):
         user.telefone = telefone if telefone else ''
         cpf = self.cleaned_data.get('cpf')
         user.cpf = cpf if cpf else ''
+        # Gera username automaticamente a partir do email
+        base = base_do_email(email)
         if commit:
-            user.save()
+            def salvar_usuario(username):
+                user.username = username
+                user.save()
+
+            salvar_com_username(base, salvar_usuario)
+        else:
+            user.username = proximo_username(base)
         return user
 
 
@@ -136,7 +149,7 @@ class EditarPerfilVeterinarioForm(forms.ModelForm):
 
     class Meta:
         model = User
-        fields = ('username', 'email', 'first_name', 'last_name')
+        fields = ('username', 'email', 'first_name', 'last_name', 'receber_resumo_email')
 
 
 class CadastroClinicaForm(forms.ModelForm):
@@ -146,12 +159,38 @@ class CadastroClinicaForm(forms.ModelForm):
         model = Clinica
         fields = [
             'nome', 'cnpj', 'rua', 'numero', 'bairro',
-            'observacoes', 'telefone', 'foto'
+            'observacoes', 'telefone', 'foto', 'latitude', 'longitude'
         ]
         widgets = {
             'observacoes': forms.Textarea(attrs={'rows': 3}),
         }
 
+    def clean_foto(self):
+        foto = self.cleaned_data.get('foto')
+        # Só processa arquivos recém-enviados, não a foto já salva
+        if isinstance(foto, UploadedFile):
+            foto = processar_foto_enviada(foto)
+        return foto
+
+    def clean_latitude(self):
+        latitude = self.cleaned_data.get('latitude')
+        if latitude is not None and not -90 <= latitude <= 90:
+            raise forms.ValidationError("Latitude deve estar entre -90 e 90.")
+        return latitude
+
+    def clean_longitude(self):
+        longitude = self.cleaned_data.get('longitude')
+        if longitude is not None and not -180 <= longitude <= 180:
+            raise forms.ValidationError("Longitude deve estar entre -180 e 180.")
+        return longitude
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # Latitude e longitude só fazem sentido juntas
+        if (cleaned_data.get('latitude') is None) != (cleaned_data.get('longitude') is None):
+            raise forms.ValidationError("Informe latitude e longitude juntas.")
+        return cleaned_data
+
 
 class ServiceForm(forms.ModelForm):
     class Meta:
@@ -160,11 +199,14 @@ class ServiceForm(forms.ModelForm):
 
 
 class AppointmentForm(forms.ModelForm):
-    tutor = forms.ModelChoiceField(
-        queryset=None,
+    # Busca no servidor enquanto digita (não lista todos os tutores na página)
+    tutor = CampoAutocomplete(
+        queryset=Tutor.objects.all(),
+        url_name='tutores:api_buscar_tutores',
+        opcao_por_id=opcao_tutor,
         label='Tutor',
         required=True,
-        help_text='Selecione o tutor responsável pelo animal'
+        help_text='Digite o nome, CPF ou telefone do tutor responsável pelo animal'
     )
     
     class Meta:
@@ -185,10 +227,6 @@ class AppointmentForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         
         if veterinarian:
-            # Filtra tutores - todos os tutores podem ser selecionados
-            from tutores.models import Tutor
-            self.fields['tutor'].queryset = Tutor.objects.all()
-            
             # Filtra clínicas do veterinário
             self.fields['clinic'].queryset = Clinica.objects.filter(veterinario=veterinarian)
             
@@ -226,7 +264,35 @@ class EditarConsultaForm(forms.ModelForm):
     # Não precisa de __init__ customizado pois não tem campos dependentes
 
 
+class FiltroConsultasForm(forms.Form):
+    """Filtros da agenda do veterinário (período e status)"""
+    inicio = forms.DateField(required=False, label='De', widget=forms.DateInput(attrs={'type': 'date'}))
+    fim = forms.DateField(required=False, label='Até', widget=forms.DateInput(attrs={'type': 'date'}))
+    status = forms.ChoiceField(
+        required=False,
+        label='Status',
+        choices=[('', 'Todos')] + Appointment.STATUS_CHOICES
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        inicio = cleaned_data.get('inicio')
+        fim = cleaned_data.get('fim')
+        if inicio and fim and inicio > fim:
+            raise forms.ValidationError("A data inicial deve ser anterior à data final.")
+        return cleaned_data
+
+
 class NotificationForm(forms.ModelForm):
     class Meta:
         model = Notification
         fields = ['message']
+
+
+class NotificacaoEmMassaForm(forms.Form):
+    """Mensagem da ação do admin que notifica vários usuários de uma vez"""
+    mensagem = forms.CharField(
+        label='Mensagem',
+        widget=forms.Textarea(attrs={'rows': 5, 'cols': 80})
+    )
+    enviar_email = forms.BooleanField(label='Enviar também por email', required=False, initial=True)
@@ -0,0 +1,51 @@
+# veterinarios/management/commands/enviar_emails.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from veterinarios.email_saida import (
+    agrupar_resumos, estatisticas_resumos, processar_caixa_saida, resumo_caixa_saida
+)
+
+
+class Command(BaseCommand):
+    help = 'Envia os emails pendentes da caixa de saída (use --continuo para rodar como worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=100, help='Emails reservados por rodada')
+        parser.add_argument('--threads', type=int, default=None,
+                            help='Threads de envio (padrão: EMAIL_SAIDA_THREADS)')
+        parser.add_argument('--continuo', action='store_true',
+                            help='Continua rodando e verificando a caixa de saída')
+        parser.add_argument('--intervalo', type=float, default=5,
+                            help='Segundos de espera quando não há emails (modo contínuo)')
+
+    def handle(self, *args, **options):
+        total_enviados = total_falhas = 0
+        try:
+            while True:
+                resumos, agrupados = agrupar_resumos()
+                if resumos:
+                    self.stdout.write(f"{resumos} resumo(s) montado(s) com {agrupados} notificação(ões)")
+                enviados, falhas = processar_caixa_saida(options['lote'], options['threads'])
+                total_enviados += enviados
+                total_falhas += falhas
+                if enviados or falhas:
+                    self.stdout.write(f"{enviados} enviado(s), {falhas} falha(s)")
+                elif not options['continuo']:
+                    break
+                else:
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Total: {total_enviados} enviado(s), {total_falhas} falha(s)."
+        ))
+        resumo = resumo_caixa_saida()
+        self.stdout.write(", ".join(f"{status}: {total}" for status, total in resumo.items()))
+        estatisticas = estatisticas_resumos()
+        self.stdout.write(
+            f"Resumos: {estatisticas['resumos']} email(s) com {estatisticas['notificacoes_agrupadas']} "
+            f"notificação(ões); {estatisticas['emails_economizados']} email(s) a menos."
+        )
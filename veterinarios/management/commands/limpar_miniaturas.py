@@ -0,0 +1,23 @@
+# veterinarios/management/commands/limpar_miniaturas.py
+from django.core.management.base import BaseCommand
+
+from veterinarios.miniaturas import hash_origem, limpar_miniaturas
+from veterinarios.models import Clinica
+
+
+class Command(BaseCommand):
+    help = 'Remove do cache em disco as miniaturas de fotos de clínicas que foram trocadas ou removidas'
+
+    def handle(self, *args, **options):
+        em_uso = set()
+        for clinica in Clinica.objects.exclude(foto='').exclude(foto__isnull=True).only('id', 'foto').iterator():
+            try:
+                hash_foto = hash_origem(clinica.foto.path)
+            except NotImplementedError:
+                continue
+            if hash_foto:
+                em_uso.add(hash_foto)
+        removidas = limpar_miniaturas(em_uso)
+        self.stdout.write(self.style.SUCCESS(
+            f"{removidas} miniatura(s) removida(s); {len(em_uso)} foto(s) de clínica em uso."
+        ))
@@ -0,0 +1,39 @@
+# veterinarios/management/commands/preencher_chaves_busca.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from veterinarios.busca import reindexar_clinicas
+from veterinarios.models import Clinica
+
+CAMPOS_NORMALIZADOS = ['nome_normalizado', 'rua_normalizada', 'bairro_normalizado', 'veterinario_nome_normalizado']
+
+
+class Command(BaseCommand):
+    help = 'Preenche as chaves de busca normalizadas (sem acentos/minúsculas) das clínicas existentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Clínicas atualizadas por UPDATE em lote')
+
+    def handle(self, *args, **options):
+        tamanho_lote = options['lote']
+        clinicas = Clinica.objects.select_related('veterinario', 'veterinario__usuario').order_by('id')
+        lote = []
+        total = 0
+        for clinica in clinicas.iterator(chunk_size=tamanho_lote):
+            clinica.atualizar_chaves_normalizadas()
+            lote.append(clinica)
+            if len(lote) >= tamanho_lote:
+                total += self._salvar(lote)
+                lote = []
+        if lote:
+            total += self._salvar(lote)
+        self.stdout.write(self.style.SUCCESS(f"{total} clínica(s) com chaves normalizadas."))
+
+        # O documento de busca também passou a ser guardado normalizado
+        total = reindexar_clinicas()
+        self.stdout.write(self.style.SUCCESS(f"{total} documento(s) de busca recriado(s)."))
+
+    def _salvar(self, lote):
+        with transaction.atomic():
+            Clinica.objects.bulk_update(lote, CAMPOS_NORMALIZADOS)
+        return len(lote)
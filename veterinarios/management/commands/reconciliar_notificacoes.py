@@ -0,0 +1,15 @@
+# veterinarios/management/commands/reconciliar_notificacoes.py
+from django.core.management.base import BaseCommand
+
+from veterinarios.utils import reconciliar_contadores_nao_lidas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula a partir das notificações o contador de não lidas gravado em cada usuário'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Usuários atualizados por UPDATE')
+
+    def handle(self, *args, **options):
+        total = reconciliar_contadores_nao_lidas(options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Contador de {total} usuário(s) reconciliado(s)."))
@@ -0,0 +1,12 @@
+# veterinarios/management/commands/reindexar_busca_clinicas.py
+from django.core.management.base import BaseCommand
+
+from veterinarios.busca import reindexar_clinicas
+
+
+class Command(BaseCommand):
+    help = 'Recria o documento de busca (full-text) de todas as clínicas'
+
+    def handle(self, *args, **options):
+        total = reindexar_clinicas()
+        self.stdout.write(self.style.SUCCESS(f"{total} clínica(s) reindexada(s)."))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('veterinarios', '0005_add_rating_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clinica',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='clinica',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='clinica',
+            index=models.Index(fields=['latitude', 'longitude'], name='clinica_lat_lon_idx'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def criar_indice_texto(apps, schema_editor):
+    """Cria o índice full-text adequado ao banco em uso"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE veterinarios_clinicabusca_fts USING fts5("
+                "documento, content='veterinarios_clinicabusca', content_rowid='clinica_id', "
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+        except Exception:
+            # SQLite compilado sem FTS5: a busca usa prefixo nas chaves normalizadas da clínica
+            return
+        schema_editor.execute(
+            "CREATE TRIGGER veterinarios_clinicabusca_ai AFTER INSERT ON veterinarios_clinicabusca BEGIN "
+            "INSERT INTO veterinarios_clinicabusca_fts(rowid, documento) VALUES (new.clinica_id, new.documento); END"
+        )
+        schema_editor.execute(
+            "CREATE TRIGGER veterinarios_clinicabusca_ad AFTER DELETE ON veterinarios_clinicabusca BEGIN "
+            "INSERT INTO veterinarios_clinicabusca_fts(veterinarios_clinicabusca_fts, rowid, documento) "
+            "VALUES ('delete', old.clinica_id, old.documento); END"
+        )
+        schema_editor.execute(
+            "CREATE TRIGGER veterinarios_clinicabusca_au AFTER UPDATE ON veterinarios_clinicabusca BEGIN "
+            "INSERT INTO veterinarios_clinicabusca_fts(veterinarios_clinicabusca_fts, rowid, documento) "
+            "VALUES ('delete', old.clinica_id, old.documento); "
+            "INSERT INTO veterinarios_clinicabusca_fts(rowid, documento) VALUES (new.clinica_id, new.documento); END"
+        )
+    elif vendor == 'mysql':
+        schema_editor.execute(
+            "ALTER TABLE veterinarios_clinicabusca ADD FULLTEXT INDEX clinicabusca_documento_ft (documento)"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX clinicabusca_documento_tsv ON veterinarios_clinicabusca "
+            "USING GIN (to_tsvector('portuguese', documento))"
+        )
+
+
+def remover_indice_texto(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for trigger in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS veterinarios_clinicabusca_{trigger}")
+        schema_editor.execute("DROP TABLE IF EXISTS veterinarios_clinicabusca_fts")
+    elif vendor == 'mysql':
+        schema_editor.execute("ALTER TABLE veterinarios_clinicabusca DROP INDEX clinicabusca_documento_ft")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS clinicabusca_documento_tsv")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('veterinarios', '0006_clinica_latitude_clinica_longitude_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClinicaBusca',
+            fields=[
+                ('clinica', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='documento_busca', serialize=False, to='veterinarios.clinica')),
+                ('documento', models.TextField(blank=True, default='')),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(criar_indice_texto, remover_indice_texto),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('veterinarios', '0007_clinicabusca'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clinica',
+            name='bairro_normalizado',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='clinica',
+            name='nome_normalizado',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='clinica',
+            name='rua_normalizada',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='clinica',
+            name='veterinario_nome_normalizado',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=300),
+        ),
+    ]
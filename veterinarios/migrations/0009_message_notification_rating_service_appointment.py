@@ -0,0 +1,97 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Modelos que já existiam no código (e em produção) sem migração própria
+MODELOS_SEM_MIGRACAO = ['Message', 'Notification', 'Rating', 'Service', 'Appointment']
+
+
+def criar_tabelas_ausentes(apps, schema_editor):
+    """
+    Cria só as tabelas que ainda não existem: bancos antigos já as têm
+    (criadas fora das migrações), bancos novos não.
+    """
+    tabelas = set(schema_editor.connection.introspection.table_names())
+    for nome in MODELOS_SEM_MIGRACAO:
+        model = apps.get_model('veterinarios', nome)
+        if model._meta.db_table not in tabelas:
+            schema_editor.create_model(model)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutores', '0004_remove_tutor_localizacao_placeholder_tutor_latitude_and_more'),
+        ('veterinarios', '0008_clinica_bairro_normalizado_clinica_nome_normalizado_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='Message',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('message', models.TextField()),
+                        ('timestamp', models.DateTimeField(auto_now_add=True)),
+                        ('is_read', models.BooleanField(default=False)),
+                        ('receiver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='received_messages', to=settings.AUTH_USER_MODEL)),
+                        ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sent_messages', to=settings.AUTH_USER_MODEL)),
+                    ],
+                ),
+                migrations.CreateModel(
+                    name='Notification',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('message', models.TextField()),
+                        ('created_at', models.DateTimeField(auto_now_add=True)),
+                        ('is_read', models.BooleanField(default=False)),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                    ],
+                ),
+                migrations.CreateModel(
+                    name='Rating',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('rating', models.IntegerField(choices=[(1, 1), (2, 2), (3, 3), (4, 4), (5, 5)])),
+                        ('comment', models.TextField(blank=True, null=True)),
+                        ('date', models.DateTimeField(auto_now_add=True)),
+                        ('clinic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ratings', to='veterinarios.clinica')),
+                        ('tutor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tutores.tutor')),
+                    ],
+                ),
+                migrations.CreateModel(
+                    name='Service',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('name', models.CharField(max_length=100)),
+                        ('description', models.TextField(blank=True, null=True)),
+                        ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                        ('clinic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='services', to='veterinarios.clinica')),
+                    ],
+                ),
+                migrations.CreateModel(
+                    name='Appointment',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('date', models.DateTimeField()),
+                        ('status', models.CharField(choices=[('pending', 'Pendente'), ('confirmed', 'Confirmado'), ('completed', 'Concluído'), ('cancelled', 'Cancelado')], default='pending', max_length=20)),
+                        ('notes', models.TextField(blank=True, null=True)),
+                        ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tutores.animal')),
+                        ('clinic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='veterinarios.clinica')),
+                        ('tutor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tutores.tutor')),
+                        ('veterinarian', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='veterinarios.veterinario')),
+                        ('service', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='veterinarios.service')),
+                    ],
+                ),
+            ],
+        ),
+        migrations.RunPython(criar_tabelas_ausentes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['veterinarian', 'date'], name='appointment_vet_date_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('veterinarios', '0011_emailsaida'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailsaida',
+            name='quantidade_agrupada',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AlterField(
+            model_name='emailsaida',
+            name='status',
+            field=models.CharField(choices=[('resumo', 'Aguardando resumo'), ('pendente', 'Pendente'), ('enviando', 'Enviando'), ('enviado', 'Enviado'), ('falhou', 'Falhou')], default='pendente', max_length=10),
+        ),
+    ]
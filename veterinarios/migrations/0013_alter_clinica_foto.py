@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:40
+
+import tutores.armazenamento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('veterinarios', '0012_emailsaida_quantidade_agrupada_alter_emailsaida_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='clinica',
+            name='foto',
+            field=models.ImageField(blank=True, null=True, storage=tutores.armazenamento.armazenamento_por_conteudo, upload_to='clinicas/'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+from veterinarios.texto import normalizar_texto
+
+
+def preencher_nome_normalizado(apps, schema_editor):
+    Veterinario = apps.get_model('veterinarios', 'Veterinario')
+    # Só as colunas que existem em todos os bancos (formacao/experiencia podem faltar)
+    veterinarios = Veterinario.objects.select_related('usuario').only(
+        'id', 'usuario__first_name', 'usuario__last_name', 'usuario__username'
+    ).order_by('id')
+    lote = []
+    for veterinario in veterinarios.iterator(chunk_size=500):
+        usuario = veterinario.usuario
+        nome = f"{usuario.first_name} {usuario.last_name}".strip() or usuario.username
+        veterinario.nome_normalizado = normalizar_texto(nome)[:300]
+        lote.append(veterinario)
+        if len(lote) >= 500:
+            Veterinario.objects.bulk_update(lote, ['nome_normalizado'])
+            lote = []
+    if lote:
+        Veterinario.objects.bulk_update(lote, ['nome_normalizado'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('veterinarios', '0013_alter_clinica_foto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='veterinario',
+            name='nome_normalizado',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=300),
+        ),
+        migrations.RunPython(preencher_nome_normalizado, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Os serviços que criar_servicos_predefinidos criava em toda clínica nova
+CATALOGO_PADRAO = [
+    ('Consulta Geral', 'Consulta veterinária geral para avaliação do animal', '80.00'),
+    ('Vacinação', 'Aplicação de vacinas conforme calendário vacinal', '50.00'),
+    ('Castração', 'Procedimento cirúrgico de castração', '300.00'),
+    ('Exame de Sangue', 'Exame laboratorial completo de sangue', '120.00'),
+    ('Cirurgia', 'Procedimento cirúrgico geral', '500.00'),
+    ('Banho e Tosa', 'Serviço de higiene e estética animal', '60.00'),
+    ('Ultrassonografia', 'Exame de imagem por ultrassom', '150.00'),
+    ('Radiografia', 'Exame de imagem por raio-X', '100.00'),
+]
+
+
+def criar_catalogo_padrao(apps, schema_editor):
+    ServicoCatalogo = apps.get_model('veterinarios', 'ServicoCatalogo')
+    ServicoCatalogo.objects.bulk_create([
+        ServicoCatalogo(nome=nome, descricao=descricao, preco=preco)
+        for nome, descricao, preco in CATALOGO_PADRAO
+    ])
+
+
+def remover_servicos_duplicados(apps, schema_editor):
+    """Mantém o serviço mais antigo de cada (clínica, nome) e passa para ele as consultas dos demais"""
+    Service = apps.get_model('veterinarios', 'Service')
+    Appointment = apps.get_model('veterinarios', 'Appointment')
+    duplicados = (
+        Service.objects.values('clinic_id', 'name')
+        .annotate(manter=models.Min('id'), total=models.Count('id'))
+        .filter(total__gt=1)
+    )
+    for grupo in duplicados:
+        outros = Service.objects.filter(clinic_id=grupo['clinic_id'], name=grupo['name']).exclude(id=grupo['manter'])
+        Appointment.objects.filter(service__in=outros).update(service_id=grupo['manter'])
+        outros.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('veterinarios', '0014_veterinario_nome_normalizado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServicoCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100)),
+                ('descricao', models.TextField(blank=True, default='')),
+                ('preco', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('ativo', models.BooleanField(default=True)),
+                ('veterinario', models.ForeignKey(blank=True, help_text='Vazio para o catálogo padrão de todos os veterinários', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='catalogo_servicos', to='veterinarios.veterinario')),
+            ],
+            options={
+                'verbose_name': 'serviço do catálogo',
+                'verbose_name_plural': 'catálogo de serviços',
+                'ordering': ['nome'],
+                'constraints': [
+                    models.UniqueConstraint(fields=('veterinario', 'nome'), name='catalogo_veterinario_nome_unico'),
+                    models.UniqueConstraint(condition=models.Q(('veterinario__isnull', True)), fields=('nome',), name='catalogo_padrao_nome_unico'),
+                ],
+            },
+        ),
+        migrations.RunPython(criar_catalogo_padrao, migrations.RunPython.noop),
+        migrations.RunPython(remover_servicos_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='service',
+            constraint=models.UniqueConstraint(fields=('clinic', 'name'), name='service_clinica_nome_unico'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:20
+
+from collections import defaultdict
+
+from django.db import migrations
+
+from veterinarios.busca import montar_documento
+
+
+def preencher_documentos(apps, schema_editor):
+    """Cria o documento de busca das clínicas cadastradas antes da ClinicaBusca"""
+    Clinica = apps.get_model('veterinarios', 'Clinica')
+    ClinicaBusca = apps.get_model('veterinarios', 'ClinicaBusca')
+    Service = apps.get_model('veterinarios', 'Service')
+    # Só as colunas usadas no documento (formacao/experiencia podem faltar)
+    clinicas = Clinica.objects.filter(documento_busca__isnull=True).select_related('veterinario__usuario').only(
+        'id', 'nome', 'rua', 'bairro', 'veterinario__usuario__first_name', 'veterinario__usuario__last_name'
+    ).order_by('id')
+    lote = []
+    for clinica in clinicas.iterator(chunk_size=500):
+        lote.append(clinica)
+        if len(lote) >= 500:
+            _criar_documentos(ClinicaBusca, Service, lote)
+            lote = []
+    if lote:
+        _criar_documentos(ClinicaBusca, Service, lote)
+
+
+def _criar_documentos(ClinicaBusca, Service, clinicas):
+    servicos = defaultdict(list)
+    for clinica_id, nome in Service.objects.filter(
+        clinic_id__in=[clinica.id for clinica in clinicas]
+    ).values_list('clinic_id', 'name'):
+        servicos[clinica_id].append(nome)
+    ClinicaBusca.objects.bulk_create([
+        ClinicaBusca(clinica=clinica, documento=montar_documento(clinica, servicos[clinica.id]))
+        for clinica in clinicas
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('veterinarios', '0015_servicocatalogo_service_clinica_nome_unico'),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_documentos, migrations.RunPython.noop),
+    ]
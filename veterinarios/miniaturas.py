@@ -0,0 +1,142 @@
+# veterinarios/miniaturas.py
+"""
+Miniaturas geradas sob demanda (fotos das clínicas).
+
+Na primeira vez que uma largura é pedida a miniatura é gerada e gravada em
+MINIATURAS_DIR; os próximos acessos leem direto do disco. O nome do arquivo
+leva o hash do conteúdo da foto original, então trocar a foto (ou
+sobrescrever o arquivo) gera entradas novas e as antigas deixam de ser
+usadas; o comando limpar_miniaturas remove as que ficaram órfãs.
+"""
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from tutores.imagens import FORMATOS_DERIVADOS, gravar_imagem, para_rgb, reduzir_na_decodificacao
+from tutores.uploads import TAG_ORIENTACAO
+
+# Larguras aceitas (limitadas para que não dê para encher o disco com tamanhos arbitrários)
+LARGURAS_MINIATURA = (160, 320, 480, 640, 960)
+CONTENT_TYPES = {'webp': 'image/webp', 'jpg': 'image/jpeg'}
+TAMANHO_HASH = 24
+
+
+def hash_origem(caminho):
+    """
+    Hash do conteúdo da foto em `caminho`, ou None se o arquivo não existir.
+    O resultado fica em cache por (caminho, mtime, tamanho), então o arquivo
+    só é relido quando muda.
+    """
+    try:
+        info = os.stat(caminho)
+    except OSError:
+        return None
+    chave = f'miniatura:hash:{hashlib.md5(caminho.encode()).hexdigest()}:{info.st_mtime_ns}:{info.st_size}'
+    valor = cache.get(chave)
+    if valor is None:
+        resumo = hashlib.sha256()
+        with open(caminho, 'rb') as arquivo:
+            for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+                resumo.update(bloco)
+        valor = resumo.hexdigest()[:TAMANHO_HASH]
+        cache.set(chave, valor, None)
+    return valor
+
+
+def caminho_miniatura(hash_foto, largura, extensao):
+    """Arquivo da miniatura no cache em disco"""
+    return os.path.join(
+        str(settings.MINIATURAS_DIR), hash_foto[:2], f'{hash_foto}_{largura}.{extensao}'
+    )
+
+
+def gerar_miniatura(origem, destino, largura, extensao):
+    """Reduz a foto em `origem` para `largura` (mantendo a proporção) e grava em `destino`"""
+    formato, opcoes = next((f, o) for ext, f, o in FORMATOS_DERIVADOS if ext == extensao)
+    with Image.open(origem) as original:
+        # Largura depois de aplicar a orientação EXIF (5 a 8 giram a foto em 90°)
+        largura_final, altura_final = original.size
+        if original.getexif().get(TAG_ORIENTACAO, 1) in (5, 6, 7, 8):
+            largura_final, altura_final = altura_final, largura_final
+        reduzir_na_decodificacao(original, largura * max(largura_final, altura_final) // largura_final)
+        img = ImageOps.exif_transpose(original)
+        if img.width > largura:
+            altura = max(1, round(img.height * largura / img.width))
+            img = img.resize((largura, altura), Image.Resampling.LANCZOS)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'P') else 'RGB')
+        gravar_imagem(img if formato == 'WEBP' else para_rgb(img), destino, formato, opcoes)
+
+
+def obter_miniatura(origem, largura, extensao):
+    """
+    (caminho, hash da foto) da miniatura de `origem`, gerando-a se ainda não
+    estiver no cache em disco. Retorna (None, None) se a foto não existir.
+    """
+    hash_foto = hash_origem(origem)
+    if hash_foto is None:
+        return None, None
+    destino = caminho_miniatura(hash_foto, largura, extensao)
+    if not os.path.exists(destino):
+        # Duas requisições simultâneas podem gerar a mesma miniatura; a troca
+        # atômica em gravar_imagem garante que nenhuma lê um arquivo pela metade
+        gerar_miniatura(origem, destino, largura, extensao)
+    return destino, hash_foto
+
+
+def abrir_miniatura(origem, largura, extensao):
+    """
+    Arquivo aberto da miniatura de `origem`, ou None se a foto não existir.
+    Se o limpar_miniaturas apagar a miniatura entre a verificação e a
+    abertura, ela é gerada de novo.
+    """
+    for _ in range(2):
+        caminho = obter_miniatura(origem, largura, extensao)[0]
+        if caminho is None:
+            return None
+        try:
+            return open(caminho, 'rb')
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def urls_miniaturas_clinica(clinica, largura=480):
+    """
+    {'src': url na `largura`, 'srcset': todas as larguras} da foto da clínica.
+    As URLs levam o hash da foto (?v=), então mudam quando a foto muda.
+    """
+    if not clinica.foto:
+        return {'src': '', 'srcset': ''}
+    try:
+        hash_foto = hash_origem(clinica.foto.path)
+    except NotImplementedError:
+        hash_foto = None  # Storage remoto: sem cache em disco
+    if hash_foto is None:
+        return {'src': clinica.foto.url, 'srcset': ''}
+
+    def url(largura):
+        return f"{reverse('veterinarios:miniatura_clinica', args=[clinica.pk, largura])}?v={hash_foto}"
+
+    return {
+        'src': url(largura),
+        'srcset': ', '.join(f'{url(l)} {l}w' for l in LARGURAS_MINIATURA),
+    }
+
+
+def limpar_miniaturas(hashes_em_uso):
+    """Remove do cache em disco as miniaturas de fotos cujo hash não está em `hashes_em_uso`"""
+    removidos = 0
+    raiz = str(settings.MINIATURAS_DIR)
+    if not os.path.isdir(raiz):
+        return 0
+    for pasta, _, arquivos in os.walk(raiz):
+        for nome in arquivos:
+            if nome.split('_', 1)[0] not in hashes_em_uso:
+                os.remove(os.path.join(pasta, nome))
+                removidos += 1
+    return removidos
@@ -1,5 +1,66 @@
-from django.db import models
+from django.db import models, connection, connections
+from django.db.models.query import ModelIterable
 from django.conf import settings
+from django.utils import timezone
+from .schema import coluna_existe, colunas_da_tabela
+from .texto import normalizar_texto
+from tutores.armazenamento import armazenamento_por_conteudo
+
+# Colunas do perfil do veterinário que podem não existir na tabela do banco
+CAMPOS_OPCIONAIS_VETERINARIO = ('especialidade', 'formacao', 'experiencia')
+
+
+def carregar_campos_opcionais(veterinarios, using='default'):
+    """
+    Carrega as colunas opcionais de vários veterinários em uma única query
+    e guarda os valores nas instâncias, evitando um SELECT por propriedade.
+    """
+    veterinarios = [v for v in veterinarios if v.id is not None]
+    if not veterinarios:
+        return veterinarios
+
+    colunas = [
+        c for c in CAMPOS_OPCIONAIS_VETERINARIO
+        if c in colunas_da_tabela('veterinarios_veterinario', using=using)
+    ]
+    valores = {}
+    if colunas:
+        ids = [v.id for v in veterinarios]
+        placeholders = ', '.join(['%s'] * len(ids))
+        try:
+            with connections[using].cursor() as cursor:
+                cursor.execute(
+                    f"SELECT id, {', '.join(colunas)} FROM veterinarios_veterinario WHERE id IN ({placeholders})",
+                    ids
+                )
+                for row in cursor.fetchall():
+                    valores[row[0]] = dict(zip(colunas, row[1:]))
+        except:
+            pass
+
+    for veterinario in veterinarios:
+        linha = valores.get(veterinario.id, {})
+        veterinario._campos_opcionais = {
+            c: linha.get(c) or None for c in CAMPOS_OPCIONAIS_VETERINARIO
+        }
+    return veterinarios
+
+
+class VeterinarioPerfilIterable(ModelIterable):
+    """Iterable que anexa as colunas opcionais em lotes, também com iterator()"""
+    tamanho_lote = 100
+
+    def __iter__(self):
+        using = self.queryset.db
+        lote = []
+        for veterinario in super().__iter__():
+            lote.append(veterinario)
+            if len(lote) >= self.tamanho_lote:
+                yield from carregar_campos_opcionais(lote, using=using)
+                lote = []
+        if lote:
+            yield from carregar_campos_opcionais(lote, using=using)
+
 
 class VeterinarioQuerySet(models.QuerySet):
     """QuerySet customizado que exclui o campo CPF das queries"""
@@ -7,6 +68,12 @@ class VeterinarioQuerySet(models.QuerySet):
         clone = super()._clone()
         return clone
 
+    def com_perfil(self):
+        """Carrega especialidade, formação e experiência de todas as linhas em uma query"""
+        clone = self._chain()
+        clone._iterable_class = VeterinarioPerfilIterable
+        return clone
+
 class VeterinarioManager(models.Manager):
     """Manager customizado para Veterinario que sempre usa only() com campos que existem"""
     def get_queryset(self):
@@ -23,6 +90,9 @@ class VeterinarioManager(models.Manager):
     def first(self):
         return self.get_queryset().only('id', 'usuario', 'crmv').first()
 
+    def com_perfil(self):
+        return self.get_queryset().com_perfil()
+
 class Veterinario(models.Model):
     usuario = models.OneToOneField(
         settings.AUTH_USER_MODEL,
@@ -37,8 +107,18 @@ class Veterinario(models.Model):
     # Campos adicionais para perfil público
     formacao = models.TextField(blank=True, null=True, help_text='Formação acadêmica do veterinário')
     experiencia = models.TextField(blank=True, null=True, help_text='Experiência profissional')
+    # Chave da busca por prefixo (autocomplete), preenchida no save()
+    nome_normalizado = models.CharField(max_length=300, blank=True, default='', db_index=True, editable=False)
     
     objects = VeterinarioManager()
+
+    def save(self, *args, **kwargs):
+        usuario = self.usuario
+        self.nome_normalizado = normalizar_texto(usuario.get_full_name() or usuario.username)[:300]
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'nome_normalizado'}
+        super().save(*args, **kwargs)
     
     @property
     def cpf(self):
@@ -50,51 +130,39 @@ class Veterinario(models.Model):
         """Retorna o telefone do usuário vinculado (armazenado no CustomUser)"""
         return self.usuario.telefone if hasattr(self.usuario, 'telefone') else None
     
-    @property
-    def especialidade(self):
-        """Retorna especialidade se existir no banco, senão None"""
-        # Tenta buscar do banco se a coluna existir
+    def _coluna_opcional(self, coluna):
+        """Lê uma coluna que pode não existir na tabela do banco"""
+        # Valores já carregados em lote por com_perfil()
+        carregados = getattr(self, '_campos_opcionais', None)
+        if carregados is not None:
+            return carregados.get(coluna)
+        if not coluna_existe('veterinarios_veterinario', coluna):
+            return None
         try:
-            from django.db import connection
             with connection.cursor() as cursor:
                 cursor.execute(
-                    "SELECT especialidade FROM veterinarios_veterinario WHERE id = %s",
+                    f"SELECT {coluna} FROM veterinarios_veterinario WHERE id = %s",
                     [self.id]
                 )
                 row = cursor.fetchone()
                 return row[0] if row and row[0] else None
         except:
             return None
+
+    @property
+    def especialidade(self):
+        """Retorna especialidade se existir no banco, senão None"""
+        return self._coluna_opcional('especialidade')
     
     @property
     def formacao(self):
         """Retorna formacao se existir no banco, senão None"""
-        try:
-            from django.db import connection
-            with connection.cursor() as cursor:
-                cursor.execute("SHOW COLUMNS FROM veterinarios_veterinario LIKE 'formacao'")
-                if cursor.fetchone():
-                    cursor.execute("SELECT formacao FROM veterinarios_veterinario WHERE id = %s", [self.id])
-                    row = cursor.fetchone()
-                    return row[0] if row and row[0] else None
-        except:
-            pass
-        return None
+        return self._coluna_opcional('formacao')
     
     @property
     def experiencia(self):
         """Retorna experiencia se existir no banco, senão None"""
-        try:
-            from django.db import connection
-            with connection.cursor() as cursor:
-                cursor.execute("SHOW COLUMNS FROM veterinarios_veterinario LIKE 'experiencia'")
-                if cursor.fetchone():
-                    cursor.execute("SELECT experiencia FROM veterinarios_veterinario WHERE id = %s", [self.id])
-                    row = cursor.fetchone()
-                    return row[0] if row and row[0] else None
-        except:
-            pass
-        return None
+        return self._coluna_opcional('experiencia')
 
     def __str__(self):
         return f"{self.usuario.get_full_name() or self.usuario.username}"
@@ -119,54 +187,115 @@ class Clinica(models.Model):
     bairro = models.CharField(max_length=100, blank=True, null=True)
     observacoes = models.TextField(blank=True, null=True)
     telefone = models.CharField(max_length=15, blank=True, null=True)
-    foto = models.ImageField(upload_to='clinicas/', blank=True, null=True)
-    # Nota: Campos de geolocalização (latitude/longitude) podem não existir na tabela do banco
-    # Se necessário, podem ser adicionados via migração futura
+    foto = models.ImageField(upload_to='clinicas/', storage=armazenamento_por_conteudo, blank=True, null=True)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    # Chaves de busca sem acentos e em minúsculas, preenchidas no save()
+    nome_normalizado = models.CharField(max_length=100, blank=True, default='', db_index=True, editable=False)
+    rua_normalizada = models.CharField(max_length=255, blank=True, default='', db_index=True, editable=False)
+    bairro_normalizado = models.CharField(max_length=100, blank=True, default='', db_index=True, editable=False)
+    veterinario_nome_normalizado = models.CharField(max_length=300, blank=True, default='', db_index=True, editable=False)
 
-    @property
-    def latitude(self):
-        """Retorna latitude se existir no banco, senão None"""
-        try:
-            from django.db import connection
-            with connection.cursor() as cursor:
-                cursor.execute("SHOW COLUMNS FROM veterinarios_clinica LIKE 'latitude'")
-                if cursor.fetchone():
-                    cursor.execute("SELECT latitude FROM veterinarios_clinica WHERE id = %s", [self.id])
-                    row = cursor.fetchone()
-                    return float(row[0]) if row and row[0] is not None else None
-        except:
-            pass
-        return None
-    
-    @property
-    def longitude(self):
-        """Retorna longitude se existir no banco, senão None"""
-        try:
-            from django.db import connection
-            with connection.cursor() as cursor:
-                cursor.execute("SHOW COLUMNS FROM veterinarios_clinica LIKE 'longitude'")
-                if cursor.fetchone():
-                    cursor.execute("SELECT longitude FROM veterinarios_clinica WHERE id = %s", [self.id])
-                    row = cursor.fetchone()
-                    return float(row[0]) if row and row[0] is not None else None
-        except:
-            pass
-        return None
+    class Meta:
+        indexes = [
+            # Usado pelo pré-filtro de caixa delimitadora da busca por proximidade
+            models.Index(fields=['latitude', 'longitude'], name='clinica_lat_lon_idx'),
+        ]
+
+    def atualizar_chaves_normalizadas(self):
+        """Preenche as chaves de busca normalizadas a partir dos campos originais"""
+        self.nome_normalizado = normalizar_texto(self.nome)[:100]
+        self.rua_normalizada = normalizar_texto(self.rua)[:255]
+        self.bairro_normalizado = normalizar_texto(self.bairro)[:100]
+        nome_veterinario = ''
+        if self.veterinario_id:
+            usuario = self.veterinario.usuario
+            nome_veterinario = f"{usuario.first_name} {usuario.last_name}"
+        self.veterinario_nome_normalizado = normalizar_texto(nome_veterinario)[:300]
+
+    def save(self, *args, **kwargs):
+        self.atualizar_chaves_normalizadas()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {
+                'nome_normalizado', 'rua_normalizada', 'bairro_normalizado', 'veterinario_nome_normalizado'
+            }
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.nome
 
 
+class ClinicaBusca(models.Model):
+    """
+    Documento de busca desnormalizado da clínica: nome, endereço, nome do
+    veterinário e serviços em um único texto com índice full-text.
+    Mantido pelos sinais em veterinarios.busca.
+    """
+    clinica = models.OneToOneField(
+        Clinica,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='documento_busca'
+    )
+    documento = models.TextField(blank=True, default='')
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Documento de busca - {self.clinica_id}"
+
+
 class Service(models.Model):
     clinic = models.ForeignKey(Clinica, on_delete=models.CASCADE, related_name='services')
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        constraints = [
+            # Permite aplicar o catálogo com bulk_create(ignore_conflicts=True)
+            models.UniqueConstraint(fields=['clinic', 'name'], name='service_clinica_nome_unico'),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.clinic.nome}"
 
 
+class ServicoCatalogo(models.Model):
+    """
+    Serviço padrão criado nas clínicas (veterinarios.catalogo). Sem
+    veterinário vale para todos; com veterinário substitui, nas clínicas
+    dele, o serviço padrão de mesmo nome.
+    """
+    veterinario = models.ForeignKey(
+        Veterinario,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='catalogo_servicos',
+        help_text='Vazio para o catálogo padrão de todos os veterinários'
+    )
+    nome = models.CharField(max_length=100)
+    descricao = models.TextField(blank=True, default='')
+    preco = models.DecimalField(max_digits=10, decimal_places=2)
+    ativo = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['nome']
+        verbose_name = 'serviço do catálogo'
+        verbose_name_plural = 'catálogo de serviços'
+        constraints = [
+            models.UniqueConstraint(fields=['veterinario', 'nome'], name='catalogo_veterinario_nome_unico'),
+            # O NULL do catálogo padrão não conta na restrição acima
+            models.UniqueConstraint(
+                fields=['nome'], condition=models.Q(veterinario__isnull=True), name='catalogo_padrao_nome_unico'
+            ),
+        ]
+
+    def __str__(self):
+        return self.nome
+
+
 class Appointment(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pendente'),
@@ -184,6 +313,12 @@ class Appointment(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     notes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Agenda do veterinário filtrada por período (listagem e calendário)
+            models.Index(fields=['veterinarian', 'date'], name='appointment_vet_date_idx'),
+        ]
+
     def __str__(self):
         return f"Consulta de {self.animal.nome} - {self.date}"
 
@@ -194,10 +329,55 @@ class Notification(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Lista paginada e contagem de não lidas de cada usuário
+            models.Index(fields=['user', 'is_read', 'created_at'], name='notification_user_lida_idx'),
+        ]
+
     def __str__(self):
         return f"Notificação para {self.user.username}"
 
 
+class EmailSaida(models.Model):
+    """
+    Caixa de saída de emails: gravada na mesma transação da notificação e
+    enviada depois pelo comando enviar_emails, fora da requisição.
+    """
+    STATUS_CHOICES = [
+        ('resumo', 'Aguardando resumo'),
+        ('pendente', 'Pendente'),
+        ('enviando', 'Enviando'),
+        ('enviado', 'Enviado'),
+        ('falhou', 'Falhou'),
+    ]
+
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True)
+    destinatario = models.EmailField()
+    assunto = models.CharField(max_length=200)
+    mensagem = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pendente')
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    # Quando o email pode ser (re)tentado; enquanto 'enviando', até quando a reserva
+    # vale; enquanto 'resumo', quando o resumo do usuário deve ser montado
+    proxima_tentativa = models.DateTimeField(default=timezone.now)
+    # Quantas notificações este email reúne (> 1 quando é um resumo)
+    quantidade_agrupada = models.PositiveIntegerField(default=1)
+    ultimo_erro = models.TextField(blank=True, default='')
+    criado_em = models.DateTimeField(auto_now_add=True)
+    enviado_em = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Email na caixa de saída'
+        verbose_name_plural = 'Caixa de saída de emails'
+        indexes = [
+            models.Index(fields=['status', 'proxima_tentativa'], name='emailsaida_fila_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.assunto} para {self.destinatario} ({self.get_status_display()})"
+
+
 class Rating(models.Model):
     clinic = models.ForeignKey(Clinica, on_delete=models.CASCADE, related_name='ratings')
     tutor = models.ForeignKey('tutores.Tutor', on_delete=models.CASCADE)
@@ -0,0 +1,64 @@
+# veterinarios/schema.py
+import threading
+
+from django.db import connections, DEFAULT_DB_ALIAS
+
+
+# Cache de colunas por (alias do banco, tabela), preenchido uma vez por processo
+_colunas_cache = {}
+_lock = threading.Lock()
+
+
+def colunas_da_tabela(tabela, using=DEFAULT_DB_ALIAS):
+    """
+    Retorna o conjunto de colunas existentes na tabela.
+
+    A introspecção é feita apenas na primeira chamada para cada tabela; as
+    chamadas seguintes respondem da memória até que o cache seja invalidado
+    (após migrações ou alterações de schema feitas pela aplicação).
+    """
+    chave = (using, tabela)
+    colunas = _colunas_cache.get(chave)
+    if colunas is not None:
+        return colunas
+
+    with _lock:
+        colunas = _colunas_cache.get(chave)
+        if colunas is None:
+            connection = connections[using]
+            try:
+                with connection.cursor() as cursor:
+                    descricao = connection.introspection.get_table_description(cursor, tabela)
+                colunas = frozenset(col.name for col in descricao)
+            except Exception:
+                # Tabela inexistente ou erro de conexão: não guarda no cache
+                return frozenset()
+            _colunas_cache[chave] = colunas
+    return colunas
+
+
+def coluna_existe(tabela, coluna, using=DEFAULT_DB_ALIAS):
+    """Verifica se a coluna existe na tabela sem consultar o banco a cada chamada"""
+    return coluna in colunas_da_tabela(tabela, using=using)
+
+
+def invalidar_cache_schema(tabela=None, using=None):
+    """
+    Descarta as colunas guardadas em cache.
+
+    Sem argumentos limpa tudo; com `tabela` e/ou `using` limpa apenas as
+    entradas correspondentes. Deve ser chamada sempre que o schema mudar.
+    """
+    with _lock:
+        if tabela is None and using is None:
+            _colunas_cache.clear()
+            return
+        for chave in list(_colunas_cache):
+            alias, nome = chave
+            if (tabela is None or nome == tabela) and (using is None or alias == using):
+                del _colunas_cache[chave]
+
+
+def invalidar_cache_apos_migracao(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Handler de post_migrate: o schema pode ter mudado, então recarrega tudo"""
+    invalidar_cache_schema(using=using)
@@ -1,3 +1,799 @@
-from django.test import TestCase
+import datetime
+import io
+import os
+import tempfile
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.core import mail
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from tutores.cadastro import cadastrar_veterinario
+from tutores.models import Animal, CustomUser, Tutor
+from veterinarios import busca
+from veterinarios.busca import atualizar_documentos_em_lote, buscar_clinicas, buscar_por_prefixo
+from veterinarios.catalogo import aplicar_catalogo, aplicar_catalogo_nas_clinicas
+from veterinarios.email_saida import (
+    TEMPO_RESERVA, agrupar_resumos, estatisticas_resumos, processar_caixa_saida, reservar_lote,
+)
+from veterinarios.forms import CadastroVeterinarioForm
+from veterinarios import miniaturas
+from veterinarios.models import (
+    Appointment, Clinica, ClinicaBusca, EmailSaida, Notification, Service, ServicoCatalogo, Veterinario,
+)
+from veterinarios.schema import _colunas_cache, colunas_da_tabela, invalidar_cache_apos_migracao, invalidar_cache_schema
+from veterinarios.texto import normalizar_texto
+from veterinarios.utils import (
+    contar_nao_lidas, enviar_notificacao, enviar_notificacao_em_massa, marcar_notificacoes_lidas, pagina_notificacoes,
+)
+from veterinarios.views import get_clinicas_do_veterinario
+
+
+def _data(dia, hora=9, minuto=0):
+    return timezone.make_aware(datetime.datetime(2026, 3, dia, hora, minuto))
+
+
+class AgendaConsultasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = CustomUser.objects.create_user('vet')
+        cls.veterinario = Veterinario(usuario=cls.usuario, crmv='SP1')
+        cls.veterinario.save()
+        outro = Veterinario(usuario=CustomUser.objects.create_user('outro'), crmv='SP2')
+        outro.save()
+        clinica = Clinica.objects.create(nome='Clínica Central', veterinario=cls.veterinario)
+        tutor = Tutor.objects.create(usuario=CustomUser.objects.create_user('tutor'))
+        animal = Animal.objects.create(tutor=tutor, nome='Rex', especie='cachorro')
+
+        def consulta(data, status='pending', veterinario=cls.veterinario):
+            return Appointment.objects.create(
+                tutor=tutor, veterinarian=veterinario, clinic=clinica, animal=animal, date=data, status=status
+            ).id
+
+        cls.antes = consulta(_data(9, 23, 59))
+        cls.inicio = consulta(_data(10, 0, 0), 'confirmed')
+        cls.meio = consulta(_data(12))
+        cls.fim = consulta(_data(15, 23, 30), 'confirmed')
+        cls.depois = consulta(_data(16, 0, 0))
+        consulta(_data(12), veterinario=outro)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def _listar(self, **parametros):
+        resposta = self.client.get(reverse('veterinarios:listar_consultas'), parametros)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta
+
+    def _calendario(self, **parametros):
+        return self.client.get(reverse('veterinarios:calendario_consultas'), parametros)
+
+    def test_periodo_inclui_o_dia_final_inteiro(self):
+        resposta = self._listar(inicio='2026-03-10', fim='2026-03-15')
+        self.assertEqual([c.id for c in resposta.context['consultas']], [self.fim, self.meio, self.inicio])
+
+    def test_filtra_por_status(self):
+        resposta = self._listar(status='confirmed')
+        self.assertEqual([c.id for c in resposta.context['consultas']], [self.fim, self.inicio])
+
+    def test_filtro_invalido_lista_tudo(self):
+        resposta = self._listar(inicio='2026-03-15', fim='2026-03-10')
+        self.assertEqual(len(resposta.context['consultas']), 5)
+        self.assertFalse(resposta.context['filtrando'])
+
+    def test_paginacao_por_cursor(self):
+        resposta = self._listar(por_pagina=3)
+        self.assertEqual([c.id for c in resposta.context['consultas']], [self.depois, self.fim, self.meio])
+        resposta = self.client.get(resposta.context['proxima_url'])
+        self.assertEqual([c.id for c in resposta.context['consultas']], [self.inicio, self.antes])
+        self.assertIsNone(resposta.context['proxima_url'])
+
+    def test_calendario_do_periodo(self):
+        with CaptureQueriesContext(connection) as contexto:
+            dados = self._calendario(inicio='2026-03-10', fim='2026-03-15').json()
+        # Uma consulta só, já com os nomes do animal e da clínica
+        self.assertEqual(sum('veterinarios_appointment' in q['sql'] for q in contexto.captured_queries), 1)
+        self.assertEqual((dados['inicio'], dados['fim']), ('2026-03-10', '2026-03-15'))
+        self.assertEqual([c['id'] for c in dados['consultas']], [self.inicio, self.meio, self.fim])
+        self.assertEqual(dados['consultas'][0], {
+            'id': self.inicio, 'data': '2026-03-10T00:00:00-03:00', 'status': 'confirmed',
+            'animal': 'Rex', 'clinica': 'Clínica Central',
+        })
+
+    def test_calendario_sem_periodo_usa_o_mes(self):
+        with mock.patch('veterinarios.views.timezone.localdate', return_value=datetime.date(2026, 2, 14)):
+            dados = self._calendario().json()
+        self.assertEqual((dados['inicio'], dados['fim']), ('2026-02-01', '2026-02-28'))
+        self.assertEqual(dados['consultas'], [])
+        dados = self._calendario(inicio='2026-03-01').json()
+        self.assertEqual(dados['fim'], '2026-03-31')
+        self.assertEqual(len(dados['consultas']), 5)
+
+    def test_calendario_rejeita_periodo_invalido(self):
+        self.assertEqual(self._calendario(inicio='2026-01-01', fim='2026-03-31').status_code, 400)
+        self.assertEqual(self._calendario(inicio='2026-03-15', fim='2026-03-10').status_code, 400)
+        self.assertEqual(self._calendario(inicio='ontem').status_code, 400)
+
+
+class BuscaClinicasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = CustomUser.objects.create_user('vet', first_name='João', last_name='Araújo')
+        cls.veterinario = Veterinario(usuario=cls.usuario, crmv='SP1')
+        cls.veterinario.save()
+        cls.clinica = Clinica.objects.create(
+            nome='Clínica São Francisco', rua='Rua das Flores', bairro='Jardim América', veterinario=cls.veterinario
+        )
+        Clinica.objects.create(nome='Pet Center', bairro='Centro')
+
+    def _documento(self):
+        return ClinicaBusca.objects.get(clinica=self.clinica).documento
+
+    def _ids(self, termo):
+        return [clinica_id for clinica_id, _ in buscar_clinicas(termo)]
+
+    def test_documento_criado_ao_salvar_a_clinica(self):
+        self.assertEqual(self._documento(), 'clinica sao francisco rua das flores jardim america joao araujo')
+        self.clinica.nome = 'Clínica Santa Clara'
+        self.clinica.save()
+        self.assertIn('santa clara', self._documento())
+
+    def test_servicos_entram_e_saem_do_documento(self):
+        servico = Service.objects.create(clinic=self.clinica, name='Ultrassonografia', price='150.00')
+        self.assertIn('ultrassonografia', self._documento())
+        servico.delete()
+        self.assertNotIn('ultrassonografia', self._documento())
+
+    def test_renomear_veterinario_atualiza_documento(self):
+        self.usuario.first_name = 'Pedro'
+        self.usuario.save(update_fields=['first_name'])
+        self.assertIn('pedro araujo', self._documento())
+        self.clinica.refresh_from_db()
+        self.assertEqual(self.clinica.veterinario_nome_normalizado, 'pedro araujo')
+
+    def test_excluir_clinica_com_servicos(self):
+        Service.objects.create(clinic=self.clinica, name='Vacinação', price='50.00')
+        clinica_id = self.clinica.id
+        self.clinica.delete()
+        self.assertFalse(ClinicaBusca.objects.filter(clinica_id=clinica_id).exists())
+
+    def test_busca_por_nome_endereco_e_veterinario(self):
+        for termo in ('francisco', 'flores', 'joao', 'sao fran', 'Jardim América'):
+            with self.subTest(termo=termo):
+                self.assertEqual(self._ids(termo), [self.clinica.id])
+        self.assertEqual(self._ids('inexistente'), [])
+        self.assertEqual(self._ids('  ?! '), [])
+
+    def test_busca_por_servico(self):
+        Service.objects.create(clinic=self.clinica, name='Castração', price='300.00')
+        self.assertEqual(self._ids('castracao'), [self.clinica.id])
+
+    def test_comando_recria_os_documentos(self):
+        ClinicaBusca.objects.all().delete()
+        call_command('reindexar_busca_clinicas', stdout=io.StringIO())
+        self.assertEqual(ClinicaBusca.objects.count(), 2)
+        self.assertEqual(self._ids('flores'), [self.clinica.id])
+
+    def test_migracao_preenche_os_documentos_que_faltam(self):
+        Service.objects.create(clinic=self.clinica, name='Castração', price='90.00')
+        ClinicaBusca.objects.filter(clinica=self.clinica).delete()
+        migracao = import_module('veterinarios.migrations.0016_preencher_clinicabusca')
+        # Clínicas sem documento, seus serviços e um INSERT
+        with self.assertNumQueries(3):
+            migracao.preencher_documentos(apps, None)
+        self.assertEqual(self._documento(), 'clinica sao francisco rua das flores jardim america joao araujo castracao')
+        self.assertEqual(ClinicaBusca.objects.count(), 2)
+        self.assertEqual(self._ids('castracao'), [self.clinica.id])
+
+    def test_atualizacao_em_lote_com_consultas_fixas(self):
+        ClinicaBusca.objects.all().delete()
+        clinicas = [self.clinica.id] + [
+            Clinica.objects.create(nome=f'Clínica {i}', veterinario=self.veterinario).id for i in range(5)
+        ]
+        with self.assertNumQueries(3):
+            atualizar_documentos_em_lote(clinicas)
+        self.assertEqual(ClinicaBusca.objects.filter(clinica_id__in=clinicas).count(), 6)
+        self.assertIn('joao araujo', self._documento())
+
+
+class CadastroVeterinarioTests(TestCase):
+    SENHA = 'Senha!forte123'
+
+    def _form(self, **dados):
+        return CadastroVeterinarioForm({
+            'nome_completo': 'Bia Souza', 'email': 'bia@exemplo.com', 'crmv': 'SP1234',
+            'password1': self.SENHA, 'password2': self.SENHA, **dados,
+        })
+
+    def test_cadastra_usuario_e_veterinario(self):
+        form = self._form()
+        self.assertTrue(form.is_valid())
+        usuario = cadastrar_veterinario(form)
+        self.assertEqual(usuario.username, 'bia')
+        self.assertTrue(Veterinario.objects.filter(usuario=usuario, crmv='SP1234').exists())
+
+    def test_confere_email_cpf_e_crmv_em_uma_consulta(self):
+        usuario = CustomUser.objects.create_user('bia', email='bia@exemplo.com', cpf='11144477735')
+        Veterinario(usuario=usuario, crmv='SP1234').save()
+        form = self._form(cpf='111.444.777-35')
+        with self.assertNumQueries(1):
+            self.assertFalse(form.is_valid())
+        self.assertEqual(set(form.errors), {'email', 'cpf', 'crmv'})
+
+    def test_crmv_gravado_depois_da_validacao_vira_erro_do_campo(self):
+        form = self._form()
+        self.assertTrue(form.is_valid())
+        # Outro cadastro grava o mesmo CRMV antes
+        Veterinario(usuario=CustomUser.objects.create_user('outro'), crmv='SP1234').save()
+        self.assertIsNone(cadastrar_veterinario(form))
+        self.assertIn('crmv', form.errors)
+        self.assertFalse(CustomUser.objects.filter(email='bia@exemplo.com').exists())
+
+
+class CatalogoServicosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.veterinario = Veterinario(usuario=CustomUser.objects.create_user('vet'), crmv='SP1')
+        cls.veterinario.save()
+
+    def _clinicas(self, quantidade, inicio=0):
+        return [
+            Clinica.objects.create(nome=f'Clínica {i}', veterinario=self.veterinario)
+            for i in range(inicio, inicio + quantidade)
+        ]
+
+    def _consultas_para(self, quantidade):
+        clinicas = self._clinicas(quantidade, inicio=Clinica.objects.count())
+        with CaptureQueriesContext(connection) as contexto:
+            aplicar_catalogo([c.id for c in clinicas], self.veterinario)
+        return len(contexto.captured_queries)
+
+    def test_numero_de_consultas_nao_depende_das_clinicas(self):
+        self.assertEqual(self._consultas_para(1), self._consultas_para(6))
+
+    def test_aplicar_de_novo_nao_duplica_nem_altera_servicos_existentes(self):
+        clinica, = self._clinicas(1)
+        Service.objects.create(clinic=clinica, name='Vacinação', price='70.00')
+        self.assertEqual(aplicar_catalogo_nas_clinicas(self.veterinario), 1)
+        aplicar_catalogo_nas_clinicas(self.veterinario)
+        self.assertEqual(clinica.services.count(), ServicoCatalogo.objects.filter(veterinario=None).count())
+        self.assertEqual(str(clinica.services.get(name='Vacinação').price), '70.00')
+        self.assertIn('radiografia', ClinicaBusca.objects.get(clinica=clinica).documento)
+
+    def test_item_do_veterinario_substitui_o_padrao(self):
+        ServicoCatalogo.objects.create(veterinario=self.veterinario, nome='Consulta Geral', preco='95.00')
+        clinica, = self._clinicas(1)
+        aplicar_catalogo([clinica.id], self.veterinario)
+        self.assertEqual(str(clinica.services.get(name='Consulta Geral').price), '95.00')
+
+
+class ChavesNormalizadasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        usuario = CustomUser.objects.create_user('vet', first_name='João', last_name='Araújo')
+        cls.veterinario = Veterinario(usuario=usuario, crmv='SP1')
+        cls.veterinario.save()
+        cls.clinica = Clinica.objects.create(
+            nome='Clínica  São Francisco', rua='Rua Ébano', bairro='Jardim América', veterinario=cls.veterinario
+        )
+
+    def test_normalizar_texto(self):
+        self.assertEqual(normalizar_texto('  Clínica  São João '), 'clinica sao joao')
+        self.assertEqual(normalizar_texto(None), '')
+
+    def test_chaves_preenchidas_no_save(self):
+        self.assertEqual(self.clinica.nome_normalizado, 'clinica sao francisco')
+        self.assertEqual(self.clinica.rua_normalizada, 'rua ebano')
+        self.assertEqual(self.clinica.bairro_normalizado, 'jardim america')
+        self.assertEqual(self.clinica.veterinario_nome_normalizado, 'joao araujo')
+        self.clinica.bairro = 'Água Verde'
+        self.clinica.save(update_fields=['bairro'])
+        self.clinica.refresh_from_db()
+        self.assertEqual(self.clinica.bairro_normalizado, 'agua verde')
+
+    def test_prefixo_ignora_acentos_e_maiusculas(self):
+        for termo in ('CLINICA são', 'Rua Eba', 'Jardim Amé', 'joão'):
+            with self.subTest(termo=termo):
+                self.assertEqual(buscar_por_prefixo(termo), [(self.clinica.id, 0)])
+        self.assertEqual(buscar_por_prefixo('francisco'), [])
+
+    def test_sem_indice_full_text_usa_prefixo(self):
+        with mock.patch.dict(busca._BUSCAS_POR_BANCO, clear=True):
+            self.assertEqual(buscar_clinicas('Clinica Sao'), [(self.clinica.id, 0)])
+
+    def test_comando_preenche_chaves_existentes(self):
+        Clinica.objects.update(nome_normalizado='', rua_normalizada='', veterinario_nome_normalizado='')
+        ClinicaBusca.objects.all().delete()
+        call_command('preencher_chaves_busca', stdout=io.StringIO())
+        self.clinica.refresh_from_db()
+        self.assertEqual(self.clinica.nome_normalizado, 'clinica sao francisco')
+        self.assertEqual(self.clinica.veterinario_nome_normalizado, 'joao araujo')
+        self.assertIn('rua ebano', ClinicaBusca.objects.get(clinica=self.clinica).documento)
+
+    def test_clinicas_do_veterinario_pela_coluna_do_relacionamento(self):
+        self.assertEqual(get_clinicas_do_veterinario(self.veterinario), [self.clinica])
+        # veterinario_nome_normalizado também contém "veterinario" e vem antes
+        colunas = ['id', 'veterinario_nome_normalizado', 'veterinario_id']
+        with mock.patch('veterinarios.views.colunas_da_tabela', return_value=colunas):
+            self.assertEqual(get_clinicas_do_veterinario(self.veterinario), [self.clinica])
+
+    def test_coluna_do_veterinario_com_outro_nome(self):
+        colunas = ['id', 'veterinario_nome_normalizado', 'veterinario_ref']
+        with mock.patch('veterinarios.views.colunas_da_tabela', return_value=colunas), \
+                CaptureQueriesContext(connection) as contexto:
+            get_clinicas_do_veterinario(self.veterinario)
+        sql = contexto.captured_queries[0]['sql']
+        self.assertIn('WHERE veterinario_ref =', sql)
+
+
+class ContadorNaoLidasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = CustomUser.objects.create_user('tutor')
+
+    def _recarregado(self):
+        return CustomUser.objects.get(pk=self.usuario.pk)
+
+    def test_contador_gravado_no_usuario(self):
+        for _ in range(3):
+            enviar_notificacao(self.usuario, 'Olá', enviar_email=False)
+        usuario = self._recarregado()
+        with self.assertNumQueries(0):
+            self.assertEqual(contar_nao_lidas(usuario), 3)
+        marcar_notificacoes_lidas(usuario, Notification.objects.values_list('id', flat=True)[:2])
+        self.assertEqual(contar_nao_lidas(usuario), 1)
+        self.assertEqual(contar_nao_lidas(self._recarregado()), 1)
+
+    def test_notificacao_em_massa_soma_no_contador(self):
+        outro = CustomUser.objects.create_user('outro')
+        enviar_notificacao_em_massa(CustomUser.objects.all(), 'Aviso', enviar_email=False, tamanho_lote=1)
+        enviar_notificacao_em_massa(CustomUser.objects.filter(pk=outro.pk), 'Aviso', enviar_email=False)
+        self.assertEqual(contar_nao_lidas(self._recarregado()), 1)
+        self.assertEqual(contar_nao_lidas(CustomUser.objects.get(pk=outro.pk)), 2)
+
+    def test_reconciliar_corrige_alteracoes_feitas_por_fora(self):
+        enviar_notificacao(self.usuario, 'Olá', enviar_email=False)
+        # Criadas e lidas sem passar pelo contador, como pelo admin
+        Notification.objects.create(user=self.usuario, message='Admin')
+        Notification.objects.create(user=self.usuario, message='Lida', is_read=True)
+        sem_notificacoes = CustomUser.objects.create_user('outro')
+        CustomUser.objects.filter(pk=sem_notificacoes.pk).update(notificacoes_nao_lidas=4)
+        call_command('reconciliar_notificacoes', lote=1, stdout=io.StringIO())
+        self.assertEqual(contar_nao_lidas(self._recarregado()), 2)
+        self.assertEqual(contar_nao_lidas(CustomUser.objects.get(pk=sem_notificacoes.pk)), 0)
+
+
+class EditarPerfilVeterinarioTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = CustomUser.objects.create_user('vet', password='x')
+        cls.veterinario = Veterinario(usuario=cls.usuario, crmv='SP1')
+        cls.veterinario.save()
+
+    def setUp(self):
+        self.addCleanup(invalidar_cache_schema)
+        self.client.force_login(self.usuario)
+
+    def _editar(self, especialidade):
+        self.client.post(reverse('veterinarios:editar_perfil_veterinario'), {
+            'username': 'vet', 'first_name': 'Bia', 'last_name': 'Souza', 'especialidade': especialidade,
+        })
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT especialidade FROM veterinarios_veterinario WHERE id = %s", [self.veterinario.id])
+            return cursor.fetchone()[0]
+
+    def test_grava_com_cache_de_colunas_desatualizado(self):
+        self.assertEqual(self._editar('Felinos'), 'Felinos')
+        # Cache de outro processo, de antes da coluna ser criada
+        chave = ('default', 'veterinarios_veterinario')
+        _colunas_cache[chave] = colunas_da_tabela('veterinarios_veterinario') - {'especialidade'}
+        self.assertEqual(self._editar('Aves'), 'Aves')
+        self.assertIn('especialidade', _colunas_cache[chave])
+
+
+class EmailSaidaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = CustomUser.objects.create_user('ana', email='ana@exemplo.com')
+
+    def _enfileirar(self, quantidade=1):
+        for i in range(quantidade):
+            enviar_notificacao(self.usuario, f'Aviso {i}')
+        return list(EmailSaida.objects.order_by('id'))
+
+    def test_notificacao_grava_na_caixa_de_saida_sem_enviar(self):
+        email, = self._enfileirar()
+        self.assertEqual((email.status, email.destinatario, email.mensagem), ('pendente', 'ana@exemplo.com', 'Aviso 0'))
+        self.assertEqual(mail.outbox, [])
+        enviar_notificacao(CustomUser.objects.create_user('sem_email'), 'Aviso')
+        enviar_notificacao(self.usuario, 'Só no site', enviar_email=False)
+        self.assertEqual(EmailSaida.objects.count(), 1)
+
+    def test_processa_a_caixa_de_saida(self):
+        self._enfileirar(3)
+        self.assertEqual(processar_caixa_saida(threads=2), (3, 0))
+        self.assertEqual(sorted(m.body for m in mail.outbox), ['Aviso 0', 'Aviso 1', 'Aviso 2'])
+        self.assertEqual(
+            set(EmailSaida.objects.values_list('status', 'tentativas')), {('enviado', 1)}
+        )
+        self.assertEqual(processar_caixa_saida(), (0, 0))
+
+    def test_reserva_nao_entrega_o_mesmo_email_duas_vezes(self):
+        self._enfileirar(3)
+        self.assertEqual(len(reservar_lote(2)), 2)
+        self.assertEqual(len(reservar_lote(2)), 1)
+        self.assertEqual(reservar_lote(2), [])
+        self.assertEqual(set(EmailSaida.objects.values_list('status', flat=True)), {'enviando'})
+        # Reserva vencida (o worker morreu): outro worker pega de novo
+        EmailSaida.objects.update(proxima_tentativa=timezone.now() - TEMPO_RESERVA)
+        self.assertEqual(len(reservar_lote(10)), 3)
+
+    @override_settings(EMAIL_SAIDA_MAX_TENTATIVAS=2)
+    def test_falha_reagenda_com_espera_e_desiste_no_limite(self):
+        email, = self._enfileirar()
+        with mock.patch('veterinarios.email_saida.EmailMessage.send', side_effect=OSError('recusado')), \
+                self.assertLogs('veterinarios.email_saida', 'WARNING'):
+            antes = timezone.now()
+            self.assertEqual(processar_caixa_saida(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.tentativas, email.ultimo_erro), ('pendente', 1, 'recusado'))
+            self.assertGreaterEqual(email.proxima_tentativa, antes + datetime.timedelta(minutes=1))
+            # Ainda na espera: não é tentado de novo
+            self.assertEqual(processar_caixa_saida(), (0, 0))
+            EmailSaida.objects.update(proxima_tentativa=timezone.now())
+            processar_caixa_saida()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.tentativas), ('falhou', 2))
+        self.assertEqual(processar_caixa_saida(), (0, 0))
+
+    def test_falha_ao_conectar(self):
+        self._enfileirar(2)
+        with mock.patch('veterinarios.email_saida.get_connection') as conexao:
+            conexao.return_value.open.side_effect = OSError('sem rede')
+            with self.assertLogs('veterinarios.email_saida', 'WARNING'):
+                self.assertEqual(processar_caixa_saida(), (0, 2))
+        self.assertEqual(
+            set(EmailSaida.objects.values_list('status', 'ultimo_erro')), {('pendente', 'Falha ao conectar: sem rede')}
+        )
+
+    def test_comando_enviar_emails(self):
+        self._enfileirar(2)
+        saida = io.StringIO()
+        call_command('enviar_emails', stdout=saida)
+        self.assertIn('Total: 2 enviado(s), 0 falha(s).', saida.getvalue())
+        self.assertEqual(len(mail.outbox), 2)
+
+
+def _foto_jpeg(largura=800, altura=600):
+    saida = io.BytesIO()
+    Image.new('RGB', (largura, altura), 'blue').save(saida, 'JPEG')
+    return SimpleUploadedFile('clinica.jpg', saida.getvalue(), 'image/jpeg')
+
+
+class MiniaturaClinicaTests(TestCase):
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        configuracao = override_settings(MEDIA_ROOT=pasta.name, MINIATURAS_DIR=os.path.join(pasta.name, 'miniaturas'))
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.clinica = Clinica.objects.create(nome='Clínica', foto=_foto_jpeg())
+        self.url = reverse('veterinarios:miniatura_clinica', args=[self.clinica.pk, 320])
+
+    def _imagem(self, resposta):
+        with Image.open(io.BytesIO(b''.join(resposta.streaming_content))) as img:
+            return img.format, img.size
+
+    def test_webp_para_quem_aceita_e_jpeg_para_os_demais(self):
+        resposta = self.client.get(self.url, HTTP_ACCEPT='image/webp,*/*')
+        self.assertEqual(resposta['Content-Type'], 'image/webp')
+        self.assertEqual(self._imagem(resposta), ('WEBP', (320, 240)))
+        resposta = self.client.get(self.url)
+        self.assertEqual(self._imagem(resposta), ('JPEG', (320, 240)))
+        self.assertIn('Accept', resposta['Vary'])
+
+    def test_etag_igual_responde_304(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_largura_fora_da_lista_e_404(self):
+        url = reverse('veterinarios:miniatura_clinica', args=[self.clinica.pk, 321])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_le_a_foto_pelo_storage_do_campo(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        # Fora do MEDIA_ROOT: o default_storage não acharia a foto
+        with mock.patch.object(Clinica._meta.get_field('foto'), 'storage', FileSystemStorage(location=pasta.name)):
+            clinica = Clinica.objects.create(nome='Outra', foto=_foto_jpeg(640, 480))
+            resposta = self.client.get(reverse('veterinarios:miniatura_clinica', args=[clinica.pk, 160]))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(self._imagem(resposta), ('JPEG', (160, 120)))
+
+    def test_miniatura_apagada_antes_de_abrir_e_gerada_de_novo(self):
+        obter = miniaturas.obter_miniatura
+        apagadas = []
+
+        def obter_e_limpar(*args):
+            caminho, hash_foto = obter(*args)
+            if not apagadas:
+                # limpar_miniaturas roda entre a verificação e a abertura
+                os.remove(caminho)
+                apagadas.append(caminho)
+            return caminho, hash_foto
+
+        with mock.patch('veterinarios.miniaturas.obter_miniatura', obter_e_limpar):
+            resposta = self.client.get(self.url)
+        self.assertTrue(apagadas)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(self._imagem(resposta), ('JPEG', (320, 240)))
+
+
+class NotificacaoEmMassaTests(TestCase):
+
+    def _usuarios(self, quantidade, inicio=0):
+        for i in range(inicio, inicio + quantidade):
+            CustomUser.objects.create_user(f'tutor{i}', email=f'tutor{i}@exemplo.com')
+        return CustomUser.objects.filter(username__startswith='tutor')
+
+    def test_cria_notificacoes_e_emails_em_lotes(self):
+        self._usuarios(5)
+        CustomUser.objects.create_user('tutor_sem_email')
+        CustomUser.objects.create_user('tutor_resumo', email='resumo@exemplo.com', receber_resumo_email=True)
+        usuarios = CustomUser.objects.filter(username__startswith='tutor')
+        self.assertEqual(enviar_notificacao_em_massa(usuarios, 'Feriado', tamanho_lote=3), (7, 6))
+        self.assertEqual(Notification.objects.filter(message='Feriado', is_read=False).count(), 7)
+        self.assertEqual(EmailSaida.objects.filter(status='pendente').count(), 5)
+        self.assertEqual(EmailSaida.objects.get(status='resumo').destinatario, 'resumo@exemplo.com')
+
+    def test_sem_email(self):
+        self.assertEqual(enviar_notificacao_em_massa(self._usuarios(2), 'Aviso', enviar_email=False), (2, 0))
+        self.assertFalse(EmailSaida.objects.exists())
+
+    def test_numero_de_consultas_nao_depende_dos_usuarios(self):
+        def consultas(usuarios):
+            with CaptureQueriesContext(connection) as contexto:
+                enviar_notificacao_em_massa(usuarios, 'Aviso')
+            return len(contexto.captured_queries)
+
+        poucos = consultas(self._usuarios(2))
+        self.assertEqual(consultas(self._usuarios(8, inicio=2)), poucos)
+
+    def test_uma_conexao_smtp_por_thread(self):
+        enviar_notificacao_em_massa(self._usuarios(6), 'Aviso')
+        with mock.patch('veterinarios.email_saida.get_connection', side_effect=mail.get_connection) as conexao:
+            self.assertEqual(processar_caixa_saida(threads=2), (6, 0))
+        self.assertEqual(conexao.call_count, 2)
+        self.assertEqual(len(mail.outbox), 6)
+
+    def test_acao_do_admin(self):
+        veterinario = Veterinario(usuario=CustomUser.objects.create_user('vet'), crmv='SP1')
+        veterinario.save()
+        clinica = Clinica.objects.create(nome='Clínica Central', veterinario=veterinario)
+        for usuario in self._usuarios(2):
+            tutor = Tutor.objects.create(usuario=usuario)
+            animal = Animal.objects.create(tutor=tutor, nome='Rex', especie='cachorro')
+            for _ in range(2):
+                Appointment.objects.create(
+                    tutor=tutor, veterinarian=veterinario, clinic=clinica, animal=animal, date=timezone.now()
+                )
+        self.client.force_login(CustomUser.objects.create_superuser('admin', 'admin@exemplo.com', 'x'))
+        self.client.post(reverse('admin:veterinarios_clinica_changelist'), {
+            'action': 'notificar_tutores', '_selected_action': [clinica.id], 'aplicar': '1',
+            'mensagem': 'Mudamos de endereço', 'enviar_email': 'on',
+        })
+        # Um aviso por tutor, mesmo com várias consultas
+        self.assertEqual(Notification.objects.filter(message='Mudamos de endereço').count(), 2)
+        self.assertEqual(EmailSaida.objects.count(), 2)
+
+
+class NotificacoesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = CustomUser.objects.create_user('vet')
+        Veterinario(usuario=cls.usuario, crmv='SP1').save()
+        cls.ids = [enviar_notificacao(cls.usuario, f'Aviso {i}', enviar_email=False).id for i in range(5)]
+        cls.alheia = enviar_notificacao(CustomUser.objects.create_user('outro'), 'Outro', enviar_email=False).id
+
+    def _lidas(self):
+        return set(Notification.objects.filter(is_read=True).values_list('id', flat=True))
+
+    def test_pagina_da_mais_recente_para_a_mais_antiga(self):
+        notificacoes, cursor = pagina_notificacoes(self.usuario, tamanho=3)
+        self.assertEqual([n.id for n in notificacoes], self.ids[:1:-1])
+        notificacoes, cursor = pagina_notificacoes(self.usuario, cursor, tamanho=3)
+        self.assertEqual([n.id for n in notificacoes], self.ids[1::-1])
+        self.assertIsNone(cursor)
+
+    def test_pagina_somente_nao_lidas(self):
+        Notification.objects.filter(id__in=self.ids[3:]).update(is_read=True)
+        notificacoes, _ = pagina_notificacoes(self.usuario, somente_nao_lidas=True)
+        self.assertEqual([n.id for n in notificacoes], self.ids[2::-1])
+
+    def test_marca_selecionadas_com_um_update(self):
+        # O UPDATE das notificações e o do contador, em uma transação (savepoint no teste)
+        with self.assertNumQueries(4):
+            total = marcar_notificacoes_lidas(self.usuario, [self.ids[0], self.ids[1], self.alheia])
+        self.assertEqual(total, 2)
+        self.assertEqual(self._lidas(), set(self.ids[:2]))
+        # As já lidas não contam de novo
+        self.assertEqual(marcar_notificacoes_lidas(self.usuario, self.ids[:2]), 0)
+
+    def test_marca_todas_do_usuario(self):
+        self.assertEqual(marcar_notificacoes_lidas(self.usuario), 5)
+        self.assertEqual(self._lidas(), set(self.ids))
+
+    def test_view_marca_selecionadas_ou_todas(self):
+        self.client.force_login(self.usuario)
+        url = reverse('veterinarios:marcar_notificacoes_lidas_veterinario')
+        self.client.get(url, {'todas': '1'})
+        self.assertEqual(self._lidas(), set())
+        resposta = self.client.post(url, {'ids': ['abc']})
+        self.assertRedirects(resposta, reverse('veterinarios:notificacoes_veterinario'))
+        self.assertEqual(self._lidas(), set())
+        self.client.post(url, {'ids': [str(self.ids[2]), str(self.alheia)]})
+        self.assertEqual(self._lidas(), {self.ids[2]})
+        self.client.post(url, {'todas': '1'})
+        self.assertEqual(self._lidas(), set(self.ids))
+        self.assertEqual(CustomUser.objects.get(pk=self.usuario.pk).notificacoes_nao_lidas, 0)
+
+    def test_view_lista_com_cursor(self):
+        self.client.force_login(self.usuario)
+        resposta = self.client.get(reverse('veterinarios:notificacoes_veterinario'), {'por_pagina': 4})
+        self.assertEqual(len(resposta.context['notificacoes']), 4)
+        self.assertEqual(resposta.context['nao_lidas'], 5)
+        resposta = self.client.get(resposta.context['proxima_url'])
+        self.assertEqual([n.id for n in resposta.context['notificacoes']], self.ids[:1])
+        self.assertIsNone(resposta.context['proxima_url'])
+
+
+@override_settings(EMAIL_RESUMO_JANELA_MINUTOS=30)
+class ResumoEmailsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = CustomUser.objects.create_user('ana', email='ana@exemplo.com', receber_resumo_email=True)
+
+    def _fim_da_janela(self):
+        EmailSaida.objects.filter(status='resumo').update(proxima_tentativa=timezone.now())
+
+    def test_email_retido_ate_o_fim_da_janela(self):
+        antes = timezone.now()
+        enviar_notificacao(self.usuario, 'Aviso')
+        email = EmailSaida.objects.get()
+        self.assertEqual(email.status, 'resumo')
+        self.assertGreaterEqual(email.proxima_tentativa, antes + datetime.timedelta(minutes=30))
+        self.assertEqual(agrupar_resumos(), (0, 0))
+        self.assertEqual(processar_caixa_saida(), (0, 0))
+        self.assertEqual(mail.outbox, [])
+
+    def test_agrupa_os_emails_do_usuario_em_um_resumo(self):
+        for i in range(3):
+            enviar_notificacao(self.usuario, f'Aviso {i}')
+        outro = CustomUser.objects.create_user('bia', email='bia@exemplo.com', receber_resumo_email=True)
+        enviar_notificacao(outro, 'Aviso da Bia')
+        self._fim_da_janela()
+
+        self.assertEqual(agrupar_resumos(), (1, 3))
+        resumo = EmailSaida.objects.get(destinatario='ana@exemplo.com')
+        self.assertEqual((resumo.status, resumo.quantidade_agrupada), ('pendente', 3))
+        self.assertEqual(resumo.assunto, 'Resumo: 3 notificações - Guardião Animal')
+        for i in range(3):
+            self.assertIn(f'Aviso {i}', resumo.mensagem)
+        # Um email só não vira resumo
+        sozinho = EmailSaida.objects.get(destinatario='bia@exemplo.com')
+        self.assertEqual((sozinho.status, sozinho.mensagem), ('pendente', 'Aviso da Bia'))
+
+        self.assertEqual(processar_caixa_saida(), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(estatisticas_resumos(), {
+            'resumos': 1, 'notificacoes_agrupadas': 3, 'emails_economizados': 2,
+        })
+
+    def test_resumos_seguidos_somam_as_notificacoes(self):
+        for i in range(2):
+            enviar_notificacao(self.usuario, f'Aviso {i}')
+        self._fim_da_janela()
+        agrupar_resumos()
+        # O primeiro resumo ainda não saiu e volta a ser retido junto com os novos
+        EmailSaida.objects.update(status='resumo')
+        enviar_notificacao(self.usuario, 'Aviso 2')
+        self._fim_da_janela()
+        self.assertEqual(agrupar_resumos(), (1, 2))
+        self.assertEqual(EmailSaida.objects.get().quantidade_agrupada, 3)
+
+    def test_comando_monta_e_envia_os_resumos(self):
+        for i in range(2):
+            enviar_notificacao(self.usuario, f'Aviso {i}')
+        self._fim_da_janela()
+        saida = io.StringIO()
+        call_command('enviar_emails', stdout=saida)
+        self.assertIn('1 resumo(s) montado(s) com 2 notificação(ões)', saida.getvalue())
+        self.assertIn('1 email(s) a menos', saida.getvalue())
+        self.assertEqual(mail.outbox[0].subject, 'Resumo: 2 notificações - Guardião Animal')
+
+
+class SchemaCacheTests(TestCase):
+
+    def setUp(self):
+        invalidar_cache_schema()
+        self.addCleanup(invalidar_cache_schema)
+
+    def test_introspeccao_uma_vez_por_tabela(self):
+        with CaptureQueriesContext(connection) as primeira:
+            colunas = colunas_da_tabela('veterinarios_clinica')
+        self.assertTrue(primeira.captured_queries)
+        self.assertIn('veterinario_id', colunas)
+        with self.assertNumQueries(0):
+            self.assertEqual(colunas_da_tabela('veterinarios_clinica'), colunas)
+
+    def test_invalidar_so_a_tabela_informada(self):
+        colunas_da_tabela('veterinarios_clinica')
+        colunas_da_tabela('tutores_tutor')
+        invalidar_cache_schema('veterinarios_clinica')
+        self.assertEqual(set(_colunas_cache), {('default', 'tutores_tutor')})
+
+    def test_apos_migracao_recarrega_tudo(self):
+        colunas_da_tabela('veterinarios_clinica')
+        invalidar_cache_apos_migracao(sender=None, using='default')
+        self.assertEqual(_colunas_cache, {})
+
+    def test_tabela_inexistente_nao_fica_no_cache(self):
+        self.assertEqual(colunas_da_tabela('tabela_que_nao_existe'), frozenset())
+        self.assertNotIn(('default', 'tabela_que_nao_existe'), _colunas_cache)
+
+
+class VeterinarioComPerfilTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            Veterinario(usuario=CustomUser.objects.create_user(f'vet{i}'), crmv=f'SP{i}').save()
+
+    def setUp(self):
+        self.addCleanup(invalidar_cache_schema)
+
+    def _criar_colunas_opcionais(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ALTER TABLE veterinarios_veterinario ADD COLUMN especialidade VARCHAR(100) NULL")
+            cursor.execute("UPDATE veterinarios_veterinario SET especialidade = 'Felinos'")
+        invalidar_cache_schema('veterinarios_veterinario')
+
+    def test_carrega_as_colunas_opcionais_em_uma_consulta(self):
+        self._criar_colunas_opcionais()
+        colunas_da_tabela('veterinarios_veterinario')
+        with self.assertNumQueries(2):
+            veterinarios = list(Veterinario.objects.com_perfil())
+            valores = [(v.especialidade, v.formacao) for v in veterinarios]
+        self.assertEqual(valores, [('Felinos', None)] * 3)
+
+    def test_carrega_em_lotes_com_iterator(self):
+        self._criar_colunas_opcionais()
+        colunas_da_tabela('veterinarios_veterinario')
+        with self.assertNumQueries(2):
+            especialidades = [v.especialidade for v in Veterinario.objects.com_perfil().iterator()]
+        self.assertEqual(especialidades, ['Felinos'] * 3)
+
+    def test_sem_as_colunas_nao_consulta(self):
+        colunas_da_tabela('veterinarios_veterinario')
+        with self.assertNumQueries(1):
+            veterinarios = list(Veterinario.objects.com_perfil())
+            self.assertEqual({v.especialidade for v in veterinarios}, {None})
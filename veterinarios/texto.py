@@ -0,0 +1,21 @@
+# veterinarios/texto.py
+import unicodedata
+
+
+def normalizar_texto(texto):
+    """
+    Remove acentos, converte para minúsculas e junta espaços repetidos.
+    Ex.: "  Clínica  São João " -> "clinica sao joao"
+    """
+    if not texto:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', str(texto))
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.lower().split())
+
+
+def somente_digitos(texto):
+    """Ex.: "123.456.789-00" -> "12345678900" """
+    if not texto:
+        return ''
+    return ''.join(c for c in str(texto) if c.isdigit())
@@ -1,7 +1,39 @@
 # veterinarios/utils.py
-from django.core.mail import send_mail
+import logging
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
 from django.conf import settings
-from .models import Notification
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import EmailSaida, Notification
+from tutores.paginacao import pagina_keyset
+
+logger = logging.getLogger(__name__)
+
+ASSUNTO_NOTIFICACAO = 'Notificação - Guardião Animal'
+
+
+def novo_email_saida(user, mensagem):
+    """
+    Email (ainda não salvo) da caixa de saída para uma notificação. Quem
+    prefere resumo tem o email retido até o fim da janela de agrupamento.
+    """
+    email = EmailSaida(
+        usuario=user,
+        destinatario=user.email,
+        assunto=ASSUNTO_NOTIFICACAO,
+        mensagem=mensagem,
+    )
+    if getattr(user, 'receber_resumo_email', False):
+        email.status = 'resumo'
+        email.proxima_tentativa = timezone.now() + timedelta(minutes=settings.EMAIL_RESUMO_JANELA_MINUTOS)
+    return email
 
 
 def enviar_notificacao(user, mensagem, enviar_email=True):
@@ -11,28 +43,143 @@ def enviar_notificacao(user, mensagem, enviar_email=True):
     Args:
         user: Usuário que receberá a notificação
         mensagem: Mensagem da notificação
-        enviar_email: Se True, envia email também
+        enviar_email: Se True, envia email também (pela caixa de saída)
     """
-    # Cria a notificação no banco
-    notificacao = Notification.objects.create(
-        user=user,
-        message=mensagem,
-        is_read=False
-    )
-    
-    # Envia email se solicitado e se o usuário tem email
-    if enviar_email and user.email:
-        try:
-            send_mail(
-                subject='Notificação - Guardião Animal',
-                message=mensagem,
-                from_email=settings.DEFAULT_FROM_EMAIL if hasattr(settings, 'DEFAULT_FROM_EMAIL') else 'noreply@guardiaoanimal.com',
-                recipient_list=[user.email],
-                fail_silently=True,  # Não levanta exceção se falhar
-            )
-        except Exception as e:
-            # Se falhar ao enviar email, apenas registra mas não impede a criação da notificação
-            print(f"Erro ao enviar email: {e}")
+    with transaction.atomic():
+        # Cria a notificação no banco
+        notificacao = Notification.objects.create(
+            user=user,
+            message=mensagem,
+            is_read=False
+        )
+
+        # O email vai para a caixa de saída na mesma transação; o comando
+        # enviar_emails faz o envio, então a requisição não espera o SMTP
+        if enviar_email and user.email:
+            novo_email_saida(user, mensagem).save()
+        somar_nao_lidas([user.pk], 1)
+    user.notificacoes_nao_lidas += 1
     
     return notificacao
 
+
+def enviar_notificacao_em_massa(usuarios, mensagem, enviar_email=True, tamanho_lote=500):
+    """
+    Cria a mesma notificação para todos os usuários do queryset `usuarios`.
+
+    Os usuários são lidos com .iterator() (memória constante) e, a cada
+    lote, as notificações e os emails da caixa de saída são inseridos com
+    bulk_create em uma transação. O envio dos emails fica com o comando
+    enviar_emails. Retorna (notificacoes_criadas, emails_enfileirados).
+    """
+    total_notificacoes = total_emails = 0
+    lote = []
+    for usuario in usuarios.only('id', 'email', 'receber_resumo_email').order_by().iterator(chunk_size=tamanho_lote):
+        lote.append(usuario)
+        if len(lote) >= tamanho_lote:
+            notificacoes, emails = _notificar_lote(lote, mensagem, enviar_email)
+            total_notificacoes += notificacoes
+            total_emails += emails
+            lote = []
+    if lote:
+        notificacoes, emails = _notificar_lote(lote, mensagem, enviar_email)
+        total_notificacoes += notificacoes
+        total_emails += emails
+    return total_notificacoes, total_emails
+
+
+def _notificar_lote(usuarios, mensagem, enviar_email):
+    with transaction.atomic():
+        Notification.objects.bulk_create([
+            Notification(user=usuario, message=mensagem, is_read=False) for usuario in usuarios
+        ])
+        emails = []
+        if enviar_email:
+            emails = EmailSaida.objects.bulk_create([
+                novo_email_saida(usuario, mensagem) for usuario in usuarios if usuario.email
+            ])
+        somar_nao_lidas([usuario.pk for usuario in usuarios], 1)
+    return len(usuarios), len(emails)
+
+
+def pagina_notificacoes(user, cursor=None, tamanho=20, somente_nao_lidas=False):
+    """
+    Uma página das notificações do usuário, da mais recente para a mais
+    antiga, paginada por (created_at, id). Retorna (notificacoes, proximo_cursor).
+    """
+    notificacoes = Notification.objects.filter(user=user)
+    if somente_nao_lidas:
+        notificacoes = notificacoes.filter(is_read=False)
+    return pagina_keyset(notificacoes, ('created_at', 'id'), cursor, tamanho, decrescente=True)
+
+
+def marcar_notificacoes_lidas(user, ids=None):
+    """
+    Marca como lidas as notificações não lidas do usuário (todas, ou só as
+    de `ids`) com um único UPDATE e desconta do contador. Retorna quantas
+    foram marcadas.
+    """
+    notificacoes = Notification.objects.filter(user=user, is_read=False)
+    if ids is not None:
+        notificacoes = notificacoes.filter(id__in=ids)
+    with transaction.atomic():
+        total = notificacoes.update(is_read=True)
+        if total:
+            somar_nao_lidas([user.pk], -total)
+    user.notificacoes_nao_lidas -= total
+    return total
+
+
+def cache_compartilhado():
+    """
+    True se o cache padrão é visto por todos os processos (Redis, Memcached,
+    banco...). O LocMemCache é de cada processo: um valor gravado por um
+    worker não muda o dos outros, então não serve para versões.
+    """
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+# Contador de notificações não lidas
+#
+# Fica no próprio usuário (CustomUser.notificacoes_nao_lidas), que já é
+# carregado em toda requisição: o menu mostra o número sem COUNT(*) e sem
+# depender de o cache ser compartilhado. As funções deste módulo que criam
+# ou leem notificações atualizam o contador com F() na mesma transação;
+# alterações feitas por fora (admin, shell) são corrigidas por
+# reconciliar_contadores_nao_lidas.
+
+def contar_nao_lidas(user):
+    """Quantidade de notificações não lidas do usuário (do contador gravado nele)"""
+    return max(user.notificacoes_nao_lidas, 0)
+
+
+def somar_nao_lidas(user_ids, quantidade):
+    """Soma `quantidade` (negativa para descontar) ao contador dos usuários, com um UPDATE"""
+    get_user_model().objects.filter(pk__in=user_ids).update(
+        notificacoes_nao_lidas=F('notificacoes_nao_lidas') + quantidade
+    )
+
+
+def reconciliar_contadores_nao_lidas(tamanho_lote=1000):
+    """
+    Recalcula o contador de todos os usuários a partir das notificações,
+    um UPDATE por lote de usuários. Retorna a quantidade de usuários
+    atualizados.
+    """
+    User = get_user_model()
+    nao_lidas = Notification.objects.filter(user=OuterRef('pk'), is_read=False).order_by().values(
+        'user'
+    ).annotate(total=Count('id')).values('total')
+    total = 0
+    ultimo = None
+    while True:
+        usuarios = User.objects.order_by('pk')
+        if ultimo is not None:
+            usuarios = usuarios.filter(pk__gt=ultimo)
+        lote = list(usuarios.values_list('pk', flat=True)[:tamanho_lote])
+        if not lote:
+            return total
+        total += User.objects.filter(pk__in=lote).update(
+            notificacoes_nao_lidas=Coalesce(Subquery(nao_lidas), 0)
+        )
+        ultimo = lote[-1]
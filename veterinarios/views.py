@@ -1,43 +1,62 @@
 # veterinarios/views.py
+import datetime
+import logging
+
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
-from django.db import transaction, connection
-from django.db.models import Q
+from django.db import DatabaseError, transaction, connection
 from django.contrib import messages
+from django.http import FileResponse, Http404, HttpResponseNotModified, JsonResponse
+from django.utils import timezone
 
 from .forms import (
     CadastroVeterinarioForm, CadastroClinicaForm,
-    ServiceForm, AppointmentForm, NotificationForm, EditarPerfilVeterinarioForm,
-    EditarConsultaForm
+    AppointmentForm, EditarPerfilVeterinarioForm,
+    EditarConsultaForm, FiltroConsultasForm
 )
 
-from .models import Veterinario, Clinica, Service, Appointment, Notification
-from django.db import connection
-from tutores.models import Tutor, Animal
+from .catalogo import aplicar_catalogo, aplicar_catalogo_nas_clinicas
+from .miniaturas import CONTENT_TYPES, LARGURAS_MINIATURA, abrir_miniatura, obter_miniatura
+from .models import Veterinario, Clinica, Appointment, carregar_campos_opcionais
+from .schema import colunas_da_tabela, invalidar_cache_schema
+from .utils import contar_nao_lidas, marcar_notificacoes_lidas, pagina_notificacoes
+from tutores.middleware import veterinario_ou_404
+from tutores.cadastro import cadastrar_veterinario
+from tutores.paginacao import ler_tamanho_pagina, pagina_keyset
+from tutores.versoes import atualizar_versoes
+
+logger = logging.getLogger(__name__)
+
+# Limite de consultas por página da agenda
+CONSULTAS_MAXIMO_POR_PAGINA = 100
+# Maior período (em dias) aceito pelo calendário
+CALENDARIO_MAXIMO_DIAS = 62
+# Limite do ?por_pagina= das notificações
+NOTIFICACOES_MAXIMO_POR_PAGINA = 100
 
 
 def get_clinicas_do_veterinario(veterinario):
     """Busca clínicas de um veterinário usando raw SQL para evitar problemas com nomes de coluna"""
     clinicas_list = []
     try:
+        # Colunas existentes na tabela (introspecção em cache por processo)
+        colunas = colunas_da_tabela('veterinarios_clinica')
         with connection.cursor() as cursor:
-            # Verifica quais colunas existem na tabela
-            cursor.execute("SHOW COLUMNS FROM veterinarios_clinica")
-            colunas = [row[0] for row in cursor.fetchall()]
-            
-            # Tenta diferentes nomes de coluna para o relacionamento
-            # Verifica se alguma coluna contém "veterinario" no nome
+            # Tenta primeiro os nomes padrão da coluna do relacionamento
             coluna_veterinario = None
-            for col in colunas:
-                if 'veterinario' in col.lower():
+            for col in ['veterinario_id', 'veterinario']:
+                if col in colunas:
                     coluna_veterinario = col
                     break
-            
-            # Se não encontrou, tenta os nomes padrão
+
+            # Se não encontrou, procura uma coluna com "veterinario" no nome
+            # (em ordem fixa: colunas é um conjunto, e veterinario_nome_normalizado
+            # também contém o nome)
             if not coluna_veterinario:
-                for col in ['veterinario_id', 'veterinario']:
-                    if col in colunas:
+                for col in sorted(colunas):
+                    if 'veterinario' in col.lower() and not col.endswith('_normalizado'):
                         coluna_veterinario = col
                         break
             
@@ -52,190 +71,32 @@ def get_clinicas_do_veterinario(veterinario):
                 # Busca os objetos Clinica pelos IDs encontrados
                 if clinica_ids:
                     clinicas_list = list(Clinica.objects.filter(id__in=clinica_ids))
-    except Exception as e:
+    except Exception:
         # Se der erro, retorna lista vazia
         pass
     
     return clinicas_list
 
 
-def criar_servicos_predefinidos(clinica):
-    """Cria serviços pré-definidos para uma clínica"""
-    servicos_predefinidos = [
-        {
-            'name': 'Consulta Geral',
-            'description': 'Consulta veterinária geral para avaliação do animal',
-            'price': 80.00
-        },
-        {
-            'name': 'Vacinação',
-            'description': 'Aplicação de vacinas conforme calendário vacinal',
-            'price': 50.00
-        },
-        {
-            'name': 'Castração',
-            'description': 'Procedimento cirúrgico de castração',
-            'price': 300.00
-        },
-        {
-            'name': 'Exame de Sangue',
-            'description': 'Exame laboratorial completo de sangue',
-            'price': 120.00
-        },
-        {
-            'name': 'Cirurgia',
-            'description': 'Procedimento cirúrgico geral',
-            'price': 500.00
-        },
-        {
-            'name': 'Banho e Tosa',
-            'description': 'Serviço de higiene e estética animal',
-            'price': 60.00
-        },
-        {
-            'name': 'Ultrassonografia',
-            'description': 'Exame de imagem por ultrassom',
-            'price': 150.00
-        },
-        {
-            'name': 'Radiografia',
-            'description': 'Exame de imagem por raio-X',
-            'price': 100.00
-        }
-    ]
-    
+def criar_servicos_do_catalogo(clinica, veterinario):
+    """Cria na clínica os serviços do catálogo (consultas fixas, ver veterinarios.catalogo)"""
     try:
-        # Tenta criar usando ORM
-        for servico_data in servicos_predefinidos:
-            Service.objects.get_or_create(
-                clinic=clinica,
-                name=servico_data['name'],
-                defaults={
-                    'description': servico_data['description'],
-                    'price': servico_data['price']
-                }
-            )
-    except Exception as e:
-        # Se der erro com ORM, tenta usar raw SQL
-        try:
-            with connection.cursor() as cursor:
-                # Verifica se a tabela existe
-                cursor.execute("SHOW TABLES LIKE 'veterinarios_service'")
-                if cursor.fetchone():
-                    for servico_data in servicos_predefinidos:
-                        # Verifica se o serviço já existe
-                        cursor.execute(
-                            "SELECT id FROM veterinarios_service WHERE clinic_id = %s AND name = %s",
-                            [clinica.id, servico_data['name']]
-                        )
-                        if not cursor.fetchone():
-                            # Insere o serviço
-                            cursor.execute(
-                                "INSERT INTO veterinarios_service (clinic_id, name, description, price) VALUES (%s, %s, %s, %s)",
-                                [clinica.id, servico_data['name'], servico_data['description'], servico_data['price']]
-                            )
-        except Exception as e2:
-            # Se der erro, apenas registra mas não impede o cadastro da clínica
-            print(f"Erro ao criar serviços pré-definidos: {e2}")
+        # Savepoint: uma falha aqui não impede o cadastro da clínica
+        with transaction.atomic():
+            aplicar_catalogo([clinica.id], veterinario)
+    except DatabaseError:
+        logger.warning("Falha ao criar os serviços do catálogo na clínica %s", clinica.id, exc_info=True)
 
 
 def cadastro_veterinario(request):
     if request.method == 'POST':
         form = CadastroVeterinarioForm(request.POST)
+        # Email, CPF e CRMV já cadastrados são conferidos na validação, em uma consulta
         if form.is_valid():
             try:
-                with transaction.atomic():
-                    # Verifica se o CRMV já existe (usando only para evitar campo CPF)
-                    crmv = form.cleaned_data.get('crmv')
-                    # Normaliza o CRMV para comparação (maiúsculas)
-                    crmv_normalizado = crmv.upper() if crmv else ''
-                    # Verifica se existe CRMV com mesmo valor (case-insensitive)
-                    if Veterinario.objects.only('crmv').filter(
-                        Q(crmv__iexact=crmv_normalizado) | Q(crmv=crmv_normalizado)
-                    ).exists():
-                        form.add_error('crmv', 'Este CRMV já está cadastrado.')
-                        return render(request, 'veterinarios/cadastro_veterinario.html', {'form': form})
-                    
-                    # Verifica se o CPF já existe (se foi fornecido)
-                    # O CPF está armazenado no CustomUser, não no Veterinario
-                    # O CPF já vem limpo (apenas números) do método clean_cpf do form
-                    cpf = form.cleaned_data.get('cpf')
-                    if cpf:
-                        from tutores.models import CustomUser
-                        # Verifica no CustomUser (o CPF já está limpo do clean_cpf)
-                        if CustomUser.objects.filter(cpf=cpf).exists():
-                            form.add_error('cpf', 'Este CPF já está cadastrado.')
-                            return render(request, 'veterinarios/cadastro_veterinario.html', {'form': form})
-                    
-                    # Prepara dados do usuário
-                    email = form.cleaned_data['email']
-                    nome_completo = form.cleaned_data['nome_completo'].strip()
-                    partes = nome_completo.split(maxsplit=1)
-                    first_name = partes[0]
-                    last_name = partes[1] if len(partes) > 1 else ''
-                    
-                    # Gera username único
-                    base_username = email.split('@')[0]
-                    username = base_username
-                    counter = 1
-                    from tutores.models import CustomUser
-                    while CustomUser.objects.filter(username=username).exists():
-                        username = f"{base_username}{counter}"
-                        counter += 1
-                    
-                    # Prepara telefone e CPF
-                    telefone = form.cleaned_data.get('telefone')
-                    cpf = form.cleaned_data.get('cpf')
-                    
-                    # Hash da senha
-                    from django.contrib.auth.hashers import make_password
-                    password = form.cleaned_data['password1']
-                    password_hash = make_password(password)
-                    
-                    # Insere o usuário usando SQL direto para garantir que telefone e CPF sejam incluídos
-                    from django.db import connection
-                    from django.utils.timezone import now
-                    
-                    with connection.cursor() as cursor:
-                        # Prepara valores - usa string vazia se não fornecido (evita erro do MySQL)
-                        telefone_valor = telefone if telefone else ''
-                        cpf_valor = cpf if cpf else ''
-                        
-                        # Insere o usuário com TODOS os campos obrigatórios
-                        # Inclui telefone e CPF explicitamente (mesmo que vazio) para evitar erro
-                        cursor.execute("""
-                            INSERT INTO tutores_customuser 
-                            (username, email, password, first_name, last_name, telefone, cpf, 
-                             is_staff, is_active, is_superuser, date_joined, last_login)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        """, [
-                            username,
-                            email,
-                            password_hash,
-                            first_name,
-                            last_name,
-                            telefone_valor,  # String vazia se não fornecido
-                            cpf_valor,  # String vazia se não fornecido
-                            0,  # is_staff (0 = False no MySQL)
-                            1,  # is_active (1 = True no MySQL)
-                            0,  # is_superuser (0 = False no MySQL)
-                            now(),  # date_joined
-                            None  # last_login (NULL é permitido)
-                        ])
-                        user_id = cursor.lastrowid
-                    
-                    # Busca o usuário criado
-                    user = CustomUser.objects.get(id=user_id)
-                    
-                    # Cria o veterinário usando raw SQL
-                    # A tabela veterinarios_veterinario tem apenas: id, crmv, usuario_id
-                    with connection.cursor() as cursor:
-                        # Insere apenas os campos que existem na tabela
-                        # Usa o CRMV normalizado (maiúsculas)
-                        cursor.execute(
-                            "INSERT INTO veterinarios_veterinario (usuario_id, crmv) VALUES (%s, %s)",
-                            [user.id, crmv_normalizado]
-                        )
+                # Usuário e perfil de veterinário em uma transação curta
+                user = cadastrar_veterinario(form)
+                if user is not None:
                     login(request, user)
                     messages.success(request, 'Cadastro realizado com sucesso!')
                     return redirect('veterinarios:painel_veterinario')
@@ -257,8 +118,8 @@ def cadastro_veterinario(request):
 
 @login_required(login_url='/login/')
 def painel_veterinario(request):
-    # Usa o manager customizado que força only() nos campos corretos
-    veterinario_perfil = Veterinario.objects.filter(usuario=request.user).first()
+    # Perfil resolvido pelo PerfilUsuarioMiddleware
+    veterinario_perfil = request.veterinario
     
     if not veterinario_perfil:
         messages.error(request, 'Perfil de veterinário não encontrado.')
@@ -278,7 +139,7 @@ def painel_veterinario(request):
 
 @login_required(login_url='/login/')
 def cadastro_clinica(request):
-    veterinario_perfil = get_object_or_404(Veterinario.objects.select_related('usuario'), usuario=request.user)
+    veterinario_perfil = veterinario_ou_404(request)
     if request.method == 'POST':
         form = CadastroClinicaForm(request.POST, request.FILES)
         if form.is_valid():
@@ -290,12 +151,11 @@ def cadastro_clinica(request):
                     # Salva a clínica
                     clinica.save()
                     # Cria serviços pré-definidos para a clínica
-                    criar_servicos_predefinidos(clinica)
+                    criar_servicos_do_catalogo(clinica, veterinario_perfil)
                     messages.success(request, 'Clínica cadastrada com sucesso! Serviços pré-definidos foram criados automaticamente.')
                     return redirect('veterinarios:painel_veterinario')
-            except Exception as e:
+            except Exception:
                 # Se der erro ao salvar normalmente, tenta usar raw SQL
-                error_msg = str(e)
                 try:
                     with transaction.atomic():
                         clinica = form.save(commit=False)
@@ -303,8 +163,7 @@ def cadastro_clinica(request):
                         clinica.save()
                         # Depois atualiza o relacionamento usando raw SQL
                         with connection.cursor() as cursor:
-                            cursor.execute("SHOW COLUMNS FROM veterinarios_clinica")
-                            colunas = [row[0] for row in cursor.fetchall()]
+                            colunas = colunas_da_tabela('veterinarios_clinica')
                             coluna_veterinario = None
                             for col in ['veterinario_id', 'veterinario']:
                                 if col in colunas:
@@ -316,7 +175,7 @@ def cadastro_clinica(request):
                                     [veterinario_perfil.id, clinica.id]
                                 )
                         # Cria serviços pré-definidos para a clínica
-                        criar_servicos_predefinidos(clinica)
+                        criar_servicos_do_catalogo(clinica, veterinario_perfil)
                         messages.success(request, 'Clínica cadastrada com sucesso! Serviços pré-definidos foram criados automaticamente.')
                         return redirect('veterinarios:painel_veterinario')
                 except Exception as e2:
@@ -333,9 +192,19 @@ def cadastro_clinica(request):
     return render(request, 'veterinarios/cadastro_clinica.html', {'form': form, 'titulo_pagina': 'Cadastro de Clínica'})
 
 
+@login_required(login_url='/login/')
+def aplicar_catalogo_servicos(request):
+    """Cria em todas as clínicas do veterinário os serviços do catálogo que elas ainda não têm"""
+    veterinario_perfil = veterinario_ou_404(request)
+    if request.method == 'POST':
+        quantidade = aplicar_catalogo_nas_clinicas(veterinario_perfil)
+        messages.success(request, f'Catálogo de serviços aplicado em {quantidade} clínica(s).')
+    return redirect('veterinarios:painel_veterinario')
+
+
 @login_required(login_url='/login/')
 def editar_clinica(request, clinica_id):
-    veterinario_perfil = get_object_or_404(Veterinario.objects.select_related('usuario'), usuario=request.user)
+    veterinario_perfil = veterinario_ou_404(request)
     # Busca a clínica verificando se pertence ao veterinário
     clinicas_do_vet = get_clinicas_do_veterinario(veterinario_perfil)
     clinica = None
@@ -357,9 +226,57 @@ def editar_clinica(request, clinica_id):
     return render(request, 'veterinarios/editar_clinica.html', {'form': form, 'clinica': clinica, 'titulo_pagina': 'Editar Clínica'})
 
 
+def miniatura_clinica(request, clinica_id, largura):
+    """
+    Foto da clínica reduzida para `largura`, gerada no primeiro acesso e
+    depois servida do cache em disco. Entrega WebP para quem aceita e JPEG
+    para os demais. Com ?v=<hash da foto> (gerado pela tag miniatura_clinica)
+    a resposta pode ficar no cache do navegador indefinidamente.
+    """
+    if largura not in LARGURAS_MINIATURA:
+        raise Http404("Largura não disponível.")
+    clinica = Clinica.objects.only('foto').filter(pk=clinica_id).first()
+    if clinica is None or not clinica.foto:
+        raise Http404("Clínica sem foto.")
+    extensao = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpg'
+    try:
+        # O storage do campo (por conteúdo), não o default_storage
+        origem = clinica.foto.path
+    except NotImplementedError:
+        raise Http404("Foto sem cópia local.")
+    try:
+        caminho, hash_foto = obter_miniatura(origem, largura, extensao)
+    except Exception:
+        logger.exception("Falha ao gerar a miniatura da clínica %s", clinica_id)
+        caminho = None
+    if caminho is None:
+        raise Http404("Foto não encontrada.")
+
+    etag = f'"{hash_foto}-{largura}-{extensao}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        resposta = HttpResponseNotModified()
+    else:
+        try:
+            arquivo = abrir_miniatura(origem, largura, extensao)
+        except Exception:
+            logger.exception("Falha ao gerar a miniatura da clínica %s", clinica_id)
+            arquivo = None
+        if arquivo is None:
+            raise Http404("Foto não encontrada.")
+        resposta = FileResponse(arquivo, content_type=CONTENT_TYPES[extensao])
+    resposta['ETag'] = etag
+    resposta['Vary'] = 'Accept'
+    if request.GET.get('v') == hash_foto:
+        resposta['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        # URL sem versão: o navegador confirma com o ETag depois de 5 minutos
+        resposta['Cache-Control'] = 'public, max-age=300'
+    return resposta
+
+
 @login_required(login_url='/login/')
 def delete_clinica(request, clinica_id):
-    veterinario_perfil = get_object_or_404(Veterinario.objects.select_related('usuario'), usuario=request.user)
+    veterinario_perfil = veterinario_ou_404(request)
     # Busca a clínica verificando se pertence ao veterinário
     clinicas_do_vet = get_clinicas_do_veterinario(veterinario_perfil)
     clinica = None
@@ -377,9 +294,8 @@ def delete_clinica(request, clinica_id):
             clinica.delete()
             messages.success(request, 'Clínica excluída com sucesso!')
             return redirect('veterinarios:painel_veterinario')
-        except Exception as e:
+        except Exception:
             # Se der erro, tenta deletar usando SQL direto
-            error_msg = str(e)
             try:
                 from django.db import connection
                 with connection.cursor() as cursor:
@@ -395,13 +311,33 @@ def delete_clinica(request, clinica_id):
 
 @login_required(login_url='/login/')
 def perfil_veterinario(request):
-    veterinario_perfil = get_object_or_404(Veterinario.objects.select_related('usuario'), usuario=request.user)
+    veterinario_perfil = get_object_or_404(Veterinario.objects.select_related('usuario').com_perfil(), usuario=request.user)
     return render(request, 'veterinarios/perfil_veterinario.html', {'veterinario_perfil': veterinario_perfil})
 
 
+def _gravar_coluna_opcional(cursor, coluna, tipo, valor, veterinario_id):
+    """
+    Grava uma coluna opcional do perfil (especialidade, formação, experiência),
+    criando a coluna se ela ainda não existir na tabela.
+    """
+    tabela = 'veterinarios_veterinario'
+    if coluna not in colunas_da_tabela(tabela):
+        try:
+            with transaction.atomic():
+                cursor.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo} NULL")
+        except DatabaseError:
+            # Normalmente outro processo já criou a coluna e o cache deste está antigo
+            logger.info("Coluna %s.%s não foi criada", tabela, coluna, exc_info=True)
+        invalidar_cache_schema(tabela)
+        if coluna not in colunas_da_tabela(tabela):
+            logger.warning("Coluna %s.%s não existe; o valor não foi gravado", tabela, coluna)
+            return
+    cursor.execute(f"UPDATE {tabela} SET {coluna} = %s WHERE id = %s", [valor, veterinario_id])
+
+
 @login_required(login_url='/login/')
 def editar_perfil_veterinario(request):
-    veterinario = get_object_or_404(Veterinario.objects.select_related('usuario'), usuario=request.user)
+    veterinario = veterinario_ou_404(request)
     user = request.user
     if request.method == 'POST':
         form = EditarPerfilVeterinarioForm(request.POST, instance=user)
@@ -423,120 +359,83 @@ def editar_perfil_veterinario(request):
             from django.db import connection
             try:
                 with connection.cursor() as cursor:
-                    # Verifica quais colunas existem
-                    cursor.execute("SHOW COLUMNS FROM veterinarios_veterinario")
-                    colunas_existentes = [row[0] for row in cursor.fetchall()]
-                    
-                    # Atualiza especialidade
-                    if 'especialidade' in colunas_existentes:
-                        cursor.execute(
-                            "UPDATE veterinarios_veterinario SET especialidade = %s WHERE id = %s",
-                            [especialidade if especialidade else None, veterinario.id]
-                        )
-                    else:
-                        try:
-                            cursor.execute("ALTER TABLE veterinarios_veterinario ADD COLUMN especialidade VARCHAR(100) NULL")
-                            cursor.execute(
-                                "UPDATE veterinarios_veterinario SET especialidade = %s WHERE id = %s",
-                                [especialidade if especialidade else None, veterinario.id]
-                            )
-                        except:
-                            pass
-                    
-                    # Atualiza formacao
-                    if 'formacao' in colunas_existentes:
-                        cursor.execute(
-                            "UPDATE veterinarios_veterinario SET formacao = %s WHERE id = %s",
-                            [formacao if formacao else None, veterinario.id]
-                        )
-                    else:
-                        try:
-                            cursor.execute("ALTER TABLE veterinarios_veterinario ADD COLUMN formacao TEXT NULL")
-                            cursor.execute(
-                                "UPDATE veterinarios_veterinario SET formacao = %s WHERE id = %s",
-                                [formacao if formacao else None, veterinario.id]
-                            )
-                        except:
-                            pass
-                    
-                    # Atualiza experiencia
-                    if 'experiencia' in colunas_existentes:
-                        cursor.execute(
-                            "UPDATE veterinarios_veterinario SET experiencia = %s WHERE id = %s",
-                            [experiencia if experiencia else None, veterinario.id]
-                        )
-                    else:
-                        try:
-                            cursor.execute("ALTER TABLE veterinarios_veterinario ADD COLUMN experiencia TEXT NULL")
-                            cursor.execute(
-                                "UPDATE veterinarios_veterinario SET experiencia = %s WHERE id = %s",
-                                [experiencia if experiencia else None, veterinario.id]
-                            )
-                        except:
-                            pass
-            except Exception as e:
-                import traceback
-                print(f"Erro ao salvar dados do veterinário: {e}")
-                print(traceback.format_exc())
+                    for coluna, tipo, valor in (
+                        ('especialidade', 'VARCHAR(100)', especialidade),
+                        ('formacao', 'TEXT', formacao),
+                        ('experiencia', 'TEXT', experiencia),
+                    ):
+                        _gravar_coluna_opcional(cursor, coluna, tipo, valor or None, veterinario.id)
+            except DatabaseError:
+                logger.exception("Erro ao salvar dados do veterinário %s", veterinario.id)
+            # As colunas acima são gravadas por SQL direto, sem os sinais do model
+            atualizar_versoes(('veterinario', veterinario.id))
             
             messages.success(request, "Perfil atualizado com sucesso!")
             return redirect('veterinarios:perfil_veterinario')
         else:
             messages.error(request, "Corrija os erros do formulário.")
     else:
-        # Busca formacao e experiencia do banco
-        formacao = None
-        experiencia = None
-        try:
-            from django.db import connection
-            with connection.cursor() as cursor:
-                cursor.execute("SHOW COLUMNS FROM veterinarios_veterinario")
-                colunas = [row[0] for row in cursor.fetchall()]
-                if 'formacao' in colunas:
-                    cursor.execute("SELECT formacao FROM veterinarios_veterinario WHERE id = %s", [veterinario.id])
-                    row = cursor.fetchone()
-                    formacao = row[0] if row and row[0] else None
-                if 'experiencia' in colunas:
-                    cursor.execute("SELECT experiencia FROM veterinarios_veterinario WHERE id = %s", [veterinario.id])
-                    row = cursor.fetchone()
-                    experiencia = row[0] if row and row[0] else None
-        except:
-            pass
-        
+        # Busca especialidade, formacao e experiencia do banco em uma única query
+        carregar_campos_opcionais([veterinario])
         form = EditarPerfilVeterinarioForm(instance=user, initial={
             'telefone': veterinario.telefone,
             'especialidade': veterinario.especialidade,
-            'formacao': formacao,
-            'experiencia': experiencia
+            'formacao': veterinario.formacao,
+            'experiencia': veterinario.experiencia
         })
     return render(request, 'veterinarios/editar_perfil_veterinario.html', {'form': form, 'veterinario': veterinario})
 
 
 @login_required(login_url='/login/')
 def notificacoes_veterinario(request):
-    """Exibe as notificações do veterinário"""
-    notificacoes = Notification.objects.filter(user=request.user).order_by('-created_at')
-    nao_lidas = notificacoes.filter(is_read=False).count()
-    
+    """Exibe as notificações do veterinário, paginadas"""
+    somente_nao_lidas = request.GET.get('nao_lidas') == '1'
+    por_pagina = ler_tamanho_pagina(request, settings.NOTIFICACOES_POR_PAGINA, NOTIFICACOES_MAXIMO_POR_PAGINA)
+    notificacoes, proximo_cursor = pagina_notificacoes(
+        request.user, request.GET.get('cursor'), por_pagina, somente_nao_lidas
+    )
+    nao_lidas = contar_nao_lidas(request.user)
+
+    proxima_url = None
+    if proximo_cursor:
+        parametros = request.GET.copy()
+        parametros['cursor'] = proximo_cursor
+        proxima_url = f"{request.path}?{parametros.urlencode()}"
+
     return render(request, 'veterinarios/notificacoes.html', {
         'notificacoes': notificacoes,
-        'nao_lidas': nao_lidas
+        'nao_lidas': nao_lidas,
+        'somente_nao_lidas': somente_nao_lidas,
+        'proxima_url': proxima_url,
     })
 
 
 @login_required(login_url='/login/')
 def marcar_notificacao_lida_veterinario(request, notificacao_id):
     """Marca uma notificação como lida"""
-    notificacao = get_object_or_404(Notification, id=notificacao_id, user=request.user)
-    notificacao.is_read = True
-    notificacao.save()
+    marcar_notificacoes_lidas(request.user, [notificacao_id])
+    return redirect('veterinarios:notificacoes_veterinario')
+
+
+@login_required(login_url='/login/')
+def marcar_notificacoes_lidas_veterinario(request):
+    """Marca as notificações selecionadas (ou todas, com todas=1) como lidas"""
+    if request.method == 'POST':
+        ids = None if request.POST.get('todas') else [
+            int(i) for i in request.POST.getlist('ids') if i.isdigit()
+        ]
+        if ids == []:
+            messages.info(request, 'Nenhuma notificação selecionada.')
+        else:
+            total = marcar_notificacoes_lidas(request.user, ids)
+            messages.success(request, f'{total} notificação(ões) marcada(s) como lida(s).')
     return redirect('veterinarios:notificacoes_veterinario')
 
 
 @login_required(login_url='/login/')
 def cadastrar_consulta(request):
     """Permite ao veterinário cadastrar uma consulta"""
-    veterinario = get_object_or_404(Veterinario.objects.select_related('usuario'), usuario=request.user)
+    veterinario = veterinario_ou_404(request)
     
     if request.method == 'POST':
         form = AppointmentForm(request.POST, veterinarian=veterinario)
@@ -567,23 +466,107 @@ def cadastrar_consulta(request):
     })
 
 
+def _filtrar_consultas(consultas, filtros):
+    """
+    Aplica período e status já validados. O período vira um intervalo
+    [início, fim + 1 dia) sobre `date`, para usar o índice (veterinarian, date).
+    """
+    inicio = filtros.get('inicio')
+    fim = filtros.get('fim')
+    if inicio:
+        consultas = consultas.filter(
+            date__gte=timezone.make_aware(datetime.datetime.combine(inicio, datetime.time.min))
+        )
+    if fim:
+        consultas = consultas.filter(
+            date__lt=timezone.make_aware(datetime.datetime.combine(fim + datetime.timedelta(days=1), datetime.time.min))
+        )
+    if filtros.get('status'):
+        consultas = consultas.filter(status=filtros['status'])
+    return consultas
+
+
 @login_required(login_url='/login/')
 def listar_consultas(request):
-    """Lista todas as consultas do veterinário"""
-    veterinario = get_object_or_404(Veterinario.objects.select_related('usuario'), usuario=request.user)
-    consultas = Appointment.objects.filter(
-        veterinarian=veterinario
+    """Lista as consultas do veterinário, filtradas por período/status e paginadas"""
+    veterinario = veterinario_ou_404(request)
+    filtro_form = FiltroConsultasForm(request.GET or None)
+    filtros = filtro_form.cleaned_data if filtro_form.is_valid() else {}
+
+    consultas = _filtrar_consultas(
+        Appointment.objects.filter(veterinarian=veterinario),
+        filtros
     ).select_related(
         'tutor',
         'tutor__usuario',
         'animal',
         'clinic',
         'service'
-    ).order_by('-date')
-    
+    )
+    por_pagina = ler_tamanho_pagina(request, settings.CONSULTAS_POR_PAGINA, CONSULTAS_MAXIMO_POR_PAGINA)
+    consultas, proximo_cursor = pagina_keyset(
+        consultas, ('date', 'id'), request.GET.get('cursor', ''), por_pagina, decrescente=True
+    )
+
+    proxima_url = None
+    if proximo_cursor:
+        parametros = request.GET.copy()
+        parametros['cursor'] = proximo_cursor
+        proxima_url = f"{request.path}?{parametros.urlencode()}"
+
     return render(request, 'veterinarios/listar_consultas.html', {
         'consultas': consultas,
-        'veterinario': veterinario
+        'veterinario': veterinario,
+        'filtro_form': filtro_form,
+        'filtrando': bool(filtros and any(filtros.values())),
+        'pagina_seguinte': bool(request.GET.get('cursor')),
+        'proxima_url': proxima_url,
+    })
+
+
+@login_required(login_url='/login/')
+def calendario_consultas(request):
+    """
+    Consultas do veterinário em um período, em JSON, só com os campos
+    necessários para desenhar a visão de semana/mês.
+    Sem ?inicio=/?fim= usa o mês atual.
+    """
+    veterinario = veterinario_ou_404(request)
+    filtro_form = FiltroConsultasForm(request.GET)
+    if not filtro_form.is_valid():
+        return JsonResponse({'erros': filtro_form.errors}, status=400)
+    filtros = dict(filtro_form.cleaned_data)
+
+    hoje = timezone.localdate()
+    if not filtros.get('inicio'):
+        filtros['inicio'] = hoje.replace(day=1)
+    if not filtros.get('fim'):
+        proximo_mes = (filtros['inicio'].replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        filtros['fim'] = proximo_mes - datetime.timedelta(days=1)
+    if (filtros['fim'] - filtros['inicio']).days >= CALENDARIO_MAXIMO_DIAS:
+        return JsonResponse(
+            {'erros': {'fim': [f'O período deve ter no máximo {CALENDARIO_MAXIMO_DIAS} dias.']}},
+            status=400
+        )
+
+    consultas = _filtrar_consultas(
+        Appointment.objects.filter(veterinarian=veterinario),
+        filtros
+    ).order_by('date', 'id').values('id', 'date', 'status', 'animal__nome', 'clinic__nome')
+
+    return JsonResponse({
+        'inicio': filtros['inicio'].isoformat(),
+        'fim': filtros['fim'].isoformat(),
+        'consultas': [
+            {
+                'id': consulta['id'],
+                'data': timezone.localtime(consulta['date']).isoformat(),
+                'status': consulta['status'],
+                'animal': consulta['animal__nome'],
+                'clinica': consulta['clinic__nome'],
+            }
+            for consulta in consultas
+        ],
     })
 
 
@@ -591,7 +574,7 @@ def listar_consultas(request):
 def editar_consulta(request, consulta_id):
     """Permite editar uma consulta (principalmente status)"""
     # Busca o veterinário - o manager customizado já limita os campos
-    veterinario = get_object_or_404(Veterinario.objects, usuario=request.user)
+    veterinario = veterinario_ou_404(request)
     
     consulta = get_object_or_404(
         Appointment.objects.select_related('tutor', 'tutor__usuario', 'animal', 'clinic', 'service'),
@@ -614,7 +597,7 @@ def editar_consulta(request, consulta_id):
                     status_anterior_display = dict(Appointment.STATUS_CHOICES).get(status_anterior, status_anterior)
                     mensagem = f"Status da consulta de {consulta.animal.nome} em {consulta.clinic.nome} foi alterado de '{status_anterior_display}' para '{status_display}'. Data: {consulta.date.strftime('%d/%m/%Y às %H:%M')}"
                     enviar_notificacao(consulta.tutor.usuario, mensagem, enviar_email=True)
-                    messages.success(request, f'Consulta atualizada com sucesso! O tutor foi notificado sobre a mudança de status.')
+                    messages.success(request, 'Consulta atualizada com sucesso! O tutor foi notificado sobre a mudança de status.')
                 else:
                     messages.success(request, 'Consulta atualizada com sucesso!')
                 